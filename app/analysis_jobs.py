@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from .config import Config
+from .face_index import face_index
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    person_id TEXT,
+    status TEXT,
+    num_suggestions INTEGER,
+    max_faces INTEGER,
+    faces_total INTEGER,
+    faces_done INTEGER DEFAULT 0,
+    updates INTEGER DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_jobs_queue ON analysis_jobs(status, job_id);
+"""
+
+JOB_COLUMNS = ("job_id", "person_id", "status", "num_suggestions", "max_faces", "faces_total", "faces_done", "updates", "result", "error", "created_at", "started_at", "finished_at")
+SELECT_JOBS = f"SELECT {', '.join(JOB_COLUMNS)} FROM analysis_jobs"
+FINISHED = ("done", "failed")
+POLL_INTERVAL = 0.25 # How often a waiting viewer checks for progress made by another process
+
+
+class AnalysisJobQueue:
+    """
+    Persistent queue of Smart Face Trainer jobs, run one at a time by the sync worker.
+
+    Analysing a person takes minutes on a cold cache, so the web request only queues a job and the
+    browser polls it. Jobs run in the process holding the sync worker lease, whose analysis process
+    pool loads dlib and its models once and keeps them warm between jobs; web workers never import
+    the analyzer. Every write bumps the job's `updates` counter, so pollers can wait for the next
+    change instead of re-fetching on a timer.
+    """
+
+    def __init__(self, db_path, history=50):
+        self.db_path = db_path
+        self.history = history
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._changed = threading.Condition()
+        self._conn = None
+        self._thread = None
+        self._stopping = False
+        self._app = None
+
+    def open(self):
+        """Opens the job store. Every process that submits or polls jobs needs this; only the sync worker runs them."""
+        if self._conn is not None:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def start_worker(self, app):
+        """Re-queues interrupted jobs and starts the worker thread. Called by the sync worker (see app/worker.py)."""
+        self.open()
+        self._app = app
+        self._stopping = False
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock, self._conn:
+            # Faces analysed before the interruption are in the embedding cache, so a rerun is cheap.
+            self._conn.execute("UPDATE analysis_jobs SET status = 'queued', updates = updates + 1 WHERE status = 'running'")
+        self._thread = threading.Thread(target=self._run, name="analysis-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, person_id, num_suggestions=5, max_faces=50):
+        """
+        Queues an analysis of one person's faces.
+
+        Returns:
+            dict: The queued job. If the person already has a queued or running job, that job is
+            returned instead of queueing another.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                SELECT_JOBS + " WHERE person_id = ? AND status IN ('queued', 'running') ORDER BY job_id LIMIT 1", (person_id,)
+            ).fetchone()
+            if row is not None:
+                return self._job_dict(row)
+            cursor = self._conn.execute(
+                "INSERT INTO analysis_jobs (person_id, status, num_suggestions, max_faces, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (person_id, num_suggestions, max_faces, time.time())
+            )
+            job_id = cursor.lastrowid
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id):
+        with self._lock:
+            row = self._conn.execute(SELECT_JOBS + " WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    def wait_for_update(self, job_id, since, timeout):
+        """
+        Returns the job once its `updates` counter is past `since`, or after `timeout` seconds.
+
+        Returns:
+            dict: The job, or None if it doesn't exist.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get_job(job_id)
+            if job is None or job["updates"] > since or job["status"] in FINISHED:
+                return job
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(POLL_INTERVAL, remaining))
+
+    @staticmethod
+    def _job_dict(row):
+        job = dict(zip(JOB_COLUMNS, row))
+        job["id"] = job.pop("job_id")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _update(self, job_id, sql, params=()):
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE analysis_jobs SET updates = updates + 1, {sql} WHERE job_id = ?", (*params, job_id))
+        with self._changed:
+            self._changed.notify_all()
+
+    def _claim_next(self):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(SELECT_JOBS + " WHERE status = 'queued' ORDER BY job_id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE analysis_jobs SET status = 'running', updates = updates + 1, started_at = ? WHERE job_id = ?",
+                (time.time(), row[0])
+            )
+        return self._job_dict(row)
+
+    def _finish(self, job_id, result=None, error=None):
+        self._update(
+            job_id, "status = ?, result = ?, error = ?, finished_at = ?",
+            ("failed" if error else "done", json.dumps(result) if result is not None else None, error, time.time())
+        )
+        if self.history > 0:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "DELETE FROM analysis_jobs WHERE status IN ('done', 'failed') AND job_id NOT IN "
+                    "(SELECT job_id FROM analysis_jobs WHERE status IN ('done', 'failed') ORDER BY job_id DESC LIMIT ?)",
+                    (self.history,)
+                )
+
+    def _analyze(self, job):
+        from . import face_analyzer # Imported here so processes that never analyse don't pay for it
+
+        reason = face_analyzer.unavailable_reason()
+        if reason:
+            self._finish(job["id"], error=reason)
+            return
+        faces = [
+            dict(face, thumbnailUrl=f"/api/faces/{face['id']}/thumbnail")
+            for face in face_index.get_faces(job["person_id"])
+        ]
+
+        last_write = 0
+        def progress(done, total):
+            nonlocal last_write
+            # A few writes a second are plenty for a progress bar.
+            if done == 0 or done == total or time.monotonic() - last_write >= 0.5:
+                last_write = time.monotonic()
+                self._update(job["id"], "faces_done = ?, faces_total = ?", (done, total))
+
+        suggested = face_analyzer.analyze_and_suggest_faces(
+            faces, self._app.logger, num_suggestions=job["num_suggestions"],
+            max_faces_to_analyze=job["max_faces"], progress=progress
+        )
+        self._finish(job["id"], result={"suggested_face_ids": suggested, "faces": len(faces)})
+
+    def _run(self):
+        while not self._stopping:
+            job = self._claim_next()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(1) # Also polls for jobs submitted by other processes
+                continue
+            self._app.logger.info(f"Running face analysis job {job['id']} for person {job['person_id']}.")
+            try:
+                self._analyze(job)
+            except Exception as e:
+                logger.exception(f"Analysis job {job['id']} failed")
+                self._finish(job["id"], error=str(e))
+
+
+analysis_queue = AnalysisJobQueue(Config.STATE_DB, history=Config.ANALYSIS_JOB_HISTORY)
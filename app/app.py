@@ -1,19 +1,32 @@
-from flask import Flask, render_template, jsonify, request
-import threading
-from apscheduler.schedulers.background import BackgroundScheduler
-import atexit
+from flask import Flask, render_template, jsonify, request, Response
+import time
 import logging
 import requests
 
 from .config import Config
-from .status_manager import status_manager
-from .sync_logic import run_sync
-from .mqtt_client import mqtt_client # Import the MQTT client
+from .status_manager import status_manager, LEVELS as LOG_LEVELS, MAX_LOG_ENTRIES
+from .job_queue import job_queue
+from .analysis_jobs import analysis_queue
+from .worker import start_sync_worker
+from .face_index import face_index
+from .people_cache import people_cache
+from .thumbnail_cache import thumbnail_cache
+from .state_manager import StateManager
+from .reconcile import reconcile, collect_desired_faces, plan_reconcile, summarize_plan
+from .sync_plan import build_sync_plan, plan_report
+from . import metrics
 
 # Configure logging for APScheduler
 logging.basicConfig(level=logging.INFO)
 
-def create_app():
+def create_app(sync_worker=None):
+    """
+    Builds the web app.
+
+    Args:
+        sync_worker (bool): Whether this process competes for the sync worker role. Defaults to
+            SYNC_WORKER=embedded; with SYNC_WORKER=external a separate `python -m app.worker` runs syncs.
+    """
     app = Flask(__name__)
     
     # Configure app logging
@@ -33,35 +46,37 @@ def create_app():
         # In a real app, you might exit or have a dedicated error page
         # For now, we'll just log and let the app start, but it won't function correctly.
 
-    # Initialize scheduler
-    scheduler = BackgroundScheduler()
-    
-    # Function to be scheduled
-    def scheduled_sync_job():
-        app.logger.info("Attempting scheduled sync...")
-        # For scheduled syncs, we process all people (no specific person_ids or max_faces)
-        if status_manager.start_sync():
-            sync_thread = threading.Thread(target=run_sync, args=(app, status_manager, None, None,))
-            sync_thread.start()
-        else:
-            app.logger.info("Scheduled sync skipped: A sync is already in progress.")
-
-    # Add scheduled job if interval is set
-    if Config.SYNC_SCHEDULE_INTERVAL_HOURS > 0:
-        scheduler.add_job(
-            func=scheduled_sync_job,
-            trigger='interval',
-            hours=Config.SYNC_SCHEDULE_INTERVAL_HOURS,
-            id='scheduled_sync',
-            name='Scheduled Immich-Frigate Sync',
-            replace_existing=True
-        )
-        scheduler.start()
-        app.logger.info(f"Scheduled sync enabled: every {Config.SYNC_SCHEDULE_INTERVAL_HOURS} hours.")
-
-    # Shut down the scheduler and MQTT client when exiting the app
-    atexit.register(lambda: scheduler.shutdown())
-    atexit.register(lambda: mqtt_client.disconnect()) # Disconnect MQTT on exit
+    # Jobs can be submitted from any process; they run in the process holding the sync worker
+    # lease, which also owns the schedule and the MQTT connection (see app/worker.py).
+    job_queue.open(status_manager)
+    analysis_queue.open()
+    if sync_worker is None:
+        sync_worker = Config.SYNC_WORKER == "embedded"
+    if sync_worker:
+        start_sync_worker(app)
+    if Config.IMMICH_API_URL:
+        people_cache.refresh_in_background() # Warm the people list so the first page load doesn't wait on Immich
+
+    # Per-route latency and in-flight requests for /metrics. Labels use the route pattern, not the URL.
+    @app.before_request
+    def start_request_timer():
+        request.metrics_start = time.perf_counter()
+        metrics.HTTP_IN_FLIGHT.inc()
+
+    @app.after_request
+    def observe_request(response):
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.labels(endpoint, request.method, response.status_code).observe(time.perf_counter() - request.metrics_start)
+        return response
+
+    @app.teardown_request
+    def end_request(exc):
+        metrics.HTTP_IN_FLIGHT.dec()
+
+    @app.route('/metrics')
+    def get_metrics():
+        body, content_type = metrics.render()
+        return Response(body, content_type=content_type)
 
     @app.route('/')
     def index():
@@ -70,86 +85,207 @@ def create_app():
     @app.route('/api/people')
     def get_people():
         try:
-            people_url = f"{Config.IMMICH_API_URL}/api/people"
-            headers = {"x-api-key": Config.IMMICH_API_KEY, "Accept": "application/json"}
-            response = requests.get(people_url, headers=headers)
-            response.raise_for_status()
-            return jsonify(response.json())
+            # Served from the shared cache; a stale list is returned at once while it is revalidated.
+            people = people_cache.snapshot()
         except requests.exceptions.RequestException as e:
             app.logger.error(f"Error fetching people from Immich: {e}")
             return jsonify({"error": f"Could not fetch people from Immich: {e}"}), 500
+        response = Response(people.body, mimetype='application/json')
+        response.set_etag(people.etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
 
     @app.route('/api/people/<person_id>/faces')
     def get_person_faces(person_id):
         try:
             page = request.args.get('page', 1, type=int)
             page_size = request.args.get('pageSize', 20, type=int) # Default to 20 faces per page
+            page = max(page, 1)
+            page_size = min(max(page_size, 1), 500)
+            # An explicit offset takes precedence over page numbers.
+            offset = max(request.args.get('offset', (page - 1) * page_size, type=int), 0)
 
-            # Step 1: Get assets for the person
-            # Immich API does not directly support pagination for faces within a person object.
-            # We need to fetch all assets for the person, then all faces from those assets,
-            # and then apply pagination on our side.
-            assets_url = f"{Config.IMMICH_API_URL}/api/assets?personId={person_id}"
-            headers = {"x-api-key": Config.IMMICH_API_KEY, "Accept": "application/json"}
-            assets_response = requests.get(assets_url, headers=headers)
-            assets_response.raise_for_status()
-            assets = assets_response.json()
-
-            all_faces = []
-            for asset in assets:
-                asset_id = asset.get('id')
-                if not asset_id:
-                    continue
-
-                # Step 2: Get details for each asset to extract faces
-                asset_detail_url = f"{Config.IMMICH_API_URL}/api/assets/{asset_id}"
-                asset_detail_response = requests.get(asset_detail_url, headers=headers)
-                asset_detail_response.raise_for_status()
-                asset_detail = asset_detail_response.json()
-
-                if 'faces' in asset_detail:
-                    for face in asset_detail['faces']:
-                        # Ensure the face belongs to the requested person
-                        if face.get('personId') == person_id:
-                            all_faces.append({
-                                'id': face.get('id'),
-                                'assetId': asset_id,
-                                'personId': face.get('personId'),
-                                'boundingBox': face.get('boundingBox'),
-                                'thumbnailUrl': f"{Config.IMMICH_API_URL}/api/faces/{face.get('id')}/thumbnail"
-                            })
-            
-            total_faces = len(all_faces)
-            start_index = (page - 1) * page_size
-            end_index = start_index + page_size
-            paginated_faces = all_faces[start_index:end_index]
+            # Faces come from the in-memory face index, which is built from /api/people/{id}/faces
+            # once and then revalidated cheaply, so page 2 is a slice rather than another crawl.
+            faces, total_faces = face_index.page(person_id, offset, page_size)
+            paginated_faces = [{
+                'id': face.get('id'),
+                'assetId': face.get('assetId'),
+                'personId': person_id,
+                'boundingBox': face.get('boundingBox'),
+                # Served through Frimmich's cache; the browser can't send the Immich API key itself.
+                'thumbnailUrl': f"/api/faces/{face.get('id')}/thumbnail"
+            } for face in faces]
 
+            next_offset = offset + len(paginated_faces)
             return jsonify({
                 "faces": paginated_faces,
                 "totalFaces": total_faces,
                 "page": page,
-                "pageSize": page_size
+                "pageSize": page_size,
+                "offset": offset,
+                "nextOffset": next_offset if next_offset < total_faces else None
             })
         except requests.exceptions.RequestException as e:
             app.logger.error(f"Error fetching faces for person {person_id} from Immich: {e}")
             return jsonify({"error": f"Could not fetch faces for person {person_id} from Immich: {e}"}), 500
 
+    @app.route('/api/people/<person_id>/suggest_faces', methods=['POST'])
+    def suggest_faces(person_id):
+        # Analysis runs as a background job in the sync worker; poll /api/analysis/<id> for progress and the result.
+        data = request.get_json(silent=True) or {}
+        try:
+            num_suggestions = min(max(int(data.get('num_suggestions', 5)), 1), 50)
+            max_faces = min(max(int(data.get('max_faces_to_analyze', 50)), 1), 1000)
+        except (TypeError, ValueError):
+            return jsonify({"error": "num_suggestions and max_faces_to_analyze must be integers."}), 400
+        job = analysis_queue.submit(person_id, num_suggestions=num_suggestions, max_faces=max_faces)
+        return jsonify({"message": "Analysis queued.", "job": job}), 202
+
+    @app.route('/api/analysis/<int:job_id>')
+    def get_analysis_job(job_id):
+        # With `since` (the job's last seen `updates`), waits up to `timeout` seconds for progress.
+        since = request.args.get('since', None, type=int)
+        if since is None:
+            job = analysis_queue.get_job(job_id)
+        else:
+            timeout = min(max(request.args.get('timeout', 25, type=float), 0), 55)
+            job = analysis_queue.wait_for_update(job_id, since, timeout)
+        if job is None:
+            return jsonify({"error": f"Analysis job {job_id} not found."}), 404
+        return jsonify(job)
+
+    @app.route('/api/faces/<face_id>/thumbnail')
+    def get_face_thumbnail(face_id):
+        size = request.args.get('size', 0, type=int)
+        try:
+            data, etag = thumbnail_cache.get(face_id, size)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 502
+            return jsonify({"error": f"Could not fetch thumbnail for face {face_id} from Immich: {e}"}), 404 if status == 404 else 502
+        except requests.exceptions.RequestException as e:
+            app.logger.error(f"Error fetching thumbnail for face {face_id} from Immich: {e}")
+            return jsonify({"error": f"Could not fetch thumbnail for face {face_id} from Immich: {e}"}), 502
+
+        response = Response(data, mimetype='image/jpeg')
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = Config.THUMBNAIL_CACHE_MAX_AGE
+        return response.make_conditional(request)
+
     @app.route('/trigger_sync', methods=['POST'])
     def trigger_sync():
         # Expects a list of dictionaries: [{id: "person_id", max_faces: 100}]
         selected_people_data = request.json.get('people', None) 
+        delta = bool(request.json.get('delta', False)) # Opt-in delta mode for manual syncs
+
+        # Queued ahead of scheduled syncs; a running scheduled sync pauses after its current person.
+        job = job_queue.submit("manual", people=selected_people_data, delta=delta)
+        return jsonify({"message": "Sync queued.", "job": job}), 202
+
+    @app.route('/api/sync/plan', methods=['POST'])
+    def plan_sync():
+        # Dry run of /trigger_sync with the same body: lists faces and applies the selection rules
+        # and skip-state, then reports what a sync would fetch, write and delete, and its cost.
+        data = request.get_json(silent=True) or {}
+        selected_people_data = data.get('people', None)
+        delta = bool(data.get('delta', False))
+        try:
+            max_items = min(max(int(data.get('max_items', 1000)), 0), 100000)
+        except (TypeError, ValueError):
+            return jsonify({"error": "max_items must be an integer."}), 400
+
+        state_manager = StateManager(Config.STATE_DB, legacy_state_file=Config.STATE_FILE)
+        try:
+            # Planning lists faces inside this request, so it stops listing at the deadline and reports a partial plan.
+            deadline = time.monotonic() + Config.PLAN_TIMEOUT_SECONDS if Config.PLAN_TIMEOUT_SECONDS > 0 else None
+            # Reconcile is previewed even when RECONCILE_ON_SYNC is off or RECONCILE_DRY_RUN is on; the report says which.
+            with build_sync_plan(state_manager, selected_people_data, delta=delta, deadline=deadline, record_desired=True) as plan:
+                if selected_people_data is not None:
+                    reconcile_report = {"skipped": "Only full syncs reconcile."}
+                elif plan.desired is None:
+                    reconcile_report = {"skipped": "The plan stopped before listing every person."}
+                else:
+                    reconcile_plan = plan_reconcile(state_manager, plan.desired)
+                    if reconcile_plan is None:
+                        reconcile_report = {"skipped": "Immich returned no faces although some are synced."}
+                    else:
+                        reconcile_report = {"summary": summarize_plan(reconcile_plan), "plan": reconcile_plan}
+                report = plan_report(plan, state_manager.sync_stats(), reconcile_report, max_items=max_items)
+        except requests.exceptions.RequestException as e:
+            app.logger.error(f"Error planning sync: {e}")
+            return jsonify({"error": f"Could not fetch faces from Immich: {e}"}), 500
+        finally:
+            state_manager.close()
+        return jsonify(report)
 
-        if not status_manager.start_sync():
+    @app.route('/api/jobs')
+    def list_jobs():
+        return jsonify({"jobs": job_queue.list_jobs()})
+
+    @app.route('/api/jobs/<int:job_id>')
+    def get_job(job_id):
+        job = job_queue.get_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        return jsonify(job)
+
+    @app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        job = job_queue.get_job(job_id)
+        if job is None:
+            return jsonify({"error": f"Job {job_id} not found."}), 404
+        if job["status"] not in ("queued", "running"):
+            return jsonify({"error": f"Job {job_id} already finished."}), 409
+        # A running job stops once its in-flight faces are done; the response shows cancel_requested.
+        return jsonify(job_queue.cancel(job_id)), 202
+
+    @app.route('/api/reconcile', methods=['POST'])
+    def trigger_reconcile():
+        # Defaults to a dry run that only reports what would be moved or removed.
+        dry_run = bool((request.get_json(silent=True) or {}).get('dry_run', True))
+        if not dry_run and not status_manager.start_sync():
             return jsonify({"error": "Sync already in progress."}), 409
 
-        # Run the sync logic in a background thread, passing selected people data
-        sync_thread = threading.Thread(target=run_sync, args=(app, status_manager, selected_people_data,))
-        sync_thread.start()
-        
-        return jsonify({"message": "Sync started."}), 202
+        state_manager = StateManager(Config.STATE_DB, legacy_state_file=Config.STATE_FILE)
+        try:
+            report = reconcile(state_manager, collect_desired_faces(), dry_run=dry_run, logger=status_manager.add_log)
+        except Exception as e:
+            app.logger.error(f"Error during reconcile: {e}")
+            if not dry_run:
+                status_manager.end_sync({"message": f"Reconcile failed: {e}", "status": "Failure"})
+            if isinstance(e, requests.exceptions.RequestException):
+                return jsonify({"error": f"Could not fetch faces from Immich: {e}"}), 500
+            return jsonify({"error": f"Reconcile failed: {e}"}), 500
+        finally:
+            state_manager.close()
+
+        if not dry_run:
+            status_manager.end_sync({"message": "Reconcile complete.", "status": "Success", "reconcile": report["summary"]})
+        return jsonify(report)
 
     @app.route('/status')
     def get_status():
         return jsonify(status_manager.get_status())
 
+    @app.route('/logs')
+    def get_logs():
+        # Cursor tailing: pass the previous response's `next` as `since` to get only newer entries.
+        since = request.args.get('since', None, type=int)
+        level = request.args.get('level', None)
+        if level is not None and level.upper() not in LOG_LEVELS:
+            return jsonify({"error": f"Unknown level {level}; use one of {', '.join(LOG_LEVELS)}."}), 400
+        limit = request.args.get('limit', MAX_LOG_ENTRIES, type=int)
+        return jsonify(status_manager.get_logs(since, level=level, limit=limit))
+
+    @app.route('/status/changes')
+    def get_status_changes():
+        # Long-poll: returns as soon as anything newer than `since` exists, or after `timeout` seconds.
+        since = request.args.get('since', None, type=int)
+        timeout = min(max(request.args.get('timeout', 25, type=float), 0), 55)
+        return jsonify(status_manager.get_changes(since, timeout))
+
     return app
\ No newline at end of file
@@ -4,14 +4,64 @@ class Config:
     IMMICH_API_URL = os.getenv("IMMICH_API_URL")
     IMMICH_API_KEY = os.getenv("IMMICH_API_KEY")
     FRIGATE_FACES_DIR = os.getenv("FRIGATE_FACES_DIR", "/app/frigate_faces")
+    FRIGATE_FACE_JPEG_QUALITY = int(os.getenv("FRIGATE_FACE_JPEG_QUALITY", "90")) # Quality for re-encoded face crops
+    FRIGATE_FACE_MAX_SIZE = int(os.getenv("FRIGATE_FACE_MAX_SIZE", "320")) # Longest side of saved faces in pixels; 0 keeps the crop size
     SKIP_EXISTING_FACES = os.getenv("SKIP_EXISTING_FACES", "true").lower() == "true"
     UI_PORT = int(os.getenv("UI_PORT", "8080"))
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
     DATA_DIR = "/app/data"
-    STATE_FILE = os.path.join(DATA_DIR, "synced_faces_state.json")
+    STATE_FILE = os.path.join(DATA_DIR, "synced_faces_state.json") # Legacy JSON state, migrated into STATE_DB on first start
+    STATE_DB = os.path.join(DATA_DIR, "frimmich_state.db")
+    STATUS_DB = os.path.join(DATA_DIR, "frimmich_status.db") # Sync status and logs, shared by all processes
+    STATUS_LOG_CAPACITY = int(os.getenv("STATUS_LOG_CAPACITY", "1000")) # Sync log entries kept (a ring; the oldest are overwritten)
     TEMP_DIR = "/tmp/faces"
     MAX_FACES_PER_PERSON = int(os.getenv("MAX_FACES_PER_PERSON", "100"))
     SYNC_SCHEDULE_INTERVAL_HOURS = int(os.getenv("SYNC_SCHEDULE_INTERVAL_HOURS", "0"))
+    DELTA_SYNC = os.getenv("DELTA_SYNC", "true").lower() == "true" # Scheduled syncs skip people unchanged since their last sync
+    RECONCILE_ON_SYNC = os.getenv("RECONCILE_ON_SYNC", "true").lower() == "true" # Move/remove stale face files after full syncs
+    RECONCILE_DRY_RUN = os.getenv("RECONCILE_DRY_RUN", "false").lower() == "true" # Only log what reconcile would change
+    DELTA_SYNC_FULL_RECHECK_HOURS = int(os.getenv("DELTA_SYNC_FULL_RECHECK_HOURS", "24")) # Re-list every person at least this often (0 = never)
+    FACE_RANKING = os.getenv("FACE_RANKING", "true").lower() == "true" # Non-curated syncs pick the best faces by metadata, not Immich's order
+    FACE_MIN_SIZE = int(os.getenv("FACE_MIN_SIZE", "48")) # Faces whose box is narrower or shorter (source pixels) are never synced
+    FACE_DEDUP = os.getenv("FACE_DEDUP", "true").lower() == "true" # Skip near-duplicate faces in non-curated syncs
+    FACE_DEDUP_MAX_DISTANCE = int(os.getenv("FACE_DEDUP_MAX_DISTANCE", "5")) # Max dHash Hamming distance (of 64 bits) counted as a duplicate
+    SYNC_JOB_HISTORY = int(os.getenv("SYNC_JOB_HISTORY", "50")) # Finished sync jobs kept for /api/jobs
+    SYNC_WORKER = os.getenv("SYNC_WORKER", "embedded").lower() # "embedded" (a web process runs syncs) or "external" (python -m app.worker)
+    WORKER_LEASE_SECONDS = int(os.getenv("WORKER_LEASE_SECONDS", "30")) # A dead sync worker is replaced after this long
+    PLAN_TIMEOUT_SECONDS = float(os.getenv("PLAN_TIMEOUT_SECONDS", "20")) # POST /api/sync/plan stops listing people after this long (0 = no limit)
+
+    # Shared /api/people cache (UI and sync)
+    PEOPLE_CACHE_TTL_SECONDS = int(os.getenv("PEOPLE_CACHE_TTL_SECONDS", "60")) # Served without revalidation for this long
+    PEOPLE_CACHE_MAX_STALE_SECONDS = int(os.getenv("PEOPLE_CACHE_MAX_STALE_SECONDS", "3600")) # Stale list served while a background refresh runs
+    PEOPLE_PAGE_SIZE = int(os.getenv("PEOPLE_PAGE_SIZE", "500")) # People per /api/people page when a sync pages through the library
+
+    # Curation UI face index
+    FACE_INDEX_TTL_SECONDS = int(os.getenv("FACE_INDEX_TTL_SECONDS", "300")) # How long a person's face list is served before revalidation
+    FACE_INDEX_MAX_PEOPLE = int(os.getenv("FACE_INDEX_MAX_PEOPLE", "256")) # People kept in the index (least recently used are evicted)
+    THUMBNAIL_CACHE_DIR = os.path.join(DATA_DIR, "thumbnail_cache")
+    THUMBNAIL_CACHE_MAX_MB = int(os.getenv("THUMBNAIL_CACHE_MAX_MB", "512")) # On-disk thumbnail cache size (0 disables it)
+    THUMBNAIL_CACHE_MAX_AGE = int(os.getenv("THUMBNAIL_CACHE_MAX_AGE", "86400")) # Browser Cache-Control max-age in seconds
+    THUMBNAIL_CACHE_JPEG_QUALITY = int(os.getenv("THUMBNAIL_CACHE_JPEG_QUALITY", "85")) # Quality of downscaled thumbnail variants
+
+    # Sync pipeline concurrency
+    SYNC_PERSON_WORKERS = int(os.getenv("SYNC_PERSON_WORKERS", "4")) # People whose face lists are fetched in parallel
+    SYNC_FACE_WORKERS = int(os.getenv("SYNC_FACE_WORKERS", "8")) # Faces downloaded/cropped/saved in parallel
+    IMMICH_MAX_CONCURRENT_REQUESTS = int(os.getenv("IMMICH_MAX_CONCURRENT_REQUESTS", "8")) # Global cap on in-flight Immich requests
+
+    # Shared HTTP client (Immich and Frigate)
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3")) # Retries on connection errors and 429/5xx (GET only)
+    HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.5")) # Base delay in seconds for jittered exponential backoff
+
+    # Smart Face Trainer
+    ANALYZER_PROCESSES = int(os.getenv("ANALYZER_PROCESSES", "0")) # Analysis processes; 0 = one per available core
+    ANALYZER_DOWNLOAD_WORKERS = int(os.getenv("ANALYZER_DOWNLOAD_WORKERS", "8")) # Threads downloading thumbnails for analysis
+    ANALYZER_MIN_EMBEDDING_DISTANCE = float(os.getenv("ANALYZER_MIN_EMBEDDING_DISTANCE", "0.6")) # Suggested faces must be at least this far apart
+    ANALYZER_DIVERSITY_WEIGHT = float(os.getenv("ANALYZER_DIVERSITY_WEIGHT", "0")) # >0 blends farthest-point selection into the quality ranking
+    EMBEDDING_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000")) # ~51 MB of embeddings at the default
+    ANALYSIS_JOB_HISTORY = int(os.getenv("ANALYSIS_JOB_HISTORY", "50")) # Finished analysis jobs kept for /api/analysis
 
     # MQTT Configuration
     MQTT_HOST = os.getenv("MQTT_HOST")
@@ -19,11 +69,24 @@ class Config:
     MQTT_USERNAME = os.getenv("MQTT_USERNAME")
     MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
     MQTT_TOPIC_PREFIX = os.getenv("MQTT_TOPIC_PREFIX", "frimmich")
+    MQTT_PROGRESS_INTERVAL = float(os.getenv("MQTT_PROGRESS_INTERVAL", "1.0")) # Min seconds between sync_progress publishes
+    MQTT_TOPIC_QOS = os.getenv("MQTT_TOPIC_QOS", "") # Per-topic QoS overrides, e.g. "sync_progress=0,status=1"
+    MQTT_TOPIC_RETAIN = os.getenv("MQTT_TOPIC_RETAIN", "") # Per-topic retain overrides, e.g. "sync_summary=true"
 
     # Frigate API for restart
     FRIGATE_API_URL = os.getenv("FRIGATE_API_URL") # Base URL for Frigate API (e.g., http://frigate.local:5000)
+    FRIGATE_MAX_CONCURRENT_REQUESTS = int(os.getenv("FRIGATE_MAX_CONCURRENT_REQUESTS", "4"))
+    FRIGATE_DELIVERY = os.getenv("FRIGATE_DELIVERY", "files").lower() # "files" (faces directory + restart) or "api" (face library API)
+    FRIGATE_RESTART_DEBOUNCE_SECONDS = float(os.getenv("FRIGATE_RESTART_DEBOUNCE_SECONDS", "30")) # Back-to-back syncs share one restart
+    FRIGATE_DELETE_BATCH_SIZE = int(os.getenv("FRIGATE_DELETE_BATCH_SIZE", "50")) # Face IDs per face library delete call
 
     @staticmethod
     def validate():
         if not Config.IMMICH_API_URL or not Config.IMMICH_API_KEY or not Config.FRIGATE_FACES_DIR:
-            raise ValueError("Missing required environment variables: IMMICH_API_URL, IMMICH_API_KEY, FRIGATE_FACES_DIR")
\ No newline at end of file
+            raise ValueError("Missing required environment variables: IMMICH_API_URL, IMMICH_API_KEY, FRIGATE_FACES_DIR")
+        if Config.FRIGATE_DELIVERY not in ("files", "api"):
+            raise ValueError("FRIGATE_DELIVERY must be 'files' or 'api'")
+        if Config.SYNC_WORKER not in ("embedded", "external"):
+            raise ValueError("SYNC_WORKER must be 'embedded' or 'external'")
+        if Config.FRIGATE_DELIVERY == "api" and not Config.FRIGATE_API_URL:
+            raise ValueError("FRIGATE_DELIVERY=api requires FRIGATE_API_URL")
\ No newline at end of file
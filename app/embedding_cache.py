@@ -0,0 +1,162 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+EMBEDDING_SIZE = 128
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    face_id TEXT PRIMARY KEY,
+    slot INTEGER,
+    source_key TEXT,
+    content_hash TEXT,
+    clarity REAL,
+    frontal_score REAL,
+    lighting_score REAL,
+    last_access REAL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+"""
+
+
+def face_source_key(face):
+    """
+    Fingerprint of a face's source as Immich describes it, available before any download.
+
+    If the face is moved to another asset or its bounding box changes, the key changes and
+    the cached analysis is treated as stale.
+    """
+    box = face.get('boundingBox') or {}
+    parts = [
+        face.get('assetId') or '',
+        *(str(box.get(k, '')) for k in ('x1', 'y1', 'x2', 'y2')),
+        str(face.get('imageWidth', '')),
+        str(face.get('imageHeight', '')),
+    ]
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of face embeddings and quality scores for the Smart Face Trainer.
+
+    Embeddings live in a fixed-capacity, memory-mapped float32 array (one 128-d row per slot);
+    scores, source keys, content hashes and access times live in a SQLite side index. When the
+    cache is full the least recently used entries are evicted and their slots reused. Faces in
+    which no face was detected are cached too (without a slot) so they aren't re-analyzed.
+    """
+
+    def __init__(self, cache_dir, max_entries=100000):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        embeddings_path = os.path.join(cache_dir, "embeddings.f32")
+        capacity_bytes = self.max_entries * EMBEDDING_SIZE * 4
+        if not os.path.exists(embeddings_path) or os.path.getsize(embeddings_path) != capacity_bytes:
+            # A capacity change invalidates every slot.
+            with open(embeddings_path, "wb") as f:
+                f.truncate(capacity_bytes) # Sparse on most filesystems
+            with self._conn:
+                self._conn.execute("DELETE FROM entries")
+        self._embeddings = np.memmap(embeddings_path, dtype=np.float32, mode="r+", shape=(self.max_entries, EMBEDDING_SIZE))
+
+        used_slots = set(row[0] for row in self._conn.execute("SELECT slot FROM entries WHERE slot IS NOT NULL"))
+        self._free_slots = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used_slots]
+
+    def _to_face(self, face_id, row):
+        slot, clarity, frontal_score, lighting_score = row
+        if slot is None:
+            return {'id': face_id, 'no_face': True}
+        return {
+            'id': face_id,
+            # Copy out of the memmap so callers can't accidentally write through to the cache.
+            'embedding': np.array(self._embeddings[slot], dtype=np.float64),
+            'clarity': clarity,
+            'frontal_score': frontal_score,
+            'lighting_score': lighting_score
+        }
+
+    def get(self, face_id, source_key=None, content_hash=None):
+        """
+        Returns the cached analysis for a face, or None on a miss.
+
+        An entry only counts as a hit when the given source_key or content_hash matches what was stored.
+        A hit for a face with no detectable face is returned as {'id': ..., 'no_face': True}.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT slot, clarity, frontal_score, lighting_score, source_key, content_hash FROM entries WHERE face_id = ?",
+                (face_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored_source_key, stored_content_hash = row[4], row[5]
+            source_matches = source_key is not None and source_key == stored_source_key
+            content_matches = content_hash is not None and content_hash == stored_content_hash
+            if not source_matches and not content_matches:
+                return None
+            with self._conn:
+                # A content match under a new source key means the face's metadata changed but the image didn't.
+                self._conn.execute(
+                    "UPDATE entries SET last_access = ?, source_key = COALESCE(?, source_key) WHERE face_id = ?",
+                    (time.time(), source_key, face_id)
+                )
+            return self._to_face(face_id, row[:4])
+
+    def put(self, face_id, analyzed_face, source_key=None, content_hash=None):
+        """Stores an analysis result. Pass analyzed_face=None for images where no face was detected."""
+        with self._lock:
+            existing = self._conn.execute("SELECT slot FROM entries WHERE face_id = ?", (face_id,)).fetchone()
+            slot = existing[0] if existing else None
+            if analyzed_face is None:
+                if slot is not None:
+                    self._free_slots.append(slot)
+                    slot = None
+                values = (None, None, None)
+            else:
+                if slot is None:
+                    slot = self._allocate_slot()
+                self._embeddings[slot] = np.asarray(analyzed_face['embedding'], dtype=np.float32)
+                values = (analyzed_face['clarity'], analyzed_face['frontal_score'], analyzed_face['lighting_score'])
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (face_id, slot, source_key, content_hash, clarity, frontal_score, lighting_score, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (face_id, slot, source_key, content_hash, *values, time.time())
+                )
+                # Keep the side index bounded too, counting entries without a slot.
+                self._conn.execute(
+                    "DELETE FROM entries WHERE slot IS NULL AND face_id IN "
+                    "(SELECT face_id FROM entries WHERE slot IS NULL ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+
+    def _allocate_slot(self):
+        # Caller holds self._lock.
+        if not self._free_slots:
+            evicted = self._conn.execute(
+                "SELECT face_id, slot FROM entries WHERE slot IS NOT NULL ORDER BY last_access ASC LIMIT ?",
+                (max(1, self.max_entries // 100),) # Evict in small batches to amortize the index query
+            ).fetchall()
+            with self._conn:
+                self._conn.executemany("DELETE FROM entries WHERE face_id = ?", ((face_id,) for face_id, _ in evicted))
+            self._free_slots.extend(slot for _, slot in evicted)
+        return self._free_slots.pop()
+
+    def flush(self):
+        with self._lock:
+            self._embeddings.flush()
+
+    def close(self):
+        with self._lock:
+            self._embeddings.flush()
+            self._conn.close()
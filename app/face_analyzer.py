@@ -1,50 +1,150 @@
 import os
+import time
+import hashlib
+import logging
+import importlib.util
+import multiprocessing
 import requests
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 from io import BytesIO
 import numpy as np
-import dlib
-import face_recognition
-from skimage.filters import laplacian
-from scipy.spatial.distance import euclidean
 
 from .config import Config
+from .http_client import immich_client
+from .embedding_cache import EmbeddingCache, face_source_key
+from .face_selection import quality_scores, select_diverse_faces
+from .metrics import ANALYZER_STAGES
 
-# Initialize dlib's face detector and shape predictor
+# dlib's face detector and shape predictor
 # You'll need to download shape_predictor_68_face_landmarks.dat
 # from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
 # and place it in a known location, e.g., next to this file or in a 'models' directory.
 # For simplicity, let's assume it's in the same directory for now.
 # In a production environment, manage this model file properly.
-try:
-    face_detector = dlib.get_frontal_face_detector()
-    # Path to the dlib shape predictor model
-    shape_predictor_path = os.path.join(os.path.dirname(__file__), "shape_predictor_68_face_landmarks.dat")
-    face_pose_predictor = dlib.shape_predictor(shape_predictor_path)
-    face_encoder = face_recognition.face_encodings # Uses dlib internally
-except Exception as e:
-    print(f"Error loading dlib models: {e}. Please ensure 'shape_predictor_68_face_landmarks.dat' is available.")
-    face_detector = None
-    face_pose_predictor = None
-    face_encoder = None
-
-
-def download_image(url, api_key, logger):
-    """Downloads an image from a URL."""
+shape_predictor_path = os.path.join(os.path.dirname(__file__), "shape_predictor_68_face_landmarks.dat")
+ANALYZER_MODULES = ("dlib", "face_recognition", "skimage")
+
+# dlib, face_recognition and skimage take seconds to import and load their models, so they are
+# loaded on first use, in the analysis processes only (see load_models), and then stay loaded.
+face_detector = None
+face_pose_predictor = None
+face_encoder = None
+face_descriptor_model = None
+laplacian = None
+_model_error = None
+
+_process_pool = None
+_embedding_cache = None
+
+
+def unavailable_reason():
+    """Returns why the Smart Face Trainer can't run here, or None. Doesn't import the heavy modules."""
+    missing = [name for name in ANALYZER_MODULES if importlib.util.find_spec(name) is None]
+    if missing:
+        return f"Smart Face Trainer dependencies are not installed: {', '.join(missing)}"
+    if not os.path.exists(shape_predictor_path):
+        return f"dlib shape predictor model not found at {shape_predictor_path}"
+    return None
+
+
+def load_models():
+    """
+    Imports dlib and face_recognition and loads the models, once per process.
+
+    Runs as the initializer of each analysis process, so the models are loaded when the pool starts
+    and stay warm for every later job. Returns True if the models are usable.
+    """
+    global face_detector, face_pose_predictor, face_encoder, face_descriptor_model, laplacian, _model_error
+    if face_detector is not None or _model_error is not None:
+        return face_detector is not None
+    try:
+        import dlib
+        import face_recognition
+        from skimage.filters import laplacian as skimage_laplacian
+        face_detector = dlib.get_frontal_face_detector()
+        face_pose_predictor = dlib.shape_predictor(shape_predictor_path)
+        face_encoder = face_recognition.face_encodings # Uses dlib internally
+        # The underlying dlib ResNet model, so an embedding can be computed from landmarks we already have.
+        face_descriptor_model = face_recognition.api.face_encoder
+        laplacian = skimage_laplacian
+    except Exception as e:
+        _model_error = str(e)
+        face_detector = None
+        logging.getLogger(__name__).error(f"Error loading dlib models: {e}. Please ensure 'shape_predictor_68_face_landmarks.dat' is available.")
+        return False
+    return True
+
+
+def _analysis_process_count():
+    if Config.ANALYZER_PROCESSES > 0:
+        return Config.ANALYZER_PROCESSES
+    try:
+        return max(1, len(os.sched_getaffinity(0))) # Respects container CPU pinning
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def _get_process_pool():
+    """
+    Returns the shared process pool used for CPU-bound analysis, creating it on first use.
+
+    The pool is created inside the multi-threaded sync worker, so its processes are started from a
+    forkserver (or spawned) rather than forked, which could inherit a lock held by another thread.
+    """
+    global _process_pool
+    if _process_pool is None:
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(
+            max_workers=_analysis_process_count(), initializer=load_models, mp_context=multiprocessing.get_context(start_method)
+        )
+    return _process_pool
+
+
+def _discard_process_pool(pool):
+    """Shuts down a broken process pool, so the next _get_process_pool starts a fresh one."""
+    global _process_pool
+    if _process_pool is pool:
+        _process_pool = None
+    pool.shutdown(wait=False)
+
+
+def _get_embedding_cache():
+    """Returns the shared on-disk embedding cache, opening it on first use."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(Config.EMBEDDING_CACHE_DIR, max_entries=Config.EMBEDDING_CACHE_MAX_ENTRIES)
+    return _embedding_cache
+
+
+def download_image_bytes(url, logger):
+    """Downloads raw image bytes from a URL through the shared Immich client."""
     try:
-        headers = {"x-api-key": api_key}
-        response = requests.get(url, headers=headers, stream=True)
-        response.raise_for_status()
-        return Image.open(BytesIO(response.content)).convert("RGB")
+        with ANALYZER_STAGES["download"].time():
+            return immich_client.get_bytes(url)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error downloading image from {url}: {e}")
         return None
+
+
+def download_image(url, logger):
+    """Downloads an image from a URL through the shared Immich client."""
+    image_bytes = download_image_bytes(url, logger)
+    if image_bytes is None:
+        return None
+    try:
+        return Image.open(BytesIO(image_bytes)).convert("RGB")
     except Exception as e:
         logger.error(f"Error processing image from {url}: {e}")
         return None
 
-def analyze_face_quality(face_image, logger):
-    """Analyzes clarity, frontal angle, and basic lighting for a single face image."""
+def analyze_face_quality(face_image, logger, shape=None):
+    """
+    Analyzes clarity, frontal angle, and basic lighting for a single face image.
+
+    If the 68-point landmarks (shape) were already computed, they are reused instead of running detection again.
+    """
     if face_image is None:
         return 0, 0, 0 # clarity, frontal_score, lighting_score
 
@@ -60,12 +160,14 @@ def analyze_face_quality(face_image, logger):
     # 2. Frontal Angle (using dlib's pose predictor)
     frontal_score = 0
     try:
-        # dlib expects RGB image for face detection
-        faces_rects = face_detector(np_image, 1)
-        if len(faces_rects) > 0:
-            # Assuming only one face per cropped image for simplicity
-            shape = face_pose_predictor(np_image, faces_rects[0])
-            
+        if shape is None:
+            # dlib expects RGB image for face detection
+            faces_rects = face_detector(np_image, 1)
+            if len(faces_rects) > 0:
+                # Assuming only one face per cropped image for simplicity
+                shape = face_pose_predictor(np_image, faces_rects[0])
+
+        if shape is not None:
             # Calculate head pose (simplified: just yaw and pitch)
             # This requires more advanced 3D pose estimation, but for a simple score:
             # We can look at the symmetry of landmarks or use a pre-trained pose estimator.
@@ -95,112 +197,208 @@ def analyze_face_quality(face_image, logger):
 
     return clarity, frontal_score, lighting_score
 
-def analyze_and_suggest_faces(all_person_faces, logger, num_suggestions=5, max_faces_to_analyze=50):
+def analyze_face_image(face_id, image_bytes):
+    """
+    CPU-bound analysis of one face thumbnail; runs inside the analysis process pool.
+
+    Detection and 68-point landmarks run once and are reused for both the embedding
+    and the frontal-angle score.
+
+    Returns:
+        tuple: (analyzed face, or None if no face was found or the image couldn't be decoded;
+        {stage: seconds} timings, which the parent records since metrics live in its process).
+    """
+    worker_logger = logging.getLogger(__name__)
+    if not load_models():
+        raise RuntimeError(f"dlib models not loaded: {_model_error}")
+    timings = {}
+    start = time.perf_counter()
+    try:
+        face_image_pil = Image.open(BytesIO(image_bytes)).convert("RGB")
+    except Exception as e:
+        worker_logger.warning(f"Could not decode image for {face_id}: {e}")
+        return None, timings
+
+    # Convert PIL Image to numpy array (RGB) for dlib/face_recognition
+    face_image_np = np.array(face_image_pil)
+
+    faces_rects = face_detector(face_image_np, 1)
+    if len(faces_rects) == 0:
+        timings['detect'] = time.perf_counter() - start
+        return None, timings
+    # Assuming only one face per cropped image for simplicity
+    shape = face_pose_predictor(face_image_np, faces_rects[0])
+    timings['detect'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    face_embedding = np.array(face_descriptor_model.compute_face_descriptor(face_image_np, shape, 1))
+    timings['encode'] = time.perf_counter() - start
+
+    # Analyze quality metrics, reusing the landmarks
+    start = time.perf_counter()
+    clarity, frontal_score, lighting_score = analyze_face_quality(face_image_pil, worker_logger, shape=shape)
+    timings['quality'] = time.perf_counter() - start
+
+    return {
+        'id': face_id,
+        'embedding': face_embedding,
+        'clarity': clarity,
+        'frontal_score': frontal_score,
+        'lighting_score': lighting_score
+    }, timings
+
+
+def analyze_and_suggest_faces(all_person_faces, logger, num_suggestions=5, max_faces_to_analyze=50, progress=None):
     """
     Analyzes a list of face objects and suggests the best ones for training.
+
+    Results are cached on disk per face, so only faces that haven't been seen before (or whose
+    source changed) are downloaded and analyzed; every cached face takes part in the selection.
+    Thumbnails are downloaded on I/O threads and handed to a process pool sized to the
+    available cores as they arrive, so downloads and CPU-bound analysis overlap.
     
     Args:
         all_person_faces (list): List of face dictionaries from Immich API.
         logger: Logger object for logging messages.
         num_suggestions (int): Number of best faces to suggest.
-        max_faces_to_analyze (int): Maximum number of faces to analyze for resource management.
+        max_faces_to_analyze (int): Maximum number of uncached faces to analyze per call, for resource management.
+        progress (callable): Called as progress(analyzed, total) as faces are analyzed.
     
     Returns:
         list: A list of suggested face IDs.
     """
-    if not face_detector or not face_pose_predictor or not face_encoder:
-        logger.error("Dlib models not loaded. Cannot perform smart face analysis.")
+    reason = unavailable_reason()
+    if reason:
+        logger.error(f"{reason}. Cannot perform smart face analysis.")
         return []
 
-    logger.info(f"Starting smart face analysis for {len(all_person_faces)} faces (analyzing up to {max_faces_to_analyze})...")
-    
+    cache = _get_embedding_cache()
     analyzed_faces = []
-    face_embeddings = []
-    
-    # Limit the number of faces to analyze to manage resources
-    faces_for_analysis = all_person_faces[:max_faces_to_analyze]
-
-    for i, face_data in enumerate(faces_for_analysis):
-        face_id = face_data['id']
-        thumbnail_url = face_data['thumbnailUrl'] # Use the thumbnail for analysis to save bandwidth/time
-
-        logger.info(f"Analyzing face {i+1}/{len(faces_for_analysis)}: {face_id}")
-        
-        # Download the face image
-        face_image_pil = download_image(thumbnail_url, Config.IMMICH_API_KEY, logger)
-        if face_image_pil is None:
-            logger.warning(f"Skipping face {face_id} due to download error.")
-            continue
-
-        # Convert PIL Image to numpy array (RGB) for dlib/face_recognition
-        face_image_np = np.array(face_image_pil)
-
-        # Get face embeddings
-        # face_recognition.face_encodings expects a full image, then finds faces.
-        # Since we already have cropped faces, we can pass the cropped image directly.
-        # However, face_recognition.face_encodings internally runs detection.
-        # For a pre-cropped face, we might need to adjust or ensure it's treated as the only face.
-        
-        # A more direct way if we are sure it's a single face:
-        # embeddings = face_recognition.face_encodings(face_image_np, known_face_locations=[(0, face_image_np.shape[1], face_image_np.shape[0], 0)])
-        # For simplicity, let's just run face_encodings on the image, assuming it finds the main face.
-        
-        embeddings = face_encoder(face_image_np)
-        if len(embeddings) == 0:
-            logger.warning(f"No face found in image for {face_id} by face_recognition. Skipping.")
-            continue
-        
-        face_embedding = embeddings[0] # Take the first (and hopefully only) face found
-
-        # Analyze quality metrics
-        clarity, frontal_score, lighting_score = analyze_face_quality(face_image_pil, logger)
-
-        analyzed_faces.append({
-            'id': face_id,
-            'embedding': face_embedding,
-            'clarity': clarity,
-            'frontal_score': frontal_score,
-            'lighting_score': lighting_score
-        })
-        face_embeddings.append(face_embedding)
+    faces_for_analysis = []
+    for face_data in all_person_faces:
+        source_key = face_source_key(face_data)
+        cached_face = cache.get(face_data['id'], source_key=source_key)
+        if cached_face is None:
+            faces_for_analysis.append((face_data, source_key))
+        elif not cached_face.get('no_face'):
+            analyzed_faces.append(cached_face)
+
+    # Limit the number of new faces to analyze to manage resources
+    faces_for_analysis = faces_for_analysis[:max_faces_to_analyze]
+    logger.info(f"Starting smart face analysis for {len(all_person_faces)} faces ({len(analyzed_faces)} cached, analyzing {len(faces_for_analysis)})...")
+    if progress:
+        progress(0, len(faces_for_analysis))
+
+    if faces_for_analysis:
+        process_pool = _get_process_pool()
+        analyses = {} # Future -> (face_id, source_key, content_hash, image_bytes)
+        broken = [] # Faces whose analysis was lost because a pool process died
+
+        def submit(pool, face):
+            try:
+                analyses[pool.submit(analyze_face_image, face[0], face[3])] = face
+            except BrokenProcessPool:
+                broken.append(face)
+
+        with ThreadPoolExecutor(max_workers=max(1, Config.ANALYZER_DOWNLOAD_WORKERS), thread_name_prefix="analyzer-download") as download_pool:
+            # Use the thumbnail for analysis to save bandwidth/time
+            downloads = {
+                download_pool.submit(download_image_bytes, face_data['thumbnailUrl'], logger): (face_data['id'], source_key)
+                for face_data, source_key in faces_for_analysis
+            }
+            for download in as_completed(downloads):
+                face_id, source_key = downloads[download]
+                image_bytes = download.result()
+                if image_bytes is None:
+                    logger.warning(f"Skipping face {face_id} due to download error.")
+                    continue
+                content_hash = hashlib.sha1(image_bytes).hexdigest()
+                cached_face = cache.get(face_id, source_key=source_key, content_hash=content_hash)
+                if cached_face is not None:
+                    # Same image under changed metadata; the stored analysis is still valid.
+                    if not cached_face.get('no_face'):
+                        analyzed_faces.append(cached_face)
+                    continue
+                submit(process_pool, (face_id, source_key, content_hash, image_bytes))
+
+        # Faces served from the cache after downloading count as done right away.
+        done = len(faces_for_analysis) - len(analyses) - len(broken)
+        retried = False
+        while True:
+            for analysis in as_completed(list(analyses)):
+                face = analyses.pop(analysis)
+                face_id, source_key, content_hash, _ = face
+                try:
+                    analyzed_face, timings = analysis.result()
+                except BrokenProcessPool:
+                    broken.append(face)
+                    continue
+                except Exception as e:
+                    analyzed_face, timings = None, None
+                    logger.warning(f"Error analyzing face {face_id}: {e}")
+                done += 1
+                logger.info(f"Analyzed face {done}/{len(faces_for_analysis)}: {face_id}")
+                if progress:
+                    progress(done, len(faces_for_analysis))
+                if timings is None:
+                    continue
+                for stage, seconds in timings.items():
+                    ANALYZER_STAGES[stage].observe(seconds)
+                cache.put(face_id, analyzed_face, source_key=source_key, content_hash=content_hash)
+                if analyzed_face is None:
+                    logger.warning(f"No face found in image for {face_id} by face_recognition. Skipping.")
+                    continue
+                analyzed_faces.append(analyzed_face)
+            if not broken:
+                break
+            # A pool process died (e.g. killed for memory), which breaks the whole pool. Start a
+            # new one and retry its faces once; without this every later job would fail too.
+            _discard_process_pool(process_pool)
+            if retried:
+                logger.warning(f"Analysis process pool broke again; skipping {len(broken)} faces.")
+                done += len(broken)
+                if progress:
+                    progress(done, len(faces_for_analysis))
+                break
+            retried = True
+            logger.warning(f"Analysis process pool broke; restarting it and retrying {len(broken)} faces.")
+            process_pool = _get_process_pool()
+            retry, broken = broken, []
+            for face in retry:
+                submit(process_pool, face)
+        cache.flush()
+
+    # Keep Immich's order so ties in the score below resolve the same way as a sequential run.
+    order = {face_data['id']: position for position, face_data in enumerate(all_person_faces)}
+    analyzed_faces.sort(key=lambda face: order[face['id']])
 
     if not analyzed_faces:
         logger.info("No faces successfully analyzed.")
         return []
 
-    # Calculate scores and select diverse faces
+    # Calculate scores and select diverse faces.
+    # Scores are normalized per person so no single metric dominates; dissimilarity is
+    # handled during selection on the stacked embedding matrix.
+    embeddings = np.stack([face['embedding'] for face in analyzed_faces])
+    scores = quality_scores(
+        [face['clarity'] for face in analyzed_faces],
+        [face['frontal_score'] for face in analyzed_faces],
+        [face['lighting_score'] for face in analyzed_faces]
+    )
+    with ANALYZER_STAGES["select"].time():
+        selected_indices = select_diverse_faces(
+            embeddings,
+            scores,
+            num_suggestions,
+            min_distance=Config.ANALYZER_MIN_EMBEDDING_DISTANCE,
+            diversity_weight=Config.ANALYZER_DIVERSITY_WEIGHT
+        )
+
     suggested_face_ids = []
-    
-    # Simple scoring: prioritize clarity, then frontal, then lighting.
-    # Dissimilarity will be handled during selection.
-    for face in analyzed_faces:
-        # Normalize clarity and lighting if necessary (e.g., to 0-1 range)
-        # For now, just use raw values, assuming higher is better.
-        face['overall_score'] = (face['clarity'] * 0.4) + (face['frontal_score'] * 0.4) + (face['lighting_score'] * 0.2)
-    
-    # Sort by overall score (descending)
-    analyzed_faces.sort(key=lambda x: x['overall_score'], reverse=True)
-
-    # Select top N diverse faces
-    selected_embeddings = []
-    for face in analyzed_faces:
-        if len(suggested_face_ids) >= num_suggestions:
-            break
-        
-        is_diverse_enough = True
-        if selected_embeddings:
-            # Check similarity to already selected faces
-            for existing_embedding in selected_embeddings:
-                distance = euclidean(face['embedding'], existing_embedding)
-                # A higher distance means less similar. Adjust threshold as needed.
-                if distance < 0.6: # Example threshold: faces too similar
-                    is_diverse_enough = False
-                    break
-        
-        if is_diverse_enough:
-            suggested_face_ids.append(face['id'])
-            selected_embeddings.append(face['embedding'])
-            logger.info(f"Selected face {face['id']} (Score: {face['overall_score']:.2f}, Clarity: {face['clarity']:.2f}, Frontal: {face['frontal_score']:.2f}, Lighting: {face['lighting_score']:.2f})")
+    for index in selected_indices:
+        face = analyzed_faces[index]
+        suggested_face_ids.append(face['id'])
+        logger.info(f"Selected face {face['id']} (Score: {scores[index]:.2f}, Clarity: {face['clarity']:.2f}, Frontal: {face['frontal_score']:.2f}, Lighting: {face['lighting_score']:.2f})")
 
     logger.info(f"Smart face analysis complete. Suggested {len(suggested_face_ids)} faces.")
-    return suggested_face_ids
\ No newline at end of file
+    return suggested_face_ids
@@ -0,0 +1,90 @@
+import time
+import threading
+from collections import OrderedDict
+from .config import Config
+from .http_client import immich_client
+from .people_cache import person_asset_count
+
+
+class _PersonFaces:
+    def __init__(self, faces, asset_count):
+        self.faces = faces
+        self.asset_count = asset_count
+        self.validated_at = time.monotonic()
+
+
+class FaceIndex:
+    """
+    In-process, per-person index of Immich faces.
+
+    Each person's face list is built once from /api/people/{id}/faces and then served from memory,
+    so paging through the curation modal is a slice rather than another crawl of Immich. Entries
+    expire after a TTL; an expired entry is revalidated with the cheap /api/people/{id}/statistics
+    call and only re-listed when the person's asset count has changed. Re-listing keeps the
+    existing order and appends new faces at the end, so offsets handed out earlier stay valid.
+    Entries are only built here, on demand; syncs stream face lists without keeping them.
+    """
+
+    def __init__(self, client, ttl_seconds=300, max_people=256):
+        self._client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_people = max_people
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # person_id -> _PersonFaces, in LRU order
+        self._build_locks = {} # person_id -> Lock, so concurrent requests for one person cause one crawl
+
+    def _fetch_asset_count(self, person_id):
+        return person_asset_count(self._client, person_id) # None falls back to re-listing the faces
+
+    def _remember(self, person_id, entry):
+        with self._lock:
+            self._entries[person_id] = entry
+            self._entries.move_to_end(person_id)
+            while len(self._entries) > self.max_people:
+                evicted_id, _ = self._entries.popitem(last=False)
+                self._build_locks.pop(evicted_id, None)
+
+    def get_faces(self, person_id):
+        """Returns the cached face list for a person, building or revalidating it as needed."""
+        with self._lock:
+            entry = self._entries.get(person_id)
+            if entry is not None:
+                self._entries.move_to_end(person_id)
+                if time.monotonic() - entry.validated_at < self.ttl_seconds:
+                    return entry.faces
+            build_lock = self._build_locks.setdefault(person_id, threading.Lock())
+
+        with build_lock:
+            # Another request may have rebuilt the entry while we waited for the lock.
+            with self._lock:
+                current = self._entries.get(person_id)
+            if current is not None and time.monotonic() - current.validated_at < self.ttl_seconds:
+                return current.faces
+
+            asset_count = self._fetch_asset_count(person_id)
+            if current is not None and current.asset_count is not None and current.asset_count == asset_count:
+                # Nothing changed upstream; extend the entry's lifetime without re-listing.
+                current.validated_at = time.monotonic()
+                return current.faces
+
+            faces = self._client.get_json(f"/api/people/{person_id}/faces")
+            if current is not None:
+                faces = self._merge(current.faces, faces)
+            self._remember(person_id, _PersonFaces(faces, asset_count))
+            return faces
+
+    @staticmethod
+    def _merge(old_faces, new_faces):
+        """Keeps the previous ordering for faces that still exist and appends new ones."""
+        new_by_id = {face['id']: face for face in new_faces}
+        merged = [new_by_id.pop(face['id']) for face in old_faces if face['id'] in new_by_id]
+        merged.extend(face for face in new_faces if face['id'] in new_by_id)
+        return merged
+
+    def page(self, person_id, offset, limit):
+        """Returns (faces, total) for a window of a person's faces."""
+        faces = self.get_faces(person_id)
+        return faces[offset:offset + limit], len(faces)
+
+
+face_index = FaceIndex(immich_client, ttl_seconds=Config.FACE_INDEX_TTL_SECONDS, max_people=Config.FACE_INDEX_MAX_PEOPLE)
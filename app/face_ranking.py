@@ -0,0 +1,50 @@
+import math
+
+# Faces whose box is much wider than tall (or the reverse) are usually profile shots or bad detections.
+MIN_ASPECT_RATIO = 0.5
+MAX_ASPECT_RATIO = 2.0
+# Frigate works on small crops, so beyond this side length a bigger face adds nothing.
+SATURATION_SIZE = 256
+# A face covering this share of its photo or more counts as a close-up.
+CLOSE_UP_FRACTION = 0.05
+
+WEIGHTS = (0.6, 0.25, 0.15) # Face size, relative size in frame, aspect ratio
+
+
+def face_box_size(face):
+    """Returns (width, height) of a face's bounding box in source image pixels, or None without a box."""
+    box = face.get('boundingBox')
+    if not box:
+        return None
+    try:
+        return box['x2'] - box['x1'], box['y2'] - box['y1']
+    except (KeyError, TypeError):
+        return None
+
+
+def metadata_score(face, min_face_size):
+    """
+    Scores a face in [0, 1] from Immich's metadata alone, before anything is downloaded.
+
+    The score combines the box size (log-scaled up to SATURATION_SIZE), the share of the photo
+    the face covers, and how close the box is to a square.
+
+    Returns:
+        float: The score, or None if the face is too small or too oddly shaped to be useful.
+    """
+    size = face_box_size(face)
+    if size is None:
+        return 0.0 # No box to judge by; kept, but after every face that has one
+    width, height = size
+    if width <= 0 or height <= 0 or min(width, height) < min_face_size:
+        return None
+    aspect_ratio = width / height
+    if not MIN_ASPECT_RATIO <= aspect_ratio <= MAX_ASPECT_RATIO:
+        return None
+
+    side = math.sqrt(width * height)
+    size_score = min(1.0, math.log(side) / math.log(SATURATION_SIZE))
+    image_area = (face.get('imageWidth') or 0) * (face.get('imageHeight') or 0)
+    relative_score = min(1.0, width * height / image_area / CLOSE_UP_FRACTION) if image_area > 0 else 0.5
+    aspect_score = 1.0 - abs(math.log(aspect_ratio)) / math.log(MAX_ASPECT_RATIO)
+    return WEIGHTS[0] * size_score + WEIGHTS[1] * relative_score + WEIGHTS[2] * aspect_score
@@ -0,0 +1,80 @@
+import numpy as np
+
+# Weights for the quality terms: clarity, frontal angle, lighting.
+DEFAULT_WEIGHTS = (0.4, 0.4, 0.2)
+
+
+def normalize(values):
+    """Min-max normalizes an array to [0, 1]; a constant array maps to all ones."""
+    values = np.asarray(values, dtype=np.float64)
+    low, high = values.min(), values.max()
+    if high - low <= 1e-12:
+        return np.ones_like(values)
+    return (values - low) / (high - low)
+
+
+def quality_scores(clarity, frontal_score, lighting_score, weights=DEFAULT_WEIGHTS):
+    """
+    Combines the per-face quality metrics into one score in [0, 1].
+
+    Laplacian variance is unbounded and heavy-tailed, so clarity is log-compressed before
+    normalization; otherwise it would swamp the frontal and lighting terms.
+    """
+    clarity = normalize(np.log1p(np.maximum(np.asarray(clarity, dtype=np.float64), 0)))
+    frontal_score = normalize(frontal_score)
+    lighting_score = normalize(lighting_score)
+    return weights[0] * clarity + weights[1] * frontal_score + weights[2] * lighting_score
+
+
+def select_diverse_faces(embeddings, scores, num_suggestions, min_distance=0.6, diversity_weight=0.0):
+    """
+    Greedy max-min selection over a matrix of face embeddings.
+
+    Each step picks the best candidate whose distance to every face already selected is at
+    least min_distance. With diversity_weight == 0 this is exactly "highest score first,
+    skipping faces too similar to one already chosen"; a positive weight blends in
+    farthest-point selection by rewarding candidates far from the current selection.
+
+    The distance from every candidate to its nearest selected face is kept in one vector and
+    updated with a single matrix-vector pass per pick, so the cost is O(N * k * d) NumPy work
+    instead of O(N * k) Python-level distance calls.
+
+    Args:
+        embeddings (np.ndarray): (N, d) embeddings.
+        scores (np.ndarray): (N,) quality scores, higher is better.
+        num_suggestions (int): Number of faces to select.
+        min_distance (float): Minimum embedding distance between selected faces.
+        diversity_weight (float): Weight of the normalized distance-to-selection term.
+
+    Returns:
+        list: Indices of the selected faces, in selection order.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    scores = np.asarray(scores, dtype=np.float64)
+    count = embeddings.shape[0]
+    if count == 0 or num_suggestions <= 0:
+        return []
+
+    squared_norms = np.einsum('ij,ij->i', embeddings, embeddings)
+    nearest_selected = np.full(count, np.inf)
+    available = np.ones(count, dtype=bool)
+    selected = []
+
+    while len(selected) < num_suggestions:
+        eligible = available & (nearest_selected >= min_distance)
+        if not eligible.any():
+            break
+        objective = scores.copy()
+        if diversity_weight and selected:
+            finite = np.where(np.isfinite(nearest_selected), nearest_selected, 0.0)
+            objective += diversity_weight * finite / max(finite.max(), 1e-12)
+        objective[~eligible] = -np.inf
+        pick = int(np.argmax(objective))
+        selected.append(pick)
+        available[pick] = False
+
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a.b, for every candidate against the new pick at once.
+        squared = squared_norms + squared_norms[pick] - 2.0 * (embeddings @ embeddings[pick])
+        nearest_selected = np.minimum(nearest_selected, np.sqrt(np.maximum(squared, 0.0)))
+
+    return selected
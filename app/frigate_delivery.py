@@ -0,0 +1,145 @@
+import time
+import threading
+import requests
+from urllib.parse import quote
+from .config import Config
+from .http_client import frigate_client
+from .status_manager import status_manager
+
+# State store output_path for faces delivered through the API: "frigate:<person_name>/<frigate_id>".
+FRIGATE_PATH_PREFIX = "frigate:"
+
+
+def frigate_output_path(person_name, frigate_id):
+    return f"{FRIGATE_PATH_PREFIX}{person_name}/{frigate_id or ''}"
+
+
+def parse_frigate_output_path(output_path):
+    """Returns (person_name, frigate_id) for an API-delivered face; frigate_id is None when Frigate didn't report it."""
+    if not output_path or not output_path.startswith(FRIGATE_PATH_PREFIX):
+        return None
+    person_name, _, frigate_id = output_path[len(FRIGATE_PATH_PREFIX):].rpartition("/")
+    return person_name, frigate_id or None
+
+
+class FrigateFaceLibrary:
+    """
+    Delivers faces through Frigate's face library API instead of the faces directory.
+
+    Frigate rebuilds its classifier when faces are registered or deleted, so no restart is
+    needed. Uploads share the Frigate client's connection pool and in-flight cap
+    (FRIGATE_MAX_CONCURRENT_REQUESTS); deletes are batched per person.
+    """
+
+    def __init__(self, client, delete_batch_size=50):
+        self.client = client
+        self.delete_batch_size = max(1, delete_batch_size)
+
+    def register(self, person_name, face_id, image_bytes):
+        """
+        Uploads one face image for a person.
+
+        Returns:
+            str: The file ID Frigate stored the face under, or None if this Frigate version doesn't report it.
+        """
+        response = self.client.post(
+            f"/api/faces/{quote(person_name, safe='')}/register",
+            files={"file": (f"{face_id}.jpg", bytes(image_bytes), "image/jpeg")}
+        )
+        response.raise_for_status()
+        body = response.json() if response.content else {}
+        if body.get("success") is False:
+            raise RuntimeError(f"Frigate rejected face {face_id}: {body.get('message')}")
+        return body.get("filename") or body.get("id")
+
+    def delete(self, person_name, frigate_ids):
+        """Deletes faces from a person in batches. Returns the number of IDs sent."""
+        frigate_ids = list(frigate_ids)
+        for start in range(0, len(frigate_ids), self.delete_batch_size):
+            # Deleting a file ID twice is harmless, so this POST is safe to retry.
+            response = self.client.post(
+                f"/api/faces/{quote(person_name, safe='')}/delete",
+                json={"ids": frigate_ids[start:start + self.delete_batch_size]},
+                retry=True
+            )
+            response.raise_for_status()
+        return len(frigate_ids)
+
+
+class FrigateRestarter:
+    """
+    Debounced Frigate restart for the faces-directory delivery mode.
+
+    Each request (re)arms a timer, so back-to-back syncs within FRIGATE_RESTART_DEBOUNCE_SECONDS
+    cause a single restart once things have settled. The due time is also kept in `store` (the
+    status database) until the restart is sent, so if the sync worker exits, loses its lease or is
+    redeployed first, the next one sends it from resume().
+    """
+
+    def __init__(self, client, debounce_seconds, store=None):
+        self.client = client
+        self.debounce_seconds = max(0.0, debounce_seconds)
+        self.store = store
+        self._lock = threading.Lock()
+        self._timer = None
+        self._generation = 0 # Identifies the latest request, so a superseded timer that already fired does nothing
+        self._logger = None
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._timer is not None
+
+    def request(self, logger=None):
+        self._schedule(time.time() + self.debounce_seconds, logger)
+        if logger and self.debounce_seconds:
+            logger(f"INFO: Frigate restart scheduled in {self.debounce_seconds:.0f}s (debounced across syncs).")
+
+    def resume(self, logger=None):
+        """Arms the restart a previous sync worker requested but didn't send. Called when a process takes over the role."""
+        if self.store is None:
+            return
+        due_at = self.store.frigate_restart_due()
+        if due_at is None or self.pending:
+            return
+        if logger:
+            logger("INFO: Sending the Frigate restart left pending by the previous sync worker.")
+        self._schedule(due_at, logger)
+
+    def _schedule(self, due_at, logger):
+        if self.store is not None:
+            self.store.set_frigate_restart_due(due_at) # Before the timer can fire and clear it
+        with self._lock:
+            self._logger = logger
+            if self._timer is not None:
+                self._timer.cancel()
+            self._generation += 1
+            self._timer = threading.Timer(max(0.0, due_at - time.time()), self._restart, args=(self._generation, due_at))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _restart(self, generation, due_at):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._timer = None
+            logger = self._logger
+        try:
+            if logger:
+                logger("INFO: Triggering Frigate restart to load new faces...")
+            response = self.client.post("/api/restart")
+            response.raise_for_status()
+            if logger:
+                logger("INFO: Frigate restart command sent successfully.")
+        except requests.exceptions.RequestException as re:
+            if logger:
+                logger(f"ERROR: Failed to trigger Frigate restart: {re}")
+        except Exception as e:
+            if logger:
+                logger(f"ERROR: An unexpected error occurred during Frigate restart: {e}")
+        if self.store is not None:
+            self.store.clear_frigate_restart(due_at)
+
+
+frigate_library = FrigateFaceLibrary(frigate_client, delete_batch_size=Config.FRIGATE_DELETE_BATCH_SIZE)
+frigate_restarter = FrigateRestarter(frigate_client, Config.FRIGATE_RESTART_DEBOUNCE_SECONDS, store=status_manager)
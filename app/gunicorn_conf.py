@@ -0,0 +1,63 @@
+"""
+Gunicorn settings for the Docker image: several HTTP worker processes plus one sync worker process.
+
+With SYNC_WORKER=external, the master starts `python -m app.worker` next to the HTTP workers and
+restarts it if it exits. HTTP workers only submit jobs and read the shared status, so
+WEB_WORKERS can be raised without duplicate schedulers, MQTT connections or status.
+"""
+import os
+import sys
+import shutil
+import subprocess
+import threading
+
+bind = f"0.0.0.0:{os.getenv('UI_PORT', '8080')}"
+workers = int(os.getenv("WEB_WORKERS", "2"))
+threads = int(os.getenv("WEB_THREADS", "8")) # Threads let status long-polls wait without blocking other requests
+worker_class = "gthread"
+
+_sync_worker = None
+_stopping = threading.Event()
+
+
+def _metrics_dir():
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def _supervise_sync_worker(server):
+    global _sync_worker
+    while not _stopping.is_set():
+        _sync_worker = subprocess.Popen([sys.executable, "-m", "app.worker"])
+        server.log.info(f"Started sync worker (pid {_sync_worker.pid}).")
+        returncode = _sync_worker.wait()
+        if _metrics_dir():
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(_sync_worker.pid)
+        if not _stopping.is_set():
+            server.log.error(f"Sync worker exited with code {returncode}; restarting in 5s.")
+            _stopping.wait(5)
+
+
+def on_starting(server):
+    if _metrics_dir():
+        # Values left over from a previous run would be added to this one.
+        shutil.rmtree(_metrics_dir(), ignore_errors=True)
+        os.makedirs(_metrics_dir(), exist_ok=True)
+    if os.getenv("SYNC_WORKER", "embedded").lower() == "external":
+        threading.Thread(target=_supervise_sync_worker, args=(server,), name="sync-worker-supervisor", daemon=True).start()
+
+
+def child_exit(server, worker):
+    if _metrics_dir():
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    _stopping.set()
+    if _sync_worker is not None and _sync_worker.poll() is None:
+        _sync_worker.terminate() # The worker releases its lease; the running job resumes on the next start
+        try:
+            _sync_worker.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            _sync_worker.kill()
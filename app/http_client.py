@@ -0,0 +1,242 @@
+import json
+import time
+import codecs
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3Error
+from .config import Config
+from .metrics import UPSTREAM_REQUEST_SECONDS, UPSTREAM_RESPONSES, UPSTREAM_RETRIES, UPSTREAM_IN_FLIGHT, status_class
+
+logger = logging.getLogger(__name__)
+
+# Status codes that are worth retrying: rate limiting and transient server errors.
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+def read_response_body(response):
+    """
+    Reads a streamed response body into one preallocated buffer when the length is known.
+
+    Raises:
+        requests.exceptions.ConnectionError: When the body ends before Content-Length, which
+            the client retries like any other dropped connection.
+    """
+    length = response.headers.get("Content-Length", "")
+    if not length.isdigit() or response.headers.get("Content-Encoding"):
+        return response.content
+    buffer = bytearray(int(length))
+    view = memoryview(buffer)
+    received = 0
+    try:
+        while received < len(buffer):
+            count = response.raw.readinto(view[received:])
+            if not count:
+                break
+            received += count
+    except (Urllib3Error, OSError):
+        pass # Counted as truncated below
+    finally:
+        view.release()
+    if received < len(buffer):
+        response.close() # Don't hand this connection back to the pool
+        raise requests.exceptions.ConnectionError(f"Response body ended after {received} of {len(buffer)} bytes", response=response)
+    response.raw.release_conn()
+    return buffer
+
+
+def iter_json_array(chunks):
+    """
+    Yields the elements of a JSON array as its bytes arrive, without holding the whole document.
+
+    Only the current, incomplete element is buffered, so a response listing a hundred thousand
+    faces costs as much memory as one face. Elements are expected to be objects or arrays.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = finished = False
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        position = 0
+        while not finished:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                break
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break # Incomplete; wait for the next chunk
+            position = end
+            yield element
+        buffer = buffer[position:]
+    if not finished:
+        raise ValueError("Truncated JSON array")
+
+
+class PooledHTTPClient:
+    """
+    Shared HTTP client with connection pooling and keep-alive.
+
+    Every request goes through a single requests.Session so TCP/TLS connections are reused,
+    is bounded by a max-in-flight semaphore, gets a default timeout, and is retried with
+    jittered exponential backoff on connection errors and 429/5xx responses.
+    """
+
+    def __init__(self, base_url, headers=None, max_in_flight=8, timeout=(5, 30), max_retries=3, backoff_base=0.5, backoff_max=10.0, name="upstream"):
+        self.base_url = (base_url or "").rstrip("/")
+        self.name = name # Metrics label
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._in_flight_gauge = UPSTREAM_IN_FLIGHT.labels(name)
+        self._retries_counter = UPSTREAM_RETRIES.labels(name)
+
+        self._session = requests.Session()
+        if headers:
+            self._session.headers.update(headers)
+        # Size the pool to the in-flight cap so no request has to open a throwaway connection.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_in_flight), max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return f"{self.base_url}{path}"
+
+    def _backoff_delay(self, attempt, response=None):
+        if response is not None and response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        # Full jitter: spreads retries from parallel workers instead of stampeding together.
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method, path, retry=None, **kwargs):
+        """
+        Performs a request, retrying transient failures.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Path relative to the base URL, or an absolute URL.
+            retry (bool): Whether to retry. Defaults to True for GET/HEAD only, since other methods may not be idempotent.
+
+        Returns:
+            requests.Response: The final response. Callers are expected to call raise_for_status().
+        """
+        return self._request(method, path, retry, None, kwargs)[0]
+
+    def _request(self, method, path, retry, body_reader, kwargs):
+        if retry is None:
+            retry = method.upper() in ("GET", "HEAD")
+        attempts = self.max_retries + 1 if retry else 1
+        kwargs.setdefault("timeout", self.timeout)
+        url = self.url(path)
+
+        latency = UPSTREAM_REQUEST_SECONDS.labels(self.name, method.upper())
+
+        for attempt in range(attempts):
+            response = None
+            if attempt:
+                self._retries_counter.inc()
+            try:
+                with self._in_flight, latency.time():
+                    self._in_flight_gauge.inc()
+                    try:
+                        response = self._session.request(method, url, **kwargs)
+                        UPSTREAM_RESPONSES.labels(self.name, status_class(response.status_code)).inc()
+                        if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                            # The body is read while the in-flight slot is still held.
+                            body = body_reader(response) if body_reader and response.ok else None
+                            return response, body
+                        # Drain the body so the connection goes back to the pool before we back off.
+                        response.content
+                    finally:
+                        self._in_flight_gauge.dec()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                UPSTREAM_RESPONSES.labels(self.name, "error").inc()
+                if attempt == attempts - 1:
+                    raise
+                logger.debug(f"{method} {url} failed ({e}); retrying.")
+            delay = self._backoff_delay(attempt, response)
+            if response is not None:
+                logger.debug(f"{method} {url} returned {response.status_code}; retrying in {delay:.2f}s.")
+            time.sleep(delay)
+
+    def get_bytes(self, path, **kwargs):
+        """
+        GETs a binary resource and returns its body, raising for HTTP errors.
+
+        The body is streamed into a single buffer sized from Content-Length instead of being
+        assembled from chunks, which keeps allocations down for thumbnails.
+        """
+        kwargs["stream"] = True
+        response, body = self._request("GET", path, None, read_response_body, kwargs)
+        if body is None:
+            response.close()
+        response.raise_for_status()
+        return body
+
+    def get_json_stream(self, path, reader, chunk_size=65536, **kwargs):
+        """
+        GETs a JSON array and hands its elements to `reader` as they are parsed, raising for HTTP errors.
+
+        The reader runs while the request holds its in-flight slot and is called again from
+        scratch if the request is retried, so it must not depend on an earlier, failed attempt.
+
+        Returns:
+            The reader's return value.
+        """
+        kwargs["stream"] = True
+        response, result = self._request("GET", path, None, lambda r: reader(iter_json_array(r.iter_content(chunk_size))), kwargs)
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        return result
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def get_json(self, path, **kwargs):
+        """GETs a path and returns the decoded JSON body, raising for HTTP errors."""
+        response = self.get(path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+
+immich_client = PooledHTTPClient(
+    Config.IMMICH_API_URL,
+    headers={"x-api-key": Config.IMMICH_API_KEY or "", "Accept": "application/json"},
+    max_in_flight=Config.IMMICH_MAX_CONCURRENT_REQUESTS,
+    timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT),
+    max_retries=Config.HTTP_MAX_RETRIES,
+    backoff_base=Config.HTTP_RETRY_BACKOFF,
+    name="immich",
+)
+
+frigate_client = PooledHTTPClient(
+    Config.FRIGATE_API_URL,
+    max_in_flight=Config.FRIGATE_MAX_CONCURRENT_REQUESTS,
+    timeout=(Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT),
+    max_retries=Config.HTTP_MAX_RETRIES,
+    backoff_base=Config.HTTP_RETRY_BACKOFF,
+    name="frigate",
+)
@@ -0,0 +1,112 @@
+import os
+import math
+import tempfile
+from io import BytesIO
+from PIL import Image
+
+JPEG_END_OF_IMAGE = b"\xff\xd9"
+
+
+def clamp_box(box, width, height):
+    """Clamps a (x1, y1, x2, y2) crop box to the image bounds."""
+    x1, y1, x2, y2 = (int(round(v)) for v in box)
+    x1, x2 = max(0, min(x1, width)), max(0, min(x2, width))
+    y1, y2 = max(0, min(y1, height)), max(0, min(y2, height))
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"Bounding box {box} lies outside the {width}x{height} image")
+    return x1, y1, x2, y2
+
+
+def crop_face(image_bytes, box, max_size=0, quality=90):
+    """
+    Crops a face out of an encoded image and returns JPEG bytes for Frigate.
+
+    - When the crop covers the whole JPEG and no resize is needed, the original bytes are
+      returned untouched, avoiding a decode and a lossy re-encode. A JPEG that doesn't end with
+      its end-of-image marker is decoded anyway, so a truncated image raises instead.
+    - When the face will be downscaled to max_size, JPEG draft mode lets the decoder do the
+      reduction (DCT scaling), so the full-resolution image is never materialized.
+
+    Args:
+        image_bytes (bytes): The encoded source image.
+        box (tuple): (x1, y1, x2, y2) in source image pixels, or None for the whole image.
+        max_size (int): Longest side of the saved face in pixels; 0 keeps the crop size.
+        quality (int): JPEG quality for re-encoded faces.
+
+    Returns:
+        bytes: The encoded face.
+    """
+    image = Image.open(BytesIO(image_bytes)) # Lazy: only the header is parsed here
+    width, height = image.size
+    box = clamp_box(box, width, height) if box is not None else (0, 0, width, height)
+    crop_width, crop_height = box[2] - box[0], box[3] - box[1]
+    needs_resize = max_size > 0 and max(crop_width, crop_height) > max_size
+
+    if box == (0, 0, width, height) and not needs_resize and image.format == "JPEG" and bytes(image_bytes[-2:]) == JPEG_END_OF_IMAGE:
+        return image_bytes
+
+    if needs_resize and image.format == "JPEG":
+        scale = max_size / max(crop_width, crop_height)
+        image.draft("RGB", (math.ceil(width * scale), math.ceil(height * scale)))
+        # Draft mode picks the nearest DCT scale at or above the request; map the box onto it.
+        scale_x, scale_y = image.size[0] / width, image.size[1] / height
+        box = (
+            int(box[0] * scale_x), int(box[1] * scale_y),
+            max(int(box[0] * scale_x) + 1, int(math.ceil(box[2] * scale_x))),
+            max(int(box[1] * scale_y) + 1, int(math.ceil(box[3] * scale_y)))
+        )
+
+    face = image.crop(box)
+    if face.mode not in ("RGB", "L"):
+        face = face.convert("RGB")
+    if needs_resize:
+        face.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    output = BytesIO()
+    face.save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+
+def atomic_write(path, data):
+    """
+    Writes data to path via a temporary file in the same directory and os.replace, so readers
+    such as Frigate only ever see the old file or the complete new one.
+    """
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644) # mkstemp creates 0600; Frigate may read as another user
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def dhash(image_bytes, hash_size=8):
+    """
+    Difference hash of an encoded image: a 64-bit int (for hash_size 8) that barely changes
+    between near-identical pictures, such as burst shots or neighbouring video frames.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail, and each bit
+    records whether a pixel is brighter than its right neighbour. JPEG draft mode lets the
+    decoder do most of the reduction, so hashing a face costs a fraction of a full decode.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    image.draft("L", (hash_size + 1, hash_size))
+    pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count("1")
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from .config import Config
+from .sync_logic import run_sync, summary_message
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT,
+    priority INTEGER,
+    status TEXT,
+    people TEXT,
+    delta INTEGER,
+    cancel_requested INTEGER DEFAULT 0,
+    people_total INTEGER,
+    summary TEXT,
+    created_at REAL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_queue ON sync_jobs(status, priority, job_id);
+CREATE TABLE IF NOT EXISTS sync_job_people (
+    job_id INTEGER,
+    person_id TEXT,
+    outcome TEXT,
+    finished_at REAL,
+    PRIMARY KEY (job_id, person_id)
+);
+"""
+
+# Lower runs first. A waiting manual job pauses a running scheduled job.
+PRIORITIES = {"manual": 0, "scheduled": 10}
+
+JOB_COLUMNS = ("job_id", "kind", "priority", "status", "people", "delta", "cancel_requested", "people_total", "summary", "created_at", "started_at", "finished_at")
+SELECT_JOBS = (
+    f"SELECT {', '.join(JOB_COLUMNS)}, "
+    "(SELECT COUNT(*) FROM sync_job_people p WHERE p.job_id = sync_jobs.job_id) FROM sync_jobs"
+)
+FINISHED = ("done", "failed", "cancelled")
+COUNTERS = ("trained", "skipped", "failed", "deduplicated", "filtered", "unchanged_people", "resumed_people")
+
+
+class SyncJob:
+    """
+    A claimed job as seen by run_sync: which people an earlier, interrupted run already finished,
+    a per-person checkpoint, and whether the run should stop.
+    """
+
+    def __init__(self, queue, job_id, kind, priority, people, delta, done_people):
+        self._queue = queue
+        self.job_id = job_id
+        self.kind = kind
+        self.priority = priority
+        self.people = people # Manual selection ([{id, faces}]) or None for the whole library
+        self.delta = delta
+        self.done_people = done_people
+
+    def person_done(self, person_id, outcome):
+        self._queue._checkpoint(self.job_id, person_id, outcome)
+
+    def set_people_total(self, count):
+        self._queue._set_people_total(self.job_id, count)
+
+    def stop_reason(self):
+        """Returns "cancelled", "preempted" (a higher-priority job is waiting) or None."""
+        return self._queue._stop_reason(self.job_id, self.priority)
+
+
+class SyncJobQueue:
+    """
+    Persistent queue of sync jobs, run one at a time by a single worker thread.
+
+    Any process can submit, list and cancel jobs; the process holding the sync worker lease runs
+    them and picks up jobs submitted elsewhere within a second.
+
+    Jobs live in SQLite next to the sync state, so a container restart re-queues the job that was
+    running and it resumes with the people it hadn't finished instead of starting over. Work is
+    checkpointed per person: run_sync records each person once all of their faces are done, checks
+    before every person and face whether the job was cancelled or a higher-priority job is waiting,
+    and if so drains its in-flight faces and returns. A preempted job goes back to the queue and
+    resumes later; a partly done person is redone.
+    """
+
+    def __init__(self, db_path, history=50):
+        self.db_path = db_path
+        self.history = history
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._conn = None
+        self._thread = None
+        self._stopping = False
+        self._app = None
+        self._status_manager = None
+
+    def open(self, status_manager):
+        """Opens the job store. Every process that submits or lists jobs needs this; only the sync worker runs them."""
+        self._status_manager = status_manager
+        if self._conn is not None:
+            return
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def start_worker(self, app, status_manager):
+        """
+        Re-queues interrupted jobs and starts the worker thread.
+
+        Only the process holding the sync worker lease calls this (see app/worker.py), so jobs are
+        never run twice even with several gunicorn workers.
+        """
+        self.open(status_manager)
+        self._app = app
+        self._stopping = False
+        if self._thread is not None and self._thread.is_alive():
+            return # Still finishing the job it was on when stopped; it keeps going
+        with self._lock, self._conn:
+            interrupted = [row[0] for row in self._conn.execute("SELECT job_id FROM sync_jobs WHERE status = 'running'")]
+            self._conn.execute("UPDATE sync_jobs SET status = 'queued' WHERE status = 'running'")
+        for job_id in interrupted:
+            app.logger.info(f"Sync job {job_id} was interrupted; it will resume where it stopped.")
+        self._publish_queue_length()
+        self._thread = threading.Thread(target=self._run, name="sync-jobs", daemon=True)
+        self._thread.start()
+
+    def is_running(self):
+        """Whether this process's worker thread is alive, e.g. still finishing its job after stop()."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        # A running job stays 'running' in the store, so the next start resumes it.
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, kind, people=None, delta=False):
+        """
+        Queues a sync job.
+
+        Args:
+            kind (str): "manual" or "scheduled".
+            people (list): Manual selection as [{id, faces}], or None to sync every person.
+            delta (bool): Skip people unchanged since their last complete sync.
+
+        Returns:
+            dict: The queued job, or None for a scheduled job while another scheduled job is still pending.
+        """
+        with self._lock, self._conn:
+            if kind == "scheduled":
+                pending = self._conn.execute(
+                    "SELECT 1 FROM sync_jobs WHERE kind = 'scheduled' AND status IN ('queued', 'running') LIMIT 1"
+                ).fetchone()
+                if pending:
+                    return None
+            cursor = self._conn.execute(
+                "INSERT INTO sync_jobs (kind, priority, status, people, delta, created_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (kind, PRIORITIES[kind], json.dumps(people) if people is not None else None, int(bool(delta)), time.time())
+            )
+            job_id = cursor.lastrowid
+        self._publish_queue_length()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return self.get_job(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job right away, or asks a running job to stop once its in-flight faces are done.
+
+        Returns:
+            dict: The job afterwards, or None if it doesn't exist.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sync_jobs SET status = 'cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self._conn.execute("UPDATE sync_jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+        self._publish_queue_length()
+        return self.get_job(job_id)
+
+    def get_job(self, job_id):
+        with self._lock:
+            row = self._conn.execute(SELECT_JOBS + " WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job_dict(row) if row else None
+
+    def list_jobs(self, limit=50):
+        """Returns running and queued jobs in run order, then the most recently finished ones."""
+        with self._lock:
+            active = self._conn.execute(
+                SELECT_JOBS + " WHERE status IN ('running', 'queued') ORDER BY status = 'queued', priority, job_id"
+            ).fetchall()
+            finished = self._conn.execute(
+                SELECT_JOBS + " WHERE status NOT IN ('running', 'queued') ORDER BY job_id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._job_dict(row) for row in active + finished]
+
+    @staticmethod
+    def _job_dict(row):
+        job = dict(zip(JOB_COLUMNS, row))
+        people = job.pop("people")
+        people = json.loads(people) if people else None
+        job["id"] = job.pop("job_id")
+        job["people_selected"] = len(people) if people is not None else None
+        job["people_done"] = row[len(JOB_COLUMNS)]
+        job["delta"] = bool(job["delta"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        return job
+
+    def _publish_queue_length(self):
+        with self._lock:
+            queued = self._conn.execute("SELECT COUNT(*) FROM sync_jobs WHERE status = 'queued'").fetchone()[0]
+        self._status_manager.set_queued_jobs(queued)
+
+    def _claim_next(self):
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE") # Claim under the write lock
+            row = self._conn.execute(
+                "SELECT job_id, kind, priority, people, delta FROM sync_jobs WHERE status = 'queued' ORDER BY priority, job_id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, kind, priority, people, delta = row
+            self._conn.execute(
+                "UPDATE sync_jobs SET status = 'running', started_at = COALESCE(started_at, ?) WHERE job_id = ?",
+                (time.time(), job_id)
+            )
+            done_people = set(r[0] for r in self._conn.execute("SELECT person_id FROM sync_job_people WHERE job_id = ?", (job_id,)))
+        return SyncJob(self, job_id, kind, priority, json.loads(people) if people else None, bool(delta), done_people)
+
+    def _release(self, job_id):
+        """Puts a claimed job back without running it."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sync_jobs SET status = 'queued' WHERE job_id = ?", (job_id,))
+
+    def _checkpoint(self, job_id, person_id, outcome):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_job_people (job_id, person_id, outcome, finished_at) VALUES (?, ?, ?, ?)",
+                (job_id, person_id, outcome, time.time())
+            )
+
+    def _set_people_total(self, job_id, count):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sync_jobs SET people_total = ? WHERE job_id = ?", (count, job_id))
+
+    def _stop_reason(self, job_id, priority):
+        with self._lock:
+            cancel_requested = self._conn.execute("SELECT cancel_requested FROM sync_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if cancel_requested and cancel_requested[0]:
+                return "cancelled"
+            waiting = self._conn.execute(
+                "SELECT 1 FROM sync_jobs WHERE status = 'queued' AND priority < ? LIMIT 1", (priority,)
+            ).fetchone()
+        return "preempted" if waiting else None
+
+    def _finish(self, job, summary):
+        status = {"Paused": "queued", "Cancelled": "cancelled", "Failure": "failed"}.get(summary.get("status"), "done")
+        with self._lock, self._conn:
+            previous = self._conn.execute("SELECT summary FROM sync_jobs WHERE job_id = ?", (job.job_id,)).fetchone()[0]
+            if previous:
+                # Counters add up over the runs of a preempted or resumed job.
+                previous = json.loads(previous)
+                for key in COUNTERS:
+                    if key in summary or key in previous:
+                        summary[key] = (summary.get(key) or 0) + (previous.get(key) or 0)
+                if "trained" in summary:
+                    summary["message"] = summary_message(summary["status"], summary["trained"], summary["skipped"], summary["failed"], summary.get("deduplicated", 0))
+            self._conn.execute(
+                "UPDATE sync_jobs SET status = ?, summary = ?, finished_at = ? WHERE job_id = ?",
+                (status, json.dumps(summary), time.time() if status in FINISHED else None, job.job_id)
+            )
+            if status in FINISHED and self.history > 0:
+                self._conn.execute(
+                    "DELETE FROM sync_jobs WHERE status IN ('done', 'failed', 'cancelled') AND job_id NOT IN "
+                    "(SELECT job_id FROM sync_jobs WHERE status IN ('done', 'failed', 'cancelled') ORDER BY job_id DESC LIMIT ?)",
+                    (self.history,)
+                )
+                self._conn.execute("DELETE FROM sync_job_people WHERE job_id NOT IN (SELECT job_id FROM sync_jobs)")
+
+    def _run(self):
+        while not self._stopping:
+            job = self._claim_next()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(1) # Also polls for jobs submitted by other processes
+                continue
+            # A reconcile started from the API holds the sync slot; try again shortly.
+            if not self._status_manager.start_sync(job_id=job.job_id):
+                self._release(job.job_id)
+                with self._wakeup:
+                    self._wakeup.wait(1)
+                continue
+            self._publish_queue_length()
+            try:
+                summary = run_sync(self._app, self._status_manager, job.people, job.delta, job=job)
+            except Exception as e:
+                # run_sync reports its own errors; this only guards the worker thread.
+                logger.exception(f"Sync job {job.job_id} crashed")
+                summary = {"message": f"An unexpected error occurred: {e}", "status": "Failure"}
+                if self._status_manager.get_status()["in_progress"]:
+                    self._status_manager.end_sync(summary)
+            self._finish(job, summary)
+            self._publish_queue_length()
+
+
+job_queue = SyncJobQueue(Config.STATE_DB, history=Config.SYNC_JOB_HISTORY)
@@ -0,0 +1,56 @@
+import os
+from prometheus_client import Counter, Gauge, Histogram, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+
+# Prometheus metrics. Every update is a lock plus an add on a pre-resolved child, so these stay
+# on in production; label values are fixed sets (no face or person IDs) to bound cardinality.
+# With several processes (gunicorn workers plus the sync worker), PROMETHEUS_MULTIPROC_DIR makes
+# every process write its values to shared files; gauges say how those are combined.
+
+# Most stages take milliseconds; listing large libraries or slow disks can take seconds.
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+SYNC_STAGE_SECONDS = Histogram(
+    "frimmich_sync_stage_seconds", "Time spent in each stage of the sync path.", ["stage"], buckets=STAGE_BUCKETS
+)
+SYNC_FACES = Counter("frimmich_sync_faces_total", "Faces handled by syncs, by outcome.", ["outcome"])
+SYNC_QUEUE_DEPTH = Gauge("frimmich_sync_face_queue_depth", "Face tasks submitted to the sync pool and not yet finished.", multiprocess_mode="livesum")
+SYNC_RUNNING = Gauge("frimmich_sync_in_progress", "1 while a sync is running.", multiprocess_mode="livemax")
+
+ANALYZER_STAGE_SECONDS = Histogram(
+    "frimmich_analyzer_stage_seconds", "Time spent in each stage of the Smart Face Trainer.", ["stage"], buckets=STAGE_BUCKETS
+)
+
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "frimmich_upstream_request_seconds", "Latency of requests to Immich and Frigate, including the body read.",
+    ["service", "method"], buckets=STAGE_BUCKETS
+)
+UPSTREAM_RESPONSES = Counter("frimmich_upstream_responses_total", "Responses from Immich and Frigate by status class.", ["service", "status"])
+UPSTREAM_RETRIES = Counter("frimmich_upstream_retries_total", "Retried requests to Immich and Frigate.", ["service"])
+UPSTREAM_IN_FLIGHT = Gauge("frimmich_upstream_in_flight_requests", "Requests to Immich and Frigate currently in flight.", ["service"], multiprocess_mode="livesum")
+
+MQTT_MESSAGES = Counter("frimmich_mqtt_messages_total", "MQTT messages by topic and result.", ["topic", "result"])
+MQTT_PUBLISH_SECONDS = Histogram("frimmich_mqtt_publish_seconds", "Time spent handing a message to the MQTT client.", buckets=STAGE_BUCKETS)
+MQTT_COALESCED = Counter("frimmich_mqtt_coalesced_total", "Progress updates superseded before they were published.")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "frimmich_http_request_seconds", "Latency of Frimmich's own HTTP routes.", ["endpoint", "method", "status"], buckets=STAGE_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("frimmich_http_in_flight_requests", "Frimmich HTTP requests currently being served.", multiprocess_mode="livesum")
+
+# Children resolved once; labels() is the costly part of an update. Use e.g. `with SYNC_STAGES["crop"].time():`.
+SYNC_STAGES = {stage: SYNC_STAGE_SECONDS.labels(stage) for stage in ("immich_list", "thumbnail_download", "crop", "dedup_hash", "disk_write", "frigate_register", "state_persist")}
+ANALYZER_STAGES = {stage: ANALYZER_STAGE_SECONDS.labels(stage) for stage in ("download", "detect", "encode", "quality", "select")}
+
+
+def status_class(status_code):
+    return f"{status_code // 100}xx"
+
+
+def render():
+    """Returns (body, content type) for the /metrics endpoint, aggregated over all processes in multiprocess mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,10 +1,28 @@
 import paho.mqtt.client as mqtt
 import json
+import time
 import logging
+import threading
 from .config import Config
+from .metrics import MQTT_MESSAGES, MQTT_PUBLISH_SECONDS, MQTT_COALESCED
 
 logger = logging.getLogger(__name__)
 
+# Per-topic defaults, overridable with MQTT_TOPIC_QOS / MQTT_TOPIC_RETAIN. Progress is high-volume
+# and superseded by the next update, so it goes out at QoS 0.
+DEFAULT_TOPIC_QOS = {"sync_progress": 0}
+DEFAULT_TOPIC_RETAIN = {"status": True}
+
+
+def parse_topic_options(value, cast):
+    """Parses "topic=value,topic=value" into a dict, e.g. MQTT_TOPIC_QOS="sync_progress=0,status=1"."""
+    options = {}
+    for item in (value or "").split(","):
+        topic, sep, option = item.partition("=")
+        if sep and topic.strip():
+            options[topic.strip()] = cast(option.strip())
+    return options
+
 class MQTTClient:
     _instance = None
     _client = None
@@ -17,6 +35,15 @@ class MQTTClient:
         return cls._instance
 
     def _initialize(self):
+        self._topic_qos = dict(DEFAULT_TOPIC_QOS, **parse_topic_options(Config.MQTT_TOPIC_QOS, int))
+        self._topic_retain = dict(DEFAULT_TOPIC_RETAIN, **parse_topic_options(Config.MQTT_TOPIC_RETAIN, lambda v: v.lower() == "true"))
+        # Coalesced publishes: only the latest payload per topic is kept until the flusher sends it.
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._pending_event = threading.Event()
+        self._flusher = None
+        self._started = False
+
         if not Config.MQTT_HOST:
             logger.info("MQTT_HOST not set. MQTT client will not be initialized.")
             return
@@ -29,9 +56,19 @@ class MQTTClient:
         if Config.MQTT_USERNAME and Config.MQTT_PASSWORD:
             self._client.username_pw_set(Config.MQTT_USERNAME, Config.MQTT_PASSWORD)
 
+    def connect(self):
+        """
+        Starts the connection. Only the sync worker calls this, so several gunicorn workers don't
+        each hold a broker connection and publish the same status.
+        """
+        if self._client is None or self._started:
+            return
+        self._started = True
         try:
             logger.info(f"Attempting to connect to MQTT broker at {Config.MQTT_HOST}:{Config.MQTT_PORT}")
-            self._client.connect(Config.MQTT_HOST, Config.MQTT_PORT, 60)
+            # connect_async lets the network loop connect (and reconnect) in the background, so an
+            # unreachable broker never blocks startup or a sync.
+            self._client.connect_async(Config.MQTT_HOST, Config.MQTT_PORT, 60)
             self._client.loop_start() # Start a non-blocking loop
         except Exception as e:
             logger.error(f"Failed to connect to MQTT broker: {e}")
@@ -51,31 +88,75 @@ class MQTTClient:
     def _on_publish(self, client, userdata, mid, properties=None):
         logger.debug(f"Message {mid} published.")
 
-    def publish(self, topic_suffix, payload, retain=False):
+    def publish(self, topic_suffix, payload, retain=None, qos=None):
         if not self._is_connected:
+            MQTT_MESSAGES.labels(topic_suffix, "not_connected").inc()
             logger.warning(f"Not connected to MQTT. Cannot publish to {topic_suffix}.")
             return
         
         full_topic = f"{Config.MQTT_TOPIC_PREFIX}/{topic_suffix}"
+        if qos is None:
+            qos = self._topic_qos.get(topic_suffix, 1)
+        if retain is None:
+            retain = self._topic_retain.get(topic_suffix, False)
         try:
             if isinstance(payload, dict):
-                payload = json.dumps(payload)
-            self._client.publish(full_topic, payload, qos=1, retain=retain)
+                payload = json.dumps(payload, separators=(",", ":"))
+            with MQTT_PUBLISH_SECONDS.time():
+                self._client.publish(full_topic, payload, qos=qos, retain=retain)
+            MQTT_MESSAGES.labels(topic_suffix, "published").inc()
             logger.debug(f"Published to {full_topic}: {payload}")
         except Exception as e:
+            MQTT_MESSAGES.labels(topic_suffix, "error").inc()
             logger.error(f"Error publishing to MQTT topic {full_topic}: {e}")
 
+    def publish_coalesced(self, topic_suffix, payload):
+        """
+        Queues a payload for topic_suffix and returns immediately.
+
+        A background flusher publishes at most once per MQTT_PROGRESS_INTERVAL seconds per topic,
+        and only the latest payload queued in that window is sent.
+        """
+        if self._client is None:
+            return
+        with self._pending_lock:
+            if topic_suffix in self._pending:
+                MQTT_COALESCED.inc()
+            self._pending[topic_suffix] = payload
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="mqtt-flusher", daemon=True)
+                self._flusher.start()
+        self._pending_event.set()
+
+    def _flush_loop(self):
+        while True:
+            self._pending_event.wait()
+            self._pending_event.clear()
+            self.flush()
+            time.sleep(Config.MQTT_PROGRESS_INTERVAL)
+
+    def flush(self):
+        """Publishes any coalesced payloads that are still pending."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for topic_suffix, payload in pending.items():
+            self.publish(topic_suffix, payload)
+
     def publish_status(self, status_message):
-        self.publish("status", status_message, retain=True)
+        self.flush() # Keep ordering: a pending progress update must not arrive after the new status
+        self.publish("status", status_message)
 
     def publish_sync_progress(self, progress_data):
-        self.publish("sync_progress", progress_data)
+        self.publish_coalesced("sync_progress", progress_data)
 
     def publish_sync_summary(self, summary_data):
+        self.flush()
         self.publish("sync_summary", summary_data)
 
     def disconnect(self):
-        if self._client:
+        if self._client and self._started:
+            self._started = False
+            self.flush()
             self.publish_status("offline")
             self._client.loop_stop()
             self._client.disconnect()
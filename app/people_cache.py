@@ -0,0 +1,188 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+import requests
+from .config import Config
+from .http_client import immich_client
+
+logger = logging.getLogger(__name__)
+
+
+def people_page(body):
+    """
+    Normalises a /api/people response body.
+
+    Older Immich versions return a plain array of people; newer ones return an object with the
+    people of one page ({"people": [...], "hasNextPage": ...}).
+
+    Returns:
+        tuple: (people, whether another page follows).
+    """
+    if isinstance(body, list):
+        return body, False
+    if isinstance(body, dict):
+        return body.get('people') or [], bool(body.get('hasNextPage'))
+    raise ValueError(f"Unexpected /api/people response: {type(body).__name__}")
+
+
+class PeopleSnapshot:
+    """One fetch of /api/people: the list in Immich's order, a dict keyed by person ID and the list as a JSON array."""
+
+    def __init__(self, people, fetched_at, body=None, content_hash=None):
+        self.people = people
+        self.by_id = {person['id']: person for person in people}
+        # Served as-is by Frimmich's own /api/people; a plain-array response is reused without re-encoding.
+        self.body = bytes(body) if body is not None else json.dumps(people).encode()
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.content_hash = content_hash or self.etag # Hash of the upstream response, to spot an unchanged library
+        self.fetched_at = fetched_at
+
+    def get(self, person_id):
+        return self.by_id.get(person_id)
+
+
+class PeopleCache:
+    """
+    In-process cache of Immich's /api/people, shared by the UI routes and the sync engine.
+
+    Within the TTL the cached snapshot is served as is. After that, callers get the stale snapshot
+    right away while a single background refresh revalidates it, as long as it isn't older than
+    TTL + max_stale_seconds. Refreshes are conditional requests (If-None-Match/If-Modified-Since),
+    so an unchanged library that fits in one page costs a 304. Libraries spanning several pages
+    are fetched in full on every refresh. Concurrent fetches are coalesced into one request.
+    """
+
+    def __init__(self, client, ttl_seconds=60, max_stale_seconds=3600, page_size=500):
+        self._client = client
+        self.page_size = page_size
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._snapshot = None
+        self._validators = {} # Conditional request headers from the last 200 response
+        self._refreshing = False
+
+    def snapshot(self, max_age=None):
+        """
+        Returns the current PeopleSnapshot.
+
+        Args:
+            max_age (float): Seconds a snapshot may be old. None uses the TTL and serves stale data while
+                revalidating in the background; 0 always revalidates before returning, which the sync
+                uses so it never works from an outdated people list.
+        """
+        current = self._snapshot
+        if current is not None:
+            age = time.monotonic() - current.fetched_at
+            if age < (self.ttl_seconds if max_age is None else max_age):
+                return current
+            if max_age is None and age < self.ttl_seconds + self.max_stale_seconds:
+                self.refresh_in_background()
+                return current
+        return self._fetch(time.monotonic())
+
+    def get(self, person_id):
+        """Returns one person by ID from the current snapshot, or None."""
+        return self.snapshot().get(person_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._validators = {}
+
+    def refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, name="people-cache-refresh", daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self._fetch(time.monotonic())
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Could not refresh people from Immich; serving cached list: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _fetch(self, requested_at):
+        with self._fetch_lock:
+            current = self._snapshot
+            if current is not None and current.fetched_at >= requested_at:
+                return current # Fetched by another caller while we waited
+
+            response = self._client.get(
+                "/api/people", params={"page": 1, "size": self.page_size},
+                headers=dict(self._validators) if current is not None else {}
+            )
+            now = time.monotonic()
+            if response.status_code == 304 and current is not None:
+                current.fetched_at = now
+                return current
+            response.raise_for_status()
+            body = response.json()
+            people, has_next_page = people_page(body)
+            content_hash = hashlib.sha1(response.content).hexdigest()
+            if not has_next_page and current is not None and content_hash == current.content_hash:
+                # Upstream sent the same body without honouring the validators; keep the parsed snapshot.
+                current.fetched_at = now
+                snapshot = current
+            elif has_next_page:
+                people = people + list(iter_people(self._client, self.page_size, first_page=2))
+                snapshot = PeopleSnapshot(people, now, content_hash=content_hash)
+            else:
+                snapshot = PeopleSnapshot(people, now, body=response.content if isinstance(body, list) else None, content_hash=content_hash)
+
+            validators = {}
+            if not has_next_page: # Validators of the first of several pages can't tell that the others are unchanged
+                if response.headers.get("ETag"):
+                    validators["If-None-Match"] = response.headers["ETag"]
+                if response.headers.get("Last-Modified"):
+                    validators["If-Modified-Since"] = response.headers["Last-Modified"]
+            with self._lock:
+                self._snapshot = snapshot
+                self._validators = validators
+            return snapshot
+
+
+def iter_people(client, page_size=500, first_page=1):
+    """
+    Yields every person from Immich's /api/people one page at a time, for the sync engine.
+
+    Immich versions that page the list are walked with `page` and `size`, so only one page is in
+    memory at a time; a server that returns the whole list as a plain array ends the walk after
+    the first response (see people_page).
+    """
+    page = first_page
+    while True:
+        people, has_next_page = people_page(client.get_json("/api/people", params={"page": page, "size": page_size}))
+        yield from people
+        if not has_next_page:
+            return
+        page += 1
+
+
+def person_asset_count(client, person_id):
+    """
+    A person's asset count from the cheap /api/people/{id}/statistics call, or None if it failed.
+
+    Adding faces to a person or reassigning faces to them doesn't change their updatedAt, but it
+    changes this count.
+    """
+    try:
+        statistics = client.get_json(f"/api/people/{person_id}/statistics")
+    except requests.exceptions.RequestException:
+        return None
+    return statistics.get('assets') if isinstance(statistics, dict) else None
+
+
+people_cache = PeopleCache(
+    immich_client,
+    ttl_seconds=Config.PEOPLE_CACHE_TTL_SECONDS,
+    max_stale_seconds=Config.PEOPLE_CACHE_MAX_STALE_SECONDS,
+    page_size=Config.PEOPLE_PAGE_SIZE,
+)
@@ -0,0 +1,285 @@
+import os
+import shutil
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+from .http_client import immich_client
+from .people_cache import people_cache
+from .frigate_delivery import frigate_library, parse_frigate_output_path
+
+FACE_FILE_SUFFIX = ".jpg"
+EMPTY_PLAN = {"rename_dirs": [], "move": [], "remove": [], "forget": []}
+
+
+def scan_faces_dir(faces_dir):
+    """
+    Scans FRIGATE_FACES_DIR for <person_name>/<face_id>.jpg files.
+
+    Uses os.scandir and relies on the directory entry type, so no per-file stat is needed
+    even with tens of thousands of files.
+
+    Returns:
+        dict: face_id -> list of (person_name, path). A face can be on disk under more than one person.
+    """
+    on_disk = {}
+    try:
+        person_entries = list(os.scandir(faces_dir))
+    except FileNotFoundError:
+        return on_disk
+    for person_entry in person_entries:
+        if not person_entry.is_dir(follow_symlinks=False):
+            continue
+        with os.scandir(person_entry.path) as files:
+            for file_entry in files:
+                name = file_entry.name
+                if not name.endswith(FACE_FILE_SUFFIX) or not file_entry.is_file(follow_symlinks=False):
+                    continue
+                on_disk.setdefault(name[:-len(FACE_FILE_SUFFIX)], []).append((person_entry.name, file_entry.path))
+    return on_disk
+
+
+def collect_desired_faces():
+    """Lists every named person's faces from Immich and returns {face_id: person_name}."""
+    people = [p for p in people_cache.snapshot(max_age=0).people if p.get('name')]
+    desired = {}
+    with ThreadPoolExecutor(max_workers=max(1, Config.SYNC_PERSON_WORKERS), thread_name_prefix="reconcile") as pool:
+        face_lists = pool.map(lambda p: immich_client.get_json(f"/api/people/{p['id']}/faces"), people)
+        for person, faces in zip(people, face_lists):
+            for face in faces:
+                desired[face['id']] = person['name']
+    return desired
+
+
+def build_reconcile_plan(desired, on_disk, managed_face_ids, faces_dir):
+    """
+    Diffs the desired face set against what is on disk.
+
+    Only files for face IDs Frimmich has synced (managed_face_ids) are considered, so images
+    added to Frigate by other means are never touched.
+
+    Args:
+        desired (dict): face_id -> person_name, from Immich.
+        on_disk (dict): face_id -> [(person_name, path)], from scan_faces_dir.
+        managed_face_ids (set): Face IDs recorded in the state store.
+        faces_dir (str): FRIGATE_FACES_DIR.
+
+    Returns:
+        dict: {"rename_dirs": [...], "move": [...], "remove": [...], "forget": [...]}
+    """
+    moves = []
+    removals = []
+    for face_id, locations in on_disk.items():
+        if face_id not in managed_face_ids:
+            continue
+        target_name = desired.get(face_id)
+        keep = None
+        if target_name is not None:
+            keep = next((loc for loc in locations if loc[0] == target_name), None)
+        for person_name, path in locations:
+            if (person_name, path) == keep:
+                continue
+            if target_name is not None and keep is None:
+                # Reassigned face or renamed person: move the first copy, drop any others.
+                keep = (person_name, path)
+                moves.append({
+                    "face_id": face_id,
+                    "from": path,
+                    "to": os.path.join(faces_dir, target_name, face_id + FACE_FILE_SUFFIX),
+                    "person_name": target_name
+                })
+            else:
+                # Extra copies of a kept face are removed too, but the face stays in the state store.
+                removals.append({"face_id": face_id, "path": path, "forget": target_name is None})
+
+    # A person rename shows up as every file in one directory moving to the same new directory.
+    # When the new directory doesn't exist yet, rename the directory in one step instead.
+    rename_dirs = []
+    moves_by_dir = {}
+    for move in moves:
+        moves_by_dir.setdefault(os.path.dirname(move["from"]), []).append(move)
+    remaining_moves = []
+    claimed_dirs = set()
+    for from_dir, dir_moves in moves_by_dir.items():
+        targets = set(move["person_name"] for move in dir_moves)
+        to_dir = os.path.join(faces_dir, next(iter(targets)))
+        if len(targets) == 1 and to_dir not in claimed_dirs and not os.path.exists(to_dir) and len(dir_moves) == _count_entries(from_dir):
+            claimed_dirs.add(to_dir)
+            rename_dirs.append({"from": from_dir, "to": to_dir, "person_name": next(iter(targets)), "face_ids": [m["face_id"] for m in dir_moves]})
+        else:
+            remaining_moves.extend(dir_moves)
+
+    forget = sorted(face_id for face_id in managed_face_ids if face_id not in desired and face_id not in on_disk)
+    return {"rename_dirs": rename_dirs, "move": remaining_moves, "remove": removals, "forget": forget}
+
+
+def build_api_reconcile_plan(desired, managed_faces):
+    """
+    FRIGATE_DELIVERY=api: diffs the desired face set against the faces registered with Frigate.
+
+    A face that is no longer assigned, or is assigned to someone else, is deleted from the old
+    person in Frigate's face library and forgotten, so a reassigned face is registered under its
+    new person by the next sync. Faces saved to the faces directory before switching modes are
+    left alone.
+
+    Args:
+        desired (dict): face_id -> person_name, from Immich.
+        managed_faces (list): Face records from the state store.
+
+    Returns:
+        dict: A plan in the same shape as build_reconcile_plan.
+    """
+    removals = []
+    for record in managed_faces:
+        location = parse_frigate_output_path(record['output_path'])
+        if location is None:
+            continue
+        person_name, frigate_id = location
+        target_name = desired.get(record['face_id'])
+        if target_name == person_name:
+            continue
+        removals.append({
+            "face_id": record['face_id'],
+            "person_name": person_name,
+            "frigate_id": frigate_id,
+            "forget": True,
+            "reassigned": target_name is not None
+        })
+    return {"rename_dirs": [], "move": [], "remove": removals, "forget": []}
+
+
+def apply_api_reconcile_plan(plan, state_manager, library, logger=None):
+    """Applies a plan from build_api_reconcile_plan through Frigate's face library API, batched per person."""
+    errors = []
+    removals_by_person = {}
+    forgotten = []
+    unresolved = 0
+    for removal in plan["remove"]:
+        if removal["frigate_id"] is None:
+            # Frigate didn't report the file ID at registration; forget the face so it can be re-registered.
+            unresolved += 1
+            forgotten.append(removal)
+        else:
+            removals_by_person.setdefault(removal["person_name"], []).append(removal)
+
+    for person_name, removals in removals_by_person.items():
+        try:
+            library.delete(person_name, [removal["frigate_id"] for removal in removals])
+            forgotten.extend(removals)
+        except requests.exceptions.RequestException as e:
+            errors.append(f"delete {len(removals)} faces of {person_name} from Frigate: {e}")
+
+    state_manager.remove_synced_faces(removal["face_id"] for removal in forgotten)
+    if any(removal["reassigned"] for removal in forgotten):
+        # The new owners' fingerprints may be unchanged; make the next delta sync list them again.
+        state_manager.clear_person_fingerprints()
+
+    if logger:
+        if unresolved:
+            logger(f"WARN: {unresolved} faces were registered without a Frigate file ID and must be removed in Frigate's UI.")
+        for error in errors:
+            logger(f"ERROR: Reconcile failed to {error}")
+    return errors
+
+
+def _count_entries(path):
+    with os.scandir(path) as entries:
+        return sum(1 for _ in entries)
+
+
+def summarize_plan(plan):
+    return {
+        "renamed_dirs": len(plan["rename_dirs"]),
+        "moved": len(plan["move"]) + sum(len(r["face_ids"]) for r in plan["rename_dirs"]),
+        "removed": len(plan["remove"]),
+        "forgotten": len(plan["forget"]),
+    }
+
+
+def apply_reconcile_plan(plan, state_manager, logger=None):
+    """Applies a plan produced by build_reconcile_plan and keeps the state store in step with the disk."""
+    errors = []
+    for rename in plan["rename_dirs"]:
+        try:
+            os.rename(rename["from"], rename["to"])
+            for face_id in rename["face_ids"]:
+                state_manager.update_face_location(face_id, rename["person_name"], os.path.join(rename["to"], face_id + FACE_FILE_SUFFIX))
+        except OSError as e:
+            errors.append(f"rename {rename['from']} -> {rename['to']}: {e}")
+
+    for move in plan["move"]:
+        try:
+            os.makedirs(os.path.dirname(move["to"]), exist_ok=True)
+            shutil.move(move["from"], move["to"])
+            state_manager.update_face_location(move["face_id"], move["person_name"], move["to"])
+        except OSError as e:
+            errors.append(f"move {move['from']} -> {move['to']}: {e}")
+
+    forgotten_ids = list(plan["forget"])
+    for removal in plan["remove"]:
+        try:
+            os.remove(removal["path"])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"remove {removal['path']}: {e}")
+            continue
+        if removal["forget"]:
+            forgotten_ids.append(removal["face_id"])
+    state_manager.remove_synced_faces(forgotten_ids)
+
+    if logger:
+        for error in errors:
+            logger(f"ERROR: Reconcile failed to {error}")
+    return errors
+
+
+def plan_reconcile(state_manager, desired):
+    """
+    Builds the reconcile plan for FRIGATE_FACES_DIR, or for Frigate's face library when
+    FRIGATE_DELIVERY=api, without changing anything.
+
+    Returns:
+        dict: The plan, or None when Immich returned no faces although some are synced.
+    """
+    state_manager.flush()
+    managed_face_ids = set(state_manager.synced_face_ids)
+    if not desired and managed_face_ids:
+        return None
+    if Config.FRIGATE_DELIVERY == "api":
+        return build_api_reconcile_plan(desired, state_manager.all_faces())
+    on_disk = scan_faces_dir(Config.FRIGATE_FACES_DIR)
+    return build_reconcile_plan(desired, on_disk, managed_face_ids, Config.FRIGATE_FACES_DIR)
+
+
+def reconcile(state_manager, desired, dry_run=False, logger=None):
+    """
+    Runs a reconcile pass against FRIGATE_FACES_DIR, or against Frigate's face library when
+    FRIGATE_DELIVERY=api.
+
+    Args:
+        state_manager (StateManager): The sync state store.
+        desired (dict): face_id -> person_name for every face currently assigned in Immich.
+        dry_run (bool): When True, only report what would change.
+        logger (callable): Optional log function, e.g. status_manager.add_log.
+
+    Returns:
+        dict: A report with the summary counts, the plan and any errors.
+    """
+    plan = plan_reconcile(state_manager, desired)
+    if plan is None:
+        # An empty desired set almost certainly means Immich returned nothing useful; don't wipe Frigate.
+        if logger:
+            logger("WARN: Reconcile skipped: Immich returned no named faces.")
+        return {"dry_run": dry_run, "skipped": True, "summary": summarize_plan(EMPTY_PLAN)}
+
+    report = {"dry_run": dry_run, "summary": summarize_plan(plan), "plan": plan}
+    if not dry_run:
+        if Config.FRIGATE_DELIVERY == "api":
+            report["errors"] = apply_api_reconcile_plan(plan, state_manager, frigate_library, logger)
+        else:
+            report["errors"] = apply_reconcile_plan(plan, state_manager, logger)
+    if logger:
+        summary = report["summary"]
+        prefix = "Reconcile (dry run) would have" if dry_run else "Reconcile"
+        logger(f"INFO: {prefix} renamed {summary['renamed_dirs']} directories, moved {summary['moved']}, removed {summary['removed']} and forgot {summary['forgotten']} faces.")
+    return report
@@ -1,37 +1,254 @@
 import os
 import json
+import time
+import sqlite3
 import threading
 
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS synced_faces (
+    face_id TEXT PRIMARY KEY,
+    person_id TEXT,
+    person_name TEXT,
+    asset_id TEXT,
+    output_path TEXT,
+    content_hash TEXT,
+    synced_at REAL,
+    face_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_synced_faces_person ON synced_faces(person_id);
+CREATE TABLE IF NOT EXISTS person_fingerprints (
+    person_id TEXT PRIMARY KEY,
+    face_count INTEGER,
+    face_ids_hash TEXT,
+    updated_at TEXT,
+    checked_at REAL,
+    asset_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS sync_stats (
+    name TEXT PRIMARY KEY,
+    total REAL,
+    samples INTEGER
+);
+"""
+
+FACE_COLUMNS = ("face_id", "person_id", "person_name", "asset_id", "output_path", "content_hash", "synced_at", "face_hash")
+INSERT_FACE = f"INSERT OR REPLACE INTO synced_faces ({', '.join(FACE_COLUMNS)}) VALUES ({', '.join('?' * len(FACE_COLUMNS))})"
+SELECT_FACES = f"SELECT {', '.join(FACE_COLUMNS)} FROM synced_faces"
+STATS_WINDOW = 5000 # Samples a sync stat averages over; older ones fade out as new syncs are recorded
+
+
 class StateManager:
-    def __init__(self, state_file):
-        self.state_file = state_file
+    """
+    Persistent record of which faces have been synced to Frigate.
+
+    State lives in a SQLite database in WAL mode, so recording a face is an O(1) insert instead of a
+    rewrite of the whole state, and a crash mid-sync can lose at most the last uncommitted batch but
+    never corrupts what was already committed. Face IDs are also kept in memory for fast lookups.
+    """
+
+    def __init__(self, db_path, legacy_state_file=None, batch_size=100, commit_interval=2.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
         self._lock = threading.Lock()
+        self._pending = []
+        self._last_commit = time.monotonic()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = set(row[1] for row in self._conn.execute("PRAGMA table_info(synced_faces)"))
+        if "face_hash" not in columns: # Databases created before near-duplicate suppression
+            with self._conn:
+                self._conn.execute("ALTER TABLE synced_faces ADD COLUMN face_hash TEXT")
+        columns = set(row[1] for row in self._conn.execute("PRAGMA table_info(person_fingerprints)"))
+        if "asset_count" not in columns: # Fingerprints stored before delta sync compared asset counts
+            with self._conn:
+                self._conn.execute("ALTER TABLE person_fingerprints ADD COLUMN asset_count INTEGER")
+
+        if legacy_state_file:
+            self._migrate_legacy_state(legacy_state_file)
         self.synced_face_ids = self._load_state()
+        # Faces imported from the legacy JSON state don't know their person until a sync adopts them.
+        self.legacy_face_ids = self._load_legacy_face_ids()
+
+    def _migrate_legacy_state(self, legacy_state_file):
+        """Imports face IDs from the old synced_faces_state.json once, then moves the file aside."""
+        if not os.path.exists(legacy_state_file):
+            return
+        try:
+            with open(legacy_state_file, 'r') as f:
+                face_ids = json.load(f).get('synced_face_ids', [])
+        except (IOError, json.JSONDecodeError):
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO synced_faces (face_id, synced_at) VALUES (?, ?)",
+                ((face_id, None) for face_id in face_ids)
+            )
+        os.replace(legacy_state_file, legacy_state_file + ".migrated")
 
     def _load_state(self):
         with self._lock:
-            if not os.path.exists(self.state_file):
-                return set()
-            try:
-                with open(self.state_file, 'r') as f:
-                    data = json.load(f)
-                    return set(data.get('synced_face_ids', []))
-            except (IOError, json.JSONDecodeError):
-                return set()
+            return set(row[0] for row in self._conn.execute("SELECT face_id FROM synced_faces"))
 
-    def _save_state(self):
+    def _load_legacy_face_ids(self):
         with self._lock:
-            try:
-                with open(self.state_file, 'w') as f:
-                    json.dump({'synced_face_ids': list(self.synced_face_ids)}, f, indent=2)
-            except IOError:
-                # Handle potential errors, e.g., log them
-                pass
+            return set(row[0] for row in self._conn.execute("SELECT face_id FROM synced_faces WHERE person_id IS NULL"))
+
+    def _commit_pending(self):
+        # Caller holds self._lock.
+        if self._pending:
+            with self._conn:
+                self._conn.executemany(INSERT_FACE, self._pending)
+            self._pending = []
+        self._last_commit = time.monotonic()
 
     def is_synced(self, face_id):
         return face_id in self.synced_face_ids
 
-    def add_synced_face(self, face_id):
+    def add_synced_face(self, face_id, person_id=None, person_name=None, asset_id=None, output_path=None, content_hash=None, face_hash=None):
+        """Records a synced face. Writes are batched; call flush() at the end of a sync."""
         with self._lock:
             self.synced_face_ids.add(face_id)
-        self._save_state()
+            if person_id is not None:
+                self.legacy_face_ids.discard(face_id)
+            self._pending.append((face_id, person_id, person_name, asset_id, output_path, content_hash, time.time(), face_hash))
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._last_commit >= self.commit_interval:
+                self._commit_pending()
+
+    def remove_synced_faces(self, face_ids):
+        with self._lock:
+            self._commit_pending()
+            face_ids = list(face_ids)
+            with self._conn:
+                self._conn.executemany("DELETE FROM synced_faces WHERE face_id = ?", ((face_id,) for face_id in face_ids))
+            self.synced_face_ids.difference_update(face_ids)
+            self.legacy_face_ids.difference_update(face_ids)
+
+    def adopt_legacy_faces(self, person_id, person_name, face_ids):
+        """
+        Records the person of faces imported from the legacy JSON state, once a sync has seen whose
+        they are. Faces that already have a person are left alone.
+        """
+        face_ids = [face_id for face_id in face_ids if face_id in self.legacy_face_ids]
+        if not face_ids:
+            return
+        with self._lock:
+            self._commit_pending()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE synced_faces SET person_id = ?, person_name = ? WHERE face_id = ? AND person_id IS NULL",
+                    ((person_id, person_name, face_id) for face_id in face_ids)
+                )
+            self.legacy_face_ids.difference_update(face_ids)
+
+    def update_face_location(self, face_id, person_name, output_path):
+        """Records that a synced face's file now lives under a different person directory."""
+        with self._lock:
+            self._commit_pending()
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE synced_faces SET person_name = ?, output_path = ? WHERE face_id = ?",
+                    (person_name, output_path, face_id)
+                )
+
+    def set_face_hashes(self, face_hashes):
+        """Stores perceptual hashes ({face_id: hex}) computed for faces synced before hashes were recorded."""
+        with self._lock:
+            self._commit_pending()
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE synced_faces SET face_hash = ? WHERE face_id = ?",
+                    ((face_hash, face_id) for face_id, face_hash in face_hashes.items())
+                )
+
+    def replace_all(self, records):
+        """Atomically replaces the whole state with the given face records (dicts keyed by column name)."""
+        rows = [tuple(record.get(column) for column in FACE_COLUMNS) for record in records]
+        with self._lock:
+            self._pending = []
+            with self._conn:
+                self._conn.execute("DELETE FROM synced_faces")
+                self._conn.executemany(INSERT_FACE, rows)
+            self.synced_face_ids = set(row[0] for row in rows)
+            self.legacy_face_ids = set(row[0] for row in rows if row[1] is None)
+
+    def get_face(self, face_id):
+        with self._lock:
+            self._commit_pending()
+            row = self._conn.execute(SELECT_FACES + " WHERE face_id = ?", (face_id,)).fetchone()
+        return dict(zip(FACE_COLUMNS, row)) if row else None
+
+    def faces_for_person(self, person_id):
+        with self._lock:
+            self._commit_pending()
+            rows = self._conn.execute(SELECT_FACES + " WHERE person_id = ?", (person_id,)).fetchall()
+        return [dict(zip(FACE_COLUMNS, row)) for row in rows]
+
+    def all_faces(self):
+        with self._lock:
+            self._commit_pending()
+            rows = self._conn.execute(SELECT_FACES).fetchall()
+        return [dict(zip(FACE_COLUMNS, row)) for row in rows]
+
+    def get_person_fingerprint(self, person_id):
+        """Returns the fingerprint stored by the last complete sync of a person, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT face_count, face_ids_hash, updated_at, checked_at, asset_count FROM person_fingerprints WHERE person_id = ?",
+                (person_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'face_count': row[0], 'face_ids_hash': row[1], 'updated_at': row[2], 'checked_at': row[3], 'asset_count': row[4]}
+
+    def set_person_fingerprint(self, person_id, face_count, face_ids_hash, updated_at, asset_count=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO person_fingerprints (person_id, face_count, face_ids_hash, updated_at, checked_at, asset_count) VALUES (?, ?, ?, ?, ?, ?)",
+                (person_id, face_count, face_ids_hash, updated_at, time.time(), asset_count)
+            )
+
+    def clear_person_fingerprints(self):
+        """Forgets every delta-sync fingerprint, so the next delta sync lists every person's faces again."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM person_fingerprints")
+
+    def sync_stats(self):
+        """Returns the per-face averages recorded by earlier syncs: {name: {"value": average, "samples": n}}."""
+        with self._lock:
+            rows = self._conn.execute("SELECT name, total, samples FROM sync_stats").fetchall()
+        return {name: {"value": total / samples, "samples": samples} for name, total, samples in rows if samples}
+
+    def record_sync_stats(self, stats):
+        """
+        Folds a sync's measurements ({name: (total, samples)}) into the running averages.
+
+        Once a stat has more than STATS_WINDOW samples the older ones are scaled down, so the
+        averages follow changes in the library, the network or the configuration.
+        """
+        with self._lock, self._conn:
+            for name, (total, samples) in stats.items():
+                if samples <= 0:
+                    continue
+                row = self._conn.execute("SELECT total, samples FROM sync_stats WHERE name = ?", (name,)).fetchone()
+                old_total, old_samples = row or (0.0, 0)
+                if old_samples and old_samples + samples > STATS_WINDOW:
+                    keep = max(0, STATS_WINDOW - samples) / old_samples
+                    old_total, old_samples = old_total * keep, round(old_samples * keep)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_stats (name, total, samples) VALUES (?, ?, ?)",
+                    (name, old_total + total, old_samples + samples)
+                )
+
+    def flush(self):
+        with self._lock:
+            self._commit_pending()
+
+    def close(self):
+        with self._lock:
+            self._commit_pending()
+            self._conn.close()
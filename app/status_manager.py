@@ -1,68 +1,311 @@
+import os
+import json
+import time
+import sqlite3
 import threading
-from collections import deque
+from .config import Config
+
+SCHEMA_VERSION = 3 # Bumped when the tables change; the status database is rebuilt, it only holds transient state
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS status (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER,
+    state_version INTEGER,
+    log_seq INTEGER,
+    in_progress INTEGER,
+    status_message TEXT,
+    last_sync_summary TEXT,
+    current_person TEXT,
+    processed_faces_count INTEGER,
+    total_faces_to_process INTEGER,
+    job_id INTEGER,
+    queued_jobs INTEGER,
+    frigate_restart_due REAL
+);
+CREATE TABLE IF NOT EXISTS status_logs (
+    slot INTEGER PRIMARY KEY,
+    seq INTEGER,
+    version INTEGER,
+    level INTEGER,
+    created_at REAL,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_status_logs_seq ON status_logs(seq);
+CREATE INDEX IF NOT EXISTS idx_status_logs_version ON status_logs(version);
+INSERT OR IGNORE INTO status VALUES (1, 0, 0, 0, 0, 'Idle. Last sync: Never', '{}', '', 0, 0, NULL, 0, NULL);
+"""
+
+STATE_COLUMNS = ("in_progress", "status_message", "last_sync_summary", "current_person", "processed_faces_count", "total_faces_to_process", "job_id", "queued_jobs")
+# Every status change bumps the version; state_version records the last one that touched the fields above.
+BUMP_STATE = "version = version + 1, state_version = version + 1"
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+LEVEL_NAMES = {10: "DEBUG", 20: "INFO", 30: "WARN", 40: "ERROR", 50: "CRITICAL"}
+
+MAX_LOG_LINES = 100 # Lines returned to status viewers
+MAX_LOG_ENTRIES = 500 # Entries returned by one get_logs call
+POLL_INTERVAL = 0.25 # How often a waiting viewer checks for changes made by other processes
+
+
+def level_number(level):
+    """Maps a level name (or number) to its number; unknown names count as INFO."""
+    if isinstance(level, int):
+        return level
+    return LEVELS.get(str(level).upper(), LEVELS["INFO"])
+
 
 class StatusManager:
-    def __init__(self):
+    """
+    Sync status and the sync log, shared by every Frimmich process.
+
+    State lives in a small SQLite database (WAL mode) next to the sync state, so the sync worker
+    process writes it and any number of gunicorn workers serve it without split-brain status.
+    start_sync is an atomic compare-and-set on that row, so only one sync or reconcile runs at a
+    time across processes. Every change bumps a version, so viewers can ask for "everything after
+    version N". Viewers in the writing process are woken right away, others notice within POLL_INTERVAL.
+
+    The log is a ring of `log_capacity` slots: entry `seq` goes into slot seq % capacity, so the
+    table never grows and old entries are overwritten rather than deleted. Entries carry a level,
+    a timestamp and their sequence number, and survive from one sync to the next. Entries below
+    `min_level` are dropped before their message is formatted.
+    """
+
+    def __init__(self, db_path, log_capacity=1000, min_level="INFO"):
+        self.db_path = db_path
+        self.log_capacity = max(log_capacity, MAX_LOG_LINES + 1) # One more than viewers get, so a viewer that fell behind is detected
+        self.min_level = level_number(min_level)
         self._lock = threading.Lock()
-        self.in_progress = False
-        self.status_message = "Idle. Last sync: Never"
-        self.last_sync_summary = {}
-        self.logs = deque(maxlen=100) # Store last 100 log lines
-        self.current_person = ""
-        self.processed_faces_count = 0
-        self.total_faces_to_process = 0
-
-    def start_sync(self):
+        self._changed = threading.Condition()
+        self._conn = None
+        self._pid = None
+
+    def _connection(self):
+        # Caller holds self._lock. Connections aren't shared across forks, so each process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                with self._conn:
+                    self._conn.execute("DROP TABLE IF EXISTS status")
+                    self._conn.execute("DROP TABLE IF EXISTS status_logs")
+                    self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._conn.executescript(SCHEMA)
+            with self._conn:
+                self._conn.execute("DELETE FROM status_logs WHERE slot >= ?", (self.log_capacity,)) # The capacity was lowered
+            self._pid = os.getpid()
+        return self._conn
+
+    def _write(self, sql, params=()):
         with self._lock:
-            if self.in_progress:
-                return False # Sync already running
-            self.in_progress = True
-            self.status_message = "Sync initiated..."
-            self.logs.clear()
-            self.current_person = ""
-            self.processed_faces_count = 0
-            self.total_faces_to_process = 0
-            return True
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(sql, params)
+        with self._changed:
+            self._changed.notify_all()
+        return cursor.rowcount
+
+    def start_sync(self, job_id=None):
+        # The log is kept; viewers can still read how the previous run ended.
+        started = self._write(
+            f"UPDATE status SET {BUMP_STATE}, in_progress = 1, status_message = 'Sync initiated...', current_person = '', "
+            "processed_faces_count = 0, total_faces_to_process = 0, job_id = ? WHERE id = 1 AND in_progress = 0",
+            (job_id,)
+        )
+        return started > 0 # False if a sync is already running, possibly in another process
+
+    def recover_interrupted(self):
+        """Clears a sync left in progress by a worker that died. Called by the process taking over the sync worker role."""
+        return self._write(
+            f"UPDATE status SET {BUMP_STATE}, in_progress = 0, job_id = NULL, "
+            "status_message = 'Sync interrupted; queued jobs resume shortly.' WHERE id = 1 AND in_progress = 1"
+        ) > 0
 
     def update_status(self, message):
-        with self._lock:
-            self.status_message = message
+        self._write(f"UPDATE status SET {BUMP_STATE}, status_message = ? WHERE id = 1", (message,))
 
     def update_progress(self, current_person, processed_faces_count, total_faces_to_process):
+        if total_faces_to_process > 0:
+            progress_percent = (processed_faces_count / total_faces_to_process) * 100
+            status_message = f"Processing {current_person} ({processed_faces_count}/{total_faces_to_process} faces) - {progress_percent:.1f}%"
+        else:
+            status_message = f"Processing {current_person} (0/0 faces)"
+        self._write(
+            f"UPDATE status SET {BUMP_STATE}, current_person = ?, processed_faces_count = ?, total_faces_to_process = ?, "
+            "status_message = ? WHERE id = 1",
+            (current_person, processed_faces_count, total_faces_to_process, status_message)
+        )
+
+    def set_frigate_restart_due(self, due_at):
+        """Records when a debounced Frigate restart is due, so the next sync worker sends it if this one doesn't."""
+        self._write("UPDATE status SET frigate_restart_due = ? WHERE id = 1", (due_at,))
+
+    def clear_frigate_restart(self, due_at):
+        """Clears the pending restart once it was sent, unless a later one has been requested since."""
+        self._write("UPDATE status SET frigate_restart_due = NULL WHERE id = 1 AND frigate_restart_due <= ?", (due_at,))
+
+    def frigate_restart_due(self):
         with self._lock:
-            self.current_person = current_person
-            self.processed_faces_count = processed_faces_count
-            self.total_faces_to_process = total_faces_to_process
-            if total_faces_to_process > 0:
-                progress_percent = (processed_faces_count / total_faces_to_process) * 100
-                self.status_message = f"Processing {current_person} ({processed_faces_count}/{total_faces_to_process} faces) - {progress_percent:.1f}%"
-            else:
-                self.status_message = f"Processing {current_person} (0/0 faces)"
+            return self._connection().execute("SELECT frigate_restart_due FROM status WHERE id = 1").fetchone()[0]
 
-    def add_log(self, log_message):
+    def set_queued_jobs(self, count):
+        self._write(f"UPDATE status SET {BUMP_STATE}, queued_jobs = ? WHERE id = 1 AND queued_jobs != ?", (count, count))
+
+    def enabled(self, level):
+        return level_number(level) >= self.min_level
+
+    def log(self, level, message, *args):
+        """
+        Appends a log entry. The message is %-formatted with args only if the level is enabled,
+        so callers in the sync loop pay nothing for entries below min_level.
+        """
+        levelno = level_number(level)
+        if levelno < self.min_level:
+            return
+        if args:
+            message = message % args
         with self._lock:
-            self.logs.append(log_message)
+            conn = self._connection()
+            with conn:
+                conn.execute("UPDATE status SET version = version + 1, log_seq = log_seq + 1 WHERE id = 1")
+                conn.execute(
+                    "INSERT OR REPLACE INTO status_logs (slot, seq, version, level, created_at, message) "
+                    "SELECT log_seq % ?, log_seq, version, ?, ?, ? FROM status WHERE id = 1",
+                    (self.log_capacity, levelno, time.time(), message)
+                )
+        with self._changed:
+            self._changed.notify_all()
+
+    def add_log(self, log_message):
+        """Appends a preformatted "LEVEL: message" line, the form reconcile and the Frigate clients log in."""
+        level, separator, message = log_message.partition(": ")
+        if not separator or level not in LEVELS:
+            level, message = "INFO", log_message
+        self.log(level, message)
 
     def end_sync(self, summary):
+        self._write(
+            f"UPDATE status SET {BUMP_STATE}, in_progress = 0, job_id = NULL, status_message = ?, last_sync_summary = ?, "
+            "current_person = '', processed_faces_count = 0, total_faces_to_process = 0 WHERE id = 1",
+            (summary.get("message", "Sync finished."), json.dumps(summary))
+        )
+
+    @staticmethod
+    def _line(levelno, message):
+        return f"{LEVEL_NAMES.get(levelno, 'INFO')}: {message}"
+
+    @staticmethod
+    def _state(row):
+        state = dict(zip(STATE_COLUMNS, row))
+        state["in_progress"] = bool(state["in_progress"])
+        state["last_sync_summary"] = json.loads(state["last_sync_summary"] or "{}")
+        return state
+
+    def _read_version(self):
         with self._lock:
-            self.in_progress = False
-            self.status_message = summary.get("message", "Sync finished.")
-            self.last_sync_summary = summary
-            self.current_person = ""
-            self.processed_faces_count = 0
-            self.total_faces_to_process = 0
+            return self._connection().execute("SELECT version FROM status WHERE id = 1").fetchone()[0]
 
     def get_status(self):
         with self._lock:
-            return {
-                "in_progress": self.in_progress,
-                "status_message": self.status_message,
-                "last_sync_summary": self.last_sync_summary,
-                "logs": list(self.logs),
-                "current_person": self.current_person,
-                "processed_faces_count": self.processed_faces_count,
-                "total_faces_to_process": self.total_faces_to_process
-            }
+            conn = self._connection()
+            row = conn.execute(f"SELECT {', '.join(STATE_COLUMNS)} FROM status WHERE id = 1").fetchone()
+            logs = conn.execute("SELECT level, message FROM status_logs ORDER BY seq DESC LIMIT ?", (MAX_LOG_LINES,)).fetchall()
+        status = self._state(row)
+        status["logs"] = [self._line(*entry) for entry in reversed(logs)]
+        return status
+
+    def get_logs(self, since=None, level=None, limit=MAX_LOG_ENTRIES):
+        """
+        Returns log entries after sequence number `since`, oldest first.
+
+        Args:
+            since (int): The `next` cursor from the previous call, or None for the newest entries.
+            level (str): Only return entries at or above this level.
+            limit (int): Maximum number of entries.
+
+        Returns:
+            dict: {"entries": [{seq, level, time, message}], "next": cursor for the next call,
+            "missed": True if entries after `since` were already overwritten in the ring}.
+        """
+        levelno = level_number(level) if level else 0
+        limit = min(max(limit, 1), MAX_LOG_ENTRIES)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN")
+                last_seq = conn.execute("SELECT log_seq FROM status WHERE id = 1").fetchone()[0]
+                if since is not None and since > last_seq:
+                    since = None # The cursor is from an older status database
+                if since is None:
+                    rows = conn.execute(
+                        "SELECT seq, level, created_at, message FROM status_logs WHERE level >= ? ORDER BY seq DESC LIMIT ?",
+                        (levelno, limit)
+                    ).fetchall()[::-1]
+                else:
+                    rows = conn.execute(
+                        "SELECT seq, level, created_at, message FROM status_logs WHERE seq > ? AND level >= ? ORDER BY seq LIMIT ?",
+                        (since, levelno, limit)
+                    ).fetchall()
+        entries = [
+            {"seq": seq, "level": LEVEL_NAMES.get(entry_level, "INFO"), "time": created_at, "message": message}
+            for seq, entry_level, created_at, message in rows
+        ]
+        # A full page may have more behind it; otherwise the reader is caught up, including filtered-out entries.
+        next_seq = entries[-1]["seq"] if len(entries) == limit and since is not None else last_seq
+        return {
+            "entries": entries,
+            "next": next_seq,
+            "missed": since is not None and since < last_seq - self.log_capacity,
+        }
+
+    def get_changes(self, since=None, timeout=0):
+        """
+        Returns what changed after version `since`, waiting up to `timeout` seconds for a change.
+
+        Waiting holds no lock or database transaction, so any number of viewers can long-poll
+        without slowing down the sync; only the log lines newer than `since` are read.
+
+        Args:
+            since (int): The last version the viewer has seen, or None for a full snapshot.
+            timeout (float): Seconds to wait when nothing has changed yet.
+
+        Returns:
+            dict: {"version": ..., "logs": [...], "state": {...}} where "state" is only present if a
+            status field changed, and "reset_logs" is True when the viewer should drop its log
+            lines first (it has none yet, or fell too far behind).
+        """
+        if since is not None and since > self._read_version():
+            since = None # The viewer saw an older status database; start over
+        if since is not None and timeout > 0:
+            deadline = time.monotonic() + timeout
+            while self._read_version() <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                with self._changed:
+                    self._changed.wait(min(POLL_INTERVAL, remaining))
+
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN") # One read transaction, so the version, logs and state are consistent
+                version, state_version, *state = conn.execute(
+                    f"SELECT version, state_version, {', '.join(STATE_COLUMNS)} FROM status WHERE id = 1"
+                ).fetchone()
+                logs = conn.execute(
+                    "SELECT level, message FROM status_logs WHERE version > ? ORDER BY seq DESC LIMIT ?",
+                    (since if since is not None else -1, MAX_LOG_LINES + 1)
+                ).fetchall()
+
+        changes = {"version": version}
+        if since is None or len(logs) > MAX_LOG_LINES:
+            changes["reset_logs"] = True
+        changes["logs"] = [self._line(*entry) for entry in reversed(logs[:MAX_LOG_LINES])]
+        if since is None or state_version > since:
+            changes["state"] = self._state(state)
+        return changes
 
 # Singleton instance
-status_manager = StatusManager()
\ No newline at end of file
+status_manager = StatusManager(Config.STATUS_DB, log_capacity=Config.STATUS_LOG_CAPACITY, min_level=Config.LOG_LEVEL)
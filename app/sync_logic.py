@@ -1,167 +1,517 @@
 import time
+import hashlib
+import threading
 import requests
 import os
-from PIL import Image
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from .config import Config
 from .state_manager import StateManager
 from .mqtt_client import mqtt_client # Import the MQTT client
+from .http_client import immich_client
+from .reconcile import reconcile
+from .image_pipeline import crop_face, atomic_write, dhash, hamming_distance
+from .sync_plan import build_sync_plan
+from .thumbnail_cache import thumbnail_cache
+from .frigate_delivery import frigate_library, frigate_restarter, frigate_output_path
+from .metrics import SYNC_STAGES, SYNC_FACES, SYNC_QUEUE_DEPTH, SYNC_RUNNING
+
+HASH_BITS = 64 # dHash size
+MAX_HASH_BANDS = 16 # Narrower bands would match too many hashes to be worth it; larger distances scan every hash
+PROGRESS_WRITE_INTERVAL = 0.5 # Min seconds between progress writes to the status database...
+PROGRESS_WRITE_FACES = 100 # ...unless this many faces finished since the last one
+
+
+class SyncProgress:
+    """
+    Thread-safe counters shared by the sync workers.
+
+    Progress goes to the status database at most every PROGRESS_WRITE_INTERVAL seconds or
+    PROGRESS_WRITE_FACES faces, outside the counters' lock, and a worker never waits for another
+    worker's write; flush() writes the final counts.
+    """
+
+    def __init__(self, status_manager):
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._status_manager = status_manager
+        self._person_name = ""
+        self._next_write_at = 0.0
+        self._next_write_processed = 0
+        self._written = None # (processed, total) last written to the status database
+        self.trained = 0
+        self.skipped = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self.processed = 0
+        self.total = 0
+        self.downloaded_bytes = 0
+        self.downloads = 0
+        self.written_bytes = 0
+        self.writes = 0
+
+    def add_to_total(self, count):
+        with self._lock:
+            self.total += count
+
+    def record_bytes(self, downloaded=None, written=None):
+        """Counts a thumbnail download or a face write, for the per-face averages sync plans estimate with."""
+        with self._lock:
+            if downloaded is not None:
+                self.downloaded_bytes += downloaded
+                self.downloads += 1
+            if written is not None:
+                self.written_bytes += written
+                self.writes += 1
+
+    def record(self, person_name, outcome):
+        """Records the outcome ('trained', 'skipped', 'deduplicated' or 'failed') of a single face and publishes progress."""
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            SYNC_FACES.labels(outcome).inc()
+            self.processed += 1
+            self._person_name = person_name
+            progress = self.as_payload(person_name)
+            now = time.monotonic()
+            write = now >= self._next_write_at or self.processed >= self._next_write_processed
+            if write:
+                self._next_write_at = now + PROGRESS_WRITE_INTERVAL
+                self._next_write_processed = self.processed + PROGRESS_WRITE_FACES
+        if write:
+            self._write(person_name, progress["processed_faces_count"], progress["total_faces_to_process"], wait=False)
+        # Compact payload without logs; the MQTT client coalesces these, so this never blocks.
+        mqtt_client.publish_sync_progress(progress)
+
+    def flush(self):
+        """Writes the latest counts to the status database, once the sync's faces are done."""
+        with self._lock:
+            person_name, processed, total = self._person_name, self.processed, self.total
+        self._write(person_name, processed, total, wait=True)
+
+    def _write(self, person_name, processed, total, wait):
+        if not self._write_lock.acquire(blocking=wait):
+            return # Another worker is writing; a later write or flush() carries these counts
+        try:
+            # Writes can finish out of order; never replace newer counts with older ones.
+            if self._written is None or (processed, total) > self._written:
+                self._status_manager.update_progress(person_name, processed, total)
+                self._written = (processed, total)
+        finally:
+            self._write_lock.release()
+
+    def as_payload(self, person_name):
+        # Caller holds self._lock.
+        return {
+            "in_progress": True,
+            "current_person": person_name,
+            "processed_faces_count": self.processed,
+            "total_faces_to_process": self.total,
+            "trained": self.trained,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated
+        }
+
+
+class PersonCompletion:
+    """
+    Runs once all of a person's queued faces have finished: stores their delta-sync fingerprint if
+    none failed, and checkpoints the person in the sync job unless some of their faces were cancelled.
+    """
+
+    def __init__(self, state_manager, person_id, pending, fingerprint=None, job=None):
+        self._lock = threading.Lock()
+        self._state_manager = state_manager
+        self._person_id = person_id
+        self._fingerprint = fingerprint # (face_count, face_ids_hash, updated_at, asset_count) or None
+        self._job = job
+        self._pending = pending
+        self._failed = False
+        self._cancelled = False
+        if pending == 0:
+            self._complete()
+
+    def face_done(self, outcome, count=1):
+        with self._lock:
+            self._pending -= count
+            self._failed = self._failed or outcome == 'failed'
+            self._cancelled = self._cancelled or outcome == 'cancelled'
+            complete = self._pending == 0
+        if complete:
+            self._complete()
+
+    def _complete(self):
+        if self._cancelled:
+            return
+        if self._fingerprint is not None and not self._failed:
+            self._state_manager.set_person_fingerprint(self._person_id, *self._fingerprint)
+        if self._job is not None:
+            # The faces must be on record before the job claims the person is done.
+            self._state_manager.flush()
+            self._job.person_done(self._person_id, 'failed' if self._failed else 'done')
+
+
+class PersonHashIndex:
+    """
+    Perceptual hashes (dHash) of the faces a person already has in Frigate, for near-duplicate suppression.
+
+    Seeded with the hashes recorded for faces synced earlier; faces synced before hashes were
+    recorded are hashed from their files on disk once and the hashes stored. Faces written during
+    the sync are added as they are claimed, so of a burst of near-identical shots only one is kept.
+
+    Hashes are bucketed by max_distance + 1 bands of their bits. Two hashes within max_distance
+    differ in at most max_distance bands, so they share at least one band exactly, and a claim
+    only compares against the hashes in its own bands' buckets instead of every face the person has.
+    """
+
+    def __init__(self, max_distance, hashes=None):
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self._hashes = {} # face_id -> int
+        bands = max_distance + 1
+        self._bands = [] # (shift, mask) per band
+        if 0 < bands <= MAX_HASH_BANDS:
+            shift = 0
+            for band in range(bands):
+                width = HASH_BITS // bands + (band < HASH_BITS % bands)
+                self._bands.append((shift, (1 << width) - 1))
+                shift += width
+        self._buckets = [{} for _ in self._bands] # Per band: band value -> set of face IDs
+        for face_id, face_hash in (hashes or {}).items():
+            self._add(face_id, face_hash)
+
+    def _add(self, face_id, face_hash):
+        # Caller holds self._lock (or is __init__).
+        self._remove(face_id)
+        self._hashes[face_id] = face_hash
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((face_hash >> shift) & mask, set()).add(face_id)
+
+    def _remove(self, face_id):
+        # Caller holds self._lock (or is __init__).
+        face_hash = self._hashes.pop(face_id, None)
+        if face_hash is None:
+            return
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            key = (face_hash >> shift) & mask
+            bucket = buckets.get(key)
+            if bucket is not None:
+                bucket.discard(face_id)
+                if not bucket:
+                    del buckets[key]
+
+    def _candidates(self, face_hash):
+        # Caller holds self._lock.
+        if not self._bands:
+            return self._hashes
+        candidates = set()
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            candidates.update(buckets.get((face_hash >> shift) & mask, ()))
+        return candidates
+
+    @classmethod
+    def for_person(cls, state_manager, person_id, max_distance):
+        hashes = {}
+        backfilled = {}
+        for record in state_manager.faces_for_person(person_id):
+            if record['face_hash']:
+                hashes[record['face_id']] = int(record['face_hash'], 16)
+            elif record['output_path'] and os.path.isfile(record['output_path']):
+                try:
+                    with open(record['output_path'], 'rb') as f:
+                        hashes[record['face_id']] = dhash(f.read())
+                except (OSError, ValueError):
+                    continue # Unreadable file; reconcile deals with it
+                backfilled[record['face_id']] = f"{hashes[record['face_id']]:016x}"
+        if backfilled:
+            state_manager.set_face_hashes(backfilled)
+        return cls(max_distance, hashes)
+
+    def claim(self, face_id, face_hash):
+        """Returns the ID of a near-duplicate already in the index, or adds the face and returns None."""
+        with self._lock:
+            if self.max_distance >= 0:
+                for other_id in self._candidates(face_hash):
+                    if other_id != face_id and hamming_distance(face_hash, self._hashes[other_id]) <= self.max_distance:
+                        return other_id
+            self._add(face_id, face_hash)
+            return None
+
+    def release(self, face_id):
+        """Forgets a claimed face that could not be written, so a near-duplicate may take its place."""
+        with self._lock:
+            self._remove(face_id)
+
+
+def process_face(face, person_id, person_name, state_manager, status_manager, progress, hash_index=None):
+    """
+    Downloads and crops a single face, then saves it to the Frigate faces directory or registers it through Frigate's API.
+
+    With a hash_index, a face within FACE_DEDUP_MAX_DISTANCE of one the person already has is
+    skipped before it is written and counted as 'deduplicated'.
+    """
+    face_id = face['id']
+    claimed = False
+    try:
+        status_manager.log("DEBUG", "Processing face %s for %s.", face_id, person_name)
+        # Download image; the thumbnail for a specific face comes from the /api/faces/{id}/thumbnail endpoint
+        with SYNC_STAGES["thumbnail_download"].time():
+            image_bytes = immich_client.get_bytes(f"/api/faces/{face_id}/thumbnail")
+        progress.record_bytes(downloaded=len(image_bytes))
+
+        # Crop image using bounding box from the face object
+        box = (face['boundingBox']['x1'], face['boundingBox']['y1'], face['boundingBox']['x2'], face['boundingBox']['y2'])
+        with SYNC_STAGES["crop"].time():
+            face_bytes = crop_face(image_bytes, box, max_size=Config.FRIGATE_FACE_MAX_SIZE, quality=Config.FRIGATE_FACE_JPEG_QUALITY)
+        # Cached only once the crop has decoded it, so a broken image never reaches the curation UI.
+        thumbnail_cache.put(face_id, image_bytes)
+
+        face_hash = None
+        if Config.FACE_DEDUP:
+            # Recorded for every synced face, so later syncs can compare against it.
+            with SYNC_STAGES["dedup_hash"].time():
+                face_hash = dhash(face_bytes)
+        if hash_index is not None:
+            duplicate_of = hash_index.claim(face_id, face_hash)
+            if duplicate_of is not None:
+                status_manager.log("DEBUG", "Skipping face %s for %s: near-duplicate of face %s.", face_id, person_name, duplicate_of)
+                progress.record(person_name, 'deduplicated')
+                return 'deduplicated'
+            claimed = True
+
+        if Config.FRIGATE_DELIVERY == "api":
+            # Frigate stores the face and rebuilds its classifier itself; no restart needed.
+            with SYNC_STAGES["frigate_register"].time():
+                frigate_id = frigate_library.register(person_name, face_id, face_bytes)
+            output_path = frigate_output_path(person_name, frigate_id)
+            status_manager.log("INFO", "Successfully registered face %s for %s with Frigate.", face_id, person_name)
+        else:
+            # Save to Frigate faces directory; written atomically so Frigate never reads a partial file
+            person_dir = os.path.join(Config.FRIGATE_FACES_DIR, person_name)
+            output_path = os.path.join(person_dir, f"{face_id}.jpg")
+            with SYNC_STAGES["disk_write"].time():
+                os.makedirs(person_dir, exist_ok=True)
+                atomic_write(output_path, face_bytes)
+            status_manager.log("INFO", "Successfully saved face %s for %s to %s.", face_id, person_name, output_path)
+        progress.record_bytes(written=len(face_bytes))
+        with SYNC_STAGES["state_persist"].time():
+            state_manager.add_synced_face(
+                face_id,
+                person_id=person_id,
+                person_name=person_name,
+                asset_id=face.get('assetId'),
+                output_path=output_path,
+                content_hash=hashlib.sha1(image_bytes).hexdigest(),
+                face_hash=f"{face_hash:016x}" if face_hash is not None else None
+            )
+        outcome = 'trained'
+
+    except requests.exceptions.RequestException as re:
+        status_manager.log("ERROR", "Network error while processing face %s for %s: %s", face_id, person_name, re)
+        outcome = 'failed'
+    except Exception as inner_e:
+        status_manager.log("ERROR", "Failed to process face %s for %s: %s", face_id, person_name, inner_e)
+        outcome = 'failed'
+    if outcome == 'failed' and claimed:
+        hash_index.release(face_id)
+    progress.record(person_name, outcome)
+    return outcome
+
+
+def summary_message(status, trained, skipped, failed, deduplicated=0):
+    counts = f"Trained: {trained}, Skipped: {skipped}, Failed: {failed}."
+    if deduplicated:
+        counts = f"Trained: {trained}, Skipped: {skipped}, Deduplicated: {deduplicated}, Failed: {failed}."
+    if status == "Cancelled":
+        return f"Sync cancelled. {counts}"
+    if status == "Paused":
+        return f"Sync paused for a manual sync; it will resume afterwards. {counts}"
+    return f"Sync complete! {counts}"
+
 
 # This function will be the main entry point for the background thread.
-def run_sync(app, status_manager, selected_people_data=None):
+def run_sync(app, status_manager, selected_people_data=None, delta=False, job=None):
+    """
+    Syncs faces from Immich to Frigate and returns the summary.
+
+    The sync first builds a plan (see app/sync_plan.py), streaming every face list it needs into
+    a temporary database, and then executes it, so the total is known before the first download,
+    listing never competes with downloads for Immich's request slots, and memory stays bounded by
+    the pipeline's buffers rather than the size of the library.
+
+    When run from the job queue, `job` (a SyncJob) lists the people an interrupted run of the same
+    job already finished, receives a checkpoint per person, and is asked between people whether to
+    stop; a cancelled or preempted run drains its in-flight faces and skips reconcile.
+    """
     with app.app_context(): # Needed to access app.logger
-        state_manager = StateManager(Config.STATE_FILE)
-        
+        state_manager = StateManager(Config.STATE_DB, legacy_state_file=Config.STATE_FILE)
+        plan = None
+        SYNC_RUNNING.set(1)
+
         try:
-            status_manager.add_log("INFO: Starting sync process...")
+            status_manager.log("INFO", "Starting sync process...")
             status_manager.update_status("Sync in progress...")
             mqtt_client.publish_status("sync_in_progress")
-            
-            # --- 1. Fetch people from Immich ---
-            people_url = f"{Config.IMMICH_API_URL}/api/people"
-            headers = {"x-api-key": Config.IMMICH_API_KEY, "Accept": "application/json"}
-            response = requests.get(people_url, headers=headers)
-            response.raise_for_status()
-            all_people = response.json()
-            status_manager.add_log(f"INFO: Found {len(all_people)} people in Immich.")
-
-            # Prepare people to process based on selection and global config
-            people_to_process_data = []
-            if selected_people_data is not None: # Manual sync with selection (curated faces)
-                # selected_people_data is now [{id: "person_id", faces: ["face_id_1", "face_id_2"]}]
-                people_to_process_data = selected_people_data
-                status_manager.add_log(f"INFO: Syncing {len(people_to_process_data)} selected people with curated faces.")
-            else: # Scheduled sync or manual sync without selection (sync all with MAX_FACES_PER_PERSON)
-                for p in all_people:
-                    # For non-curated syncs, we still fetch all faces and then limit
-                    people_to_process_data.append({'id': p['id'], 'name': p.get('name', 'Unknown'), 'faces': []}) # 'faces' will be populated later
-
-                status_manager.add_log(f"INFO: Syncing all {len(people_to_process_data)} people (non-curated).")
-
-            trained_count = 0
-            skipped_count = 0
-            failed_count = 0
-            total_faces_processed_overall = 0
-
-            for i, person_data in enumerate(people_to_process_data):
-                person_id = person_data['id']
-                person_name = next((p.get('name', 'Unknown') for p in all_people if p['id'] == person_id), 'Unknown')
-                curated_face_ids = person_data.get('faces') # This will be None for non-curated syncs
-
-                if not person_name:
-                    status_manager.add_log(f"WARN: Skipping person with no name (ID: {person_id}).")
-                    continue
-
-                status_manager.update_status(f"Fetching faces for {person_name}...")
-                
-                # --- 2. Fetch all faces for the person from Immich ---
-                # We need to fetch all faces to get their bounding box and assetId,
-                # then filter by curated_face_ids if provided.
-                all_person_faces_url = f"{Config.IMMICH_API_URL}/api/people/{person_id}/faces"
-                all_person_faces_response = requests.get(all_person_faces_url, headers=headers)
-                all_person_faces_response.raise_for_status()
-                all_person_faces = all_person_faces_response.json()
-
-                faces_to_process = []
-                if curated_face_ids is not None and len(curated_face_ids) > 0:
-                    # Filter for only the curated faces
-                    faces_to_process = [face for face in all_person_faces if face['id'] in curated_face_ids]
-                    status_manager.add_log(f"DEBUG: Processing {len(faces_to_process)} curated faces for {person_name}.")
-                else:
-                    # Non-curated sync: apply MAX_FACES_PER_PERSON limit
-                    faces_to_process = all_person_faces[:Config.MAX_FACES_PER_PERSON]
-                    status_manager.add_log(f"DEBUG: Processing {len(faces_to_process)} faces for {person_name} (limited by MAX_FACES_PER_PERSON).")
-
-                person_faces_processed = 0
-                for face in faces_to_process:
-                    face_id = face['id']
-                    temp_path = None # Initialize temp_path
-                    if Config.SKIP_EXISTING_FACES and state_manager.is_synced(face_id):
-                        skipped_count += 1
-                        person_faces_processed += 1
-                        total_faces_processed_overall += 1
-                        status_manager.update_progress(person_name, person_faces_processed, len(faces_to_process))
-                        mqtt_client.publish_sync_progress(status_manager.get_status())
+
+            if selected_people_data is not None:
+                status_manager.log("INFO", "Syncing %s selected people with curated faces.", len(selected_people_data))
+            else:
+                status_manager.log("INFO", "Syncing all people (non-curated).")
+
+            # --- 1. Plan: page through the people, stream the faces of every person that needs it
+            # and resolve the selection rules and skip-state, so the sync knows everything it
+            # will fetch before it starts. The plan is spooled to disk, not held in memory.
+            status_manager.update_status("Planning sync...")
+            plan = build_sync_plan(state_manager, selected_people_data, delta=delta, job=job, logger=status_manager.log)
+            plan_summary = plan.summary()
+            status_manager.log("INFO", "Found %s people to sync.", plan_summary["people"])
+            if job is not None:
+                job.set_people_total(plan_summary["people"])
+            stop_reason = plan.stop_reason
+            unchanged_people = plan_summary["unchanged_people"]
+            resumed_people = plan_summary["resumed_people"]
+            filtered_faces = plan_summary["filtered"]
+            desired_faces = plan.desired
+            for person_id, person_name, face_ids in plan.legacy_faces:
+                state_manager.adopt_legacy_faces(person_id, person_name, face_ids)
+            if resumed_people:
+                status_manager.log("INFO", "Resuming job %s: %s people were already done.", job.job_id, resumed_people)
+            status_manager.log(
+                "INFO", "Sync plan: %s faces to fetch for %s people, %s already synced, %s filtered.",
+                plan_summary["faces_to_fetch"], plan_summary["listed_people"], plan_summary["skipped"], filtered_faces
+            )
+
+            # --- 2. Execute the plan: each face is downloaded, cropped and saved on the face pool.
+            # People and faces are read back from the plan in batches, and at most twice the
+            # pool size of faces is queued, so memory doesn't grow with the library.
+            # Every Immich request additionally goes through the shared client's in-flight cap.
+            progress = SyncProgress(status_manager)
+            progress.add_to_total(plan_summary["faces_to_fetch"] + plan_summary["skipped"])
+            status_manager.update_status("Sync in progress...")
+            execute_started = time.monotonic()
+            face_pool = ThreadPoolExecutor(max_workers=max(1, Config.SYNC_FACE_WORKERS), thread_name_prefix="sync-face")
+            # Bound the number of queued face tasks so memory does not grow with library size.
+            face_slots = threading.BoundedSemaphore(max(1, Config.SYNC_FACE_WORKERS) * 2)
+            try:
+                for entry in plan.people() if stop_reason is None else []:
+                    if entry["action"] != "sync":
                         continue
+                    # Cancellation and preemption stop the job before its next person or face.
+                    stop_reason = job.stop_reason() if job is not None else None
+                    if stop_reason is not None:
+                        break
+
+                    person_id, person_name, pending_faces = entry["id"], entry["name"], entry["fetch"]
+                    for _ in range(entry["skipped"]):
+                        progress.record(person_name, 'skipped')
+                    hash_index = PersonHashIndex.for_person(state_manager, person_id, Config.FACE_DEDUP_MAX_DISTANCE) if entry["dedup"] else None
+
+                    completion = None
+                    if entry["fingerprint"] is not None or job is not None:
+                        completion = PersonCompletion(state_manager, person_id, pending_faces, fingerprint=entry["fingerprint"], job=job)
+
+                    for queued, face in enumerate(plan.faces(entry["seq"])):
+                        if job is not None:
+                            stop_reason = job.stop_reason()
+                            if stop_reason is not None:
+                                # The person isn't checkpointed, so a resumed job redoes them.
+                                completion.face_done('cancelled', pending_faces - queued)
+                                break
+                        face_slots.acquire()
+                        SYNC_QUEUE_DEPTH.inc()
+                        face_future = face_pool.submit(process_face, face, person_id, person_name, state_manager, status_manager, progress, hash_index)
+                        face_future.add_done_callback(lambda _: (SYNC_QUEUE_DEPTH.dec(), face_slots.release()))
+                        if completion is not None:
+                            face_future.add_done_callback(lambda f, c=completion: c.face_done('cancelled' if f.cancelled() else f.result()))
+                    if stop_reason is not None:
+                        break
 
-                    try:
-                        # --- 3. Download, crop, and save to Frigate faces directory ---
-                        status_manager.add_log(f"DEBUG: Processing face {face_id} for {person_name}.")
-                        # The thumbnail URL for a specific face is directly from the /api/faces/{id}/thumbnail endpoint
-                        thumbnail_url = f"{Config.IMMICH_API_URL}/api/faces/{face_id}/thumbnail"
-                        
-                        # Download image
-                        img_response = requests.get(thumbnail_url, headers=headers, stream=True)
-                        img_response.raise_for_status()
-                        image = Image.open(BytesIO(img_response.content))
-
-                        # Crop image using bounding box from the face object
-                        box = (face['boundingBox']['x1'], face['boundingBox']['y1'], face['boundingBox']['x2'], face['boundingBox']['y2'])
-                        cropped_image = image.crop(box)
-                        
-                        # Save to Frigate faces directory
-                        person_dir = os.path.join(Config.FRIGATE_FACES_DIR, person_name)
-                        if not os.path.exists(person_dir):
-                            os.makedirs(person_dir)
-                        
-                        output_path = os.path.join(person_dir, f"{face_id}.jpg")
-                        cropped_image.save(output_path, "JPEG")
-                        
-                        status_manager.add_log(f"INFO: Successfully saved face {face_id} for {person_name} to {output_path}.")
-                        state_manager.add_synced_face(face_id)
-                        trained_count += 1
-
-                    except requests.exceptions.RequestException as re:
-                        failed_count += 1
-                        status_manager.add_log(f"ERROR: Network error while processing face {face_id} for {person_name}: {re}")
-                    except Exception as inner_e:
-                        failed_count += 1
-                        status_manager.add_log(f"ERROR: Failed to process face {face_id} for {person_name}: {inner_e}")
-                    finally:
-                        # Cleanup temp file if it was created
-                        if temp_path and os.path.exists(temp_path):
-                            os.remove(temp_path)
-                    
-                    person_faces_processed += 1
-                    total_faces_processed_overall += 1
-                    status_manager.update_progress(person_name, person_faces_processed, len(faces_to_process))
-                    mqtt_client.publish_sync_progress(status_manager.get_status())
+                # Drain the in-flight faces; process_face handles and counts its own errors.
+                # A stopped job drops the faces that haven't started yet.
+                face_pool.shutdown(wait=True, cancel_futures=stop_reason is not None)
+            except Exception:
+                face_pool.shutdown(wait=True, cancel_futures=True)
+                raise
+            progress.flush()
+            with SYNC_STAGES["state_persist"].time():
+                state_manager.flush()
 
+            # Per-face averages for the estimates of later sync plans.
+            processed = progress.trained + progress.failed + progress.deduplicated
+            state_manager.record_sync_stats({
+                "thumbnail_bytes": (progress.downloaded_bytes, progress.downloads),
+                "face_bytes": (progress.written_bytes, progress.writes),
+                "face_seconds": (time.monotonic() - execute_started, processed),
+                "list_seconds": (plan.list_seconds, plan.listed_people),
+            })
+
+            trained_count = progress.trained
+            skipped_count = progress.skipped
+            failed_count = progress.failed
+            deduplicated_count = progress.deduplicated
+
+            if delta:
+                status_manager.log("INFO", "Delta sync skipped %s unchanged people.", unchanged_people)
+
+            # --- 3. Reconcile deletions, reassignments and renames ---
+            # A stopped job hasn't seen every person yet, so it can't tell what was removed.
+            reconcile_summary = None
+            if desired_faces is not None and stop_reason is None:
+                status_manager.update_status("Reconciling Frigate faces directory...")
+                reconcile_summary = reconcile(state_manager, desired_faces, dry_run=Config.RECONCILE_DRY_RUN, logger=status_manager.add_log)["summary"]
+
+            if stop_reason == "cancelled":
+                status = "Cancelled"
+            elif stop_reason == "preempted":
+                status = "Paused"
+            else:
+                status = "Success" if failed_count == 0 else "Partial Failure"
             summary = {
-                "message": f"Sync complete! Trained: {trained_count}, Skipped: {skipped_count}, Failed: {failed_count}.",
+                "message": summary_message(status, trained_count, skipped_count, failed_count, deduplicated_count),
                 "trained": trained_count,
                 "skipped": skipped_count,
                 "failed": failed_count,
-                "status": "Success" if failed_count == 0 else "Partial Failure"
+                "deduplicated": deduplicated_count,
+                "filtered": filtered_faces,
+                "unchanged_people": unchanged_people,
+                "reconcile": reconcile_summary,
+                "status": status
             }
+            if job is not None:
+                summary["job_id"] = job.job_id
+                summary["resumed_people"] = resumed_people
             status_manager.end_sync(summary)
             mqtt_client.publish_sync_summary(summary)
             mqtt_client.publish_status("idle")
 
             # --- Trigger Frigate Restart if configured ---
-            if Config.FRIGATE_API_URL:
-                status_manager.add_log("INFO: Triggering Frigate restart to load new faces...")
-                try:
-                    frigate_restart_url = f"{Config.FRIGATE_API_URL}/api/restart"
-                    restart_response = requests.post(frigate_restart_url)
-                    restart_response.raise_for_status()
-                    status_manager.add_log("INFO: Frigate restart command sent successfully.")
-                except requests.exceptions.RequestException as re:
-                    status_manager.add_log(f"ERROR: Failed to trigger Frigate restart: {re}")
-                except Exception as e:
-                    status_manager.add_log(f"ERROR: An unexpected error occurred during Frigate restart: {e}")
+            # Only the faces directory needs a restart, and only when something in it changed.
+            # The restart is debounced so back-to-back syncs share one.
+            if Config.FRIGATE_API_URL and Config.FRIGATE_DELIVERY == "files":
+                faces_changed = trained_count > 0 or (
+                    reconcile_summary is not None and any(reconcile_summary[key] for key in ("renamed_dirs", "moved", "removed"))
+                )
+                if faces_changed:
+                    frigate_restarter.request(status_manager.add_log)
+                else:
+                    status_manager.log("INFO", "No faces changed; Frigate restart not needed.")
 
         except requests.exceptions.RequestException as e:
             error_message = f"Sync Failed: Could not connect to Immich. Please check URL and API key. Details: {e}"
-            status_manager.add_log(f"ERROR: {error_message}")
+            status_manager.log("ERROR", error_message)
             summary = {"message": error_message, "status": "Failure"}
             status_manager.end_sync(summary)
             mqtt_client.publish_sync_summary(summary)
             mqtt_client.publish_status("error")
         except Exception as e:
             error_message = f"An unexpected error occurred: {e}"
-            status_manager.add_log(f"CRITICAL: {error_message}")
+            status_manager.log("CRITICAL", error_message)
             summary = {"message": error_message, "status": "Failure"}
             status_manager.end_sync(summary)
             mqtt_client.publish_sync_summary(summary)
-            mqtt_client.publish_status("error")
\ No newline at end of file
+            mqtt_client.publish_status("error")
+        finally:
+            SYNC_RUNNING.set(0)
+            if plan is not None:
+                plan.close()
+            state_manager.close()
+        return summary
@@ -0,0 +1,628 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+from .http_client import immich_client
+from .people_cache import people_cache, iter_people, person_asset_count
+from .face_ranking import metadata_score
+from .frigate_delivery import frigate_output_path
+from .metrics import SYNC_STAGES
+
+# Used for an estimate until a sync has recorded real averages (see StateManager.record_sync_stats).
+DEFAULT_AVERAGES = {
+    "thumbnail_bytes": 25000, # Immich face thumbnail download
+    "face_bytes": 15000, # Cropped face written to Frigate
+    "face_seconds": 0.05, # Sync wall time per processed face, at the configured concurrency
+    "list_seconds": 0.1, # Planning wall time per person whose faces are listed
+}
+
+PLAN_SCHEMA = """
+CREATE TABLE plan_people (
+    seq INTEGER PRIMARY KEY,
+    person_id TEXT,
+    name TEXT,
+    action TEXT,
+    listed INTEGER DEFAULT 0,
+    curated INTEGER DEFAULT 0,
+    filtered INTEGER DEFAULT 0,
+    skipped INTEGER DEFAULT 0,
+    fetch INTEGER DEFAULT 0,
+    dedup INTEGER DEFAULT 0,
+    face_count INTEGER,
+    face_ids_hash TEXT,
+    updated_at TEXT,
+    asset_count INTEGER
+);
+CREATE TABLE plan_candidates (
+    person_seq INTEGER,
+    position INTEGER,
+    face_id TEXT,
+    asset_key TEXT,
+    score REAL,
+    face TEXT,
+    PRIMARY KEY (person_seq, position)
+);
+CREATE TABLE plan_faces (
+    person_seq INTEGER,
+    rank INTEGER,
+    face_id TEXT,
+    face TEXT,
+    PRIMARY KEY (person_seq, rank)
+);
+CREATE TABLE plan_desired (
+    face_id TEXT PRIMARY KEY,
+    person_name TEXT
+);
+"""
+
+PERSON_COLUMNS = ("seq", "person_id", "name", "action", "listed", "curated", "filtered", "skipped", "fetch", "dedup", "face_count", "face_ids_hash", "updated_at", "asset_count")
+BATCH_SIZE = 500 # Rows written to or read from the plan at a time
+FINGERPRINT_MODULUS = 2 ** 160
+
+
+def face_id_digest(face_id):
+    """A face ID's share of the face ID set fingerprint; the shares are summed, so the order faces arrive in doesn't matter."""
+    return int.from_bytes(hashlib.sha1(face_id.encode()).digest(), "big")
+
+
+def is_person_unchanged(fingerprint, person, asset_count):
+    """
+    Delta sync: decides from the /api/people entry and the person's asset count whether a person
+    can be skipped without listing their faces. Immich doesn't bump updatedAt when faces are added
+    to a person or reassigned to them, so a person is unchanged only when both their updatedAt and
+    their asset count (see people_cache.person_asset_count) match the last complete sync, as long
+    as that sync isn't older than DELTA_SYNC_FULL_RECHECK_HOURS.
+    """
+    if fingerprint is None or not person.get('updatedAt') or fingerprint['updated_at'] != person['updatedAt']:
+        return False
+    if asset_count is None or fingerprint['asset_count'] != asset_count:
+        return False
+    max_age = Config.DELTA_SYNC_FULL_RECHECK_HOURS * 3600
+    return max_age <= 0 or (fingerprint['checked_at'] or 0) >= time.time() - max_age
+
+
+def face_output_path(person_name, face_id):
+    """Where a face will be written: a file in FRIGATE_FACES_DIR, or the person's face library with FRIGATE_DELIVERY=api."""
+    if Config.FRIGATE_DELIVERY == "api":
+        return frigate_output_path(person_name, None) # Frigate picks the file ID on registration
+    return os.path.join(Config.FRIGATE_FACES_DIR, person_name, f"{face_id}.jpg")
+
+
+class SpooledFaceMap:
+    """Read-only face_id -> person_name mapping backed by a plan, for reconcile's desired face set."""
+
+    def __init__(self, plan):
+        self._plan = plan
+
+    def get(self, face_id, default=None):
+        rows = self._plan._query("SELECT person_name FROM plan_desired WHERE face_id = ?", (face_id,))
+        return rows[0][0] if rows else default
+
+    def __contains__(self, face_id):
+        return bool(self._plan._query("SELECT 1 FROM plan_desired WHERE face_id = ?", (face_id,)))
+
+    def __len__(self):
+        return self._plan._query("SELECT COUNT(*) FROM plan_desired")[0][0]
+
+
+class SyncPlan:
+    """
+    A sync plan: the people a sync covers, what it does with each, and the faces it will fetch.
+
+    The plan is spooled to a private temporary SQLite database, which SQLite deletes when the plan
+    is closed, instead of being held in memory. Planning streams each person's face list into it,
+    ranks and filters the faces there, and executing the plan reads it back in batches, so memory
+    stays flat however large the library or a single person is. For full syncs the plan also
+    records every listed face as the desired set for reconcile.
+    """
+
+    def __init__(self, delta=False, record_desired=False):
+        self.delta = delta
+        self.stop_reason = None
+        self.listed_people = 0
+        self.list_seconds = 0.0
+        self.legacy_faces = [] # (person_id, person_name, face IDs) for faces from the legacy JSON state, see StateManager.adopt_legacy_faces
+        self._lock = threading.Lock()
+        # An empty file name gives a private on-disk database that only spills to disk once it outgrows SQLite's page cache.
+        self._conn = sqlite3.connect("", check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.executescript(PLAN_SCHEMA)
+        self._desired = SpooledFaceMap(self) if record_desired else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def _write_many(self, sql, rows):
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(sql, rows)
+
+    @property
+    def desired(self):
+        """face_id -> person_name for every face assigned in Immich, or None if this plan can't tell (not a full sync, or stopped early)."""
+        return self._desired if self.stop_reason is None else None
+
+    @property
+    def records_desired(self):
+        return self._desired is not None
+
+    def add_person(self, seq, person_id, name, action, fingerprint=None, **counts):
+        face_count, face_ids_hash, updated_at, asset_count = fingerprint or (None, None, None, None)
+        values = dict(
+            counts, seq=seq, person_id=person_id, name=name, action=action,
+            face_count=face_count, face_ids_hash=face_ids_hash, updated_at=updated_at, asset_count=asset_count
+        )
+        columns = [column for column in PERSON_COLUMNS if column in values]
+        self._write(
+            f"INSERT INTO plan_people ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [values[column] for column in columns]
+        )
+
+    def add_legacy_faces(self, person_id, name, face_ids):
+        if face_ids:
+            with self._lock:
+                self.legacy_faces.append((person_id, name, face_ids))
+
+    def add_desired(self, pairs):
+        self._write_many("INSERT OR REPLACE INTO plan_desired (face_id, person_name) VALUES (?, ?)", pairs)
+
+    def add_candidates(self, rows):
+        """Adds (person_seq, position, face_id, asset_key, score, face JSON) rows for a person's selection."""
+        self._write_many("INSERT OR REPLACE INTO plan_candidates (person_seq, position, face_id, asset_key, score, face) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def reset_person(self, seq):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM plan_candidates WHERE person_seq = ?", (seq,))
+            self._conn.execute("DELETE FROM plan_faces WHERE person_seq = ?", (seq,))
+
+    def select_faces(self, seq, limit=None, ranked=False):
+        """
+        Moves a person's best candidates into the plan, best first, and drops the rest.
+
+        Ranked selection takes faces by their face_ranking.metadata_score, one face per asset first,
+        then second faces from the same assets if the budget isn't spent; ties keep Immich's order.
+        Otherwise faces keep Immich's order.
+        """
+        if ranked:
+            order = "asset_rank > 1, score DESC, position"
+            source = (
+                "(SELECT face_id, face, score, position, "
+                "ROW_NUMBER() OVER (PARTITION BY asset_key ORDER BY score DESC, position) AS asset_rank "
+                "FROM plan_candidates WHERE person_seq = ?)"
+            )
+        else:
+            order = "position"
+            source = "(SELECT face_id, face, position FROM plan_candidates WHERE person_seq = ?)"
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO plan_faces (person_seq, rank, face_id, face) "
+                f"SELECT ?, ROW_NUMBER() OVER (ORDER BY {order}), face_id, face FROM {source} ORDER BY {order} LIMIT ?",
+                (seq, seq, -1 if limit is None else limit)
+            )
+            self._conn.execute("DELETE FROM plan_candidates WHERE person_seq = ?", (seq,))
+
+    def filter_faces(self, seq, decide):
+        """
+        Applies the skip-state to a person's selected faces.
+
+        Args:
+            decide (callable): face_id -> "fetch", "skipped" or None (dropped without being counted).
+
+        Returns:
+            tuple: (faces to fetch, faces skipped).
+        """
+        fetch = skipped = 0
+        last_rank = 0
+        while True:
+            rows = self._query(
+                "SELECT rank, face_id FROM plan_faces WHERE person_seq = ? AND rank > ? ORDER BY rank LIMIT ?",
+                (seq, last_rank, BATCH_SIZE)
+            )
+            if not rows:
+                return fetch, skipped
+            removed = []
+            for rank, face_id in rows:
+                decision = decide(face_id)
+                if decision == "fetch":
+                    fetch += 1
+                    continue
+                skipped += decision == "skipped"
+                removed.append((seq, rank))
+            self._write_many("DELETE FROM plan_faces WHERE person_seq = ? AND rank = ?", removed)
+            last_rank = rows[-1][0]
+
+    def people(self):
+        """Yields the plan's people in order, as dicts with "action", the counts and, for "sync", the fingerprint."""
+        last_seq = -1
+        while True:
+            rows = self._query(
+                f"SELECT {', '.join(PERSON_COLUMNS)} FROM plan_people WHERE seq > ? ORDER BY seq LIMIT ?",
+                (last_seq, BATCH_SIZE)
+            )
+            if not rows:
+                return
+            for row in rows:
+                entry = dict(zip(PERSON_COLUMNS, row))
+                entry["id"] = entry.pop("person_id")
+                entry["curated"] = bool(entry["curated"])
+                entry["dedup"] = bool(entry["dedup"])
+                fingerprint = tuple(entry.pop(column) for column in ("face_count", "face_ids_hash", "updated_at", "asset_count"))
+                entry["fingerprint"] = fingerprint if fingerprint[1] is not None else None
+                yield entry
+            last_seq = rows[-1][0]
+
+    def faces(self, seq):
+        """Yields the faces to fetch for one person, best first."""
+        last_rank = 0
+        while True:
+            rows = self._query(
+                "SELECT rank, face FROM plan_faces WHERE person_seq = ? AND rank > ? ORDER BY rank LIMIT ?",
+                (seq, last_rank, BATCH_SIZE)
+            )
+            if not rows:
+                return
+            for _, face in rows:
+                yield json.loads(face)
+            last_rank = rows[-1][0]
+
+    def summary(self):
+        row = self._query(
+            "SELECT COUNT(*), TOTAL(action = 'sync'), TOTAL(action = 'unchanged'), TOTAL(action = 'resumed'), "
+            "TOTAL(listed), TOTAL(fetch), TOTAL(skipped), TOTAL(filtered), TOTAL(action != 'resumed' AND NOT curated) FROM plan_people"
+        )[0]
+        counts = [int(value) for value in row]
+        summary = dict(zip(
+            ("people", "listed_people", "unchanged_people", "resumed_people", "faces_listed", "faces_to_fetch", "skipped", "filtered"),
+            counts
+        ))
+        summary["checked_people"] = counts[-1] if self.delta else 0 # People whose asset count delta sync looked up
+        return summary
+
+
+def plan_person(plan, state_manager, seq, person_id, person_name, curated_face_ids=None, delta=False, updated_at=None, asset_count=None):
+    """
+    Streams one person's face list into the plan and resolves it into the faces to fetch.
+
+    Faces are scored and filtered as they are parsed, so only the faces that pass are written to
+    the plan and never more than one batch is in memory. Selection and the skip-state are then
+    applied inside the plan.
+
+    Returns:
+        dict: The person's counts and delta-sync fingerprint, for SyncPlan.add_person.
+    """
+    curated = set(curated_face_ids) if curated_face_ids else None
+    ranked = curated is None and Config.FACE_RANKING
+    budget = None if curated is not None else Config.MAX_FACES_PER_PERSON
+
+    def read(faces):
+        plan.reset_person(seq) # A retried request starts the person over
+        listed = filtered = 0
+        ids_hash = 0
+        candidates = []
+        desired = []
+        legacy = []
+        for position, face in enumerate(faces):
+            face_id = face['id']
+            listed += 1
+            ids_hash = (ids_hash + face_id_digest(face_id)) % FINGERPRINT_MODULUS
+            if face_id in state_manager.legacy_face_ids:
+                legacy.append(face_id)
+            if plan.records_desired:
+                desired.append((face_id, person_name))
+            if curated is not None:
+                if face_id not in curated:
+                    continue
+                score = 0.0
+            elif ranked:
+                # Faces too small to be useful or implausibly shaped are never downloaded.
+                score = metadata_score(face, Config.FACE_MIN_SIZE)
+                if score is None:
+                    filtered += 1
+                    continue
+            elif position >= budget:
+                continue
+            else:
+                score = 0.0
+            asset_id = face.get('assetId')
+            # Faces without an asset never count as a second face of one photo.
+            asset_key = asset_id if asset_id is not None else "\0" + face_id
+            candidates.append((seq, position, face_id, asset_key, score, json.dumps(face)))
+            if len(candidates) >= BATCH_SIZE:
+                plan.add_candidates(candidates)
+                candidates = []
+            if len(desired) >= BATCH_SIZE:
+                plan.add_desired(desired)
+                desired = []
+        plan.add_candidates(candidates)
+        plan.add_desired(desired)
+        return listed, filtered, f"{ids_hash:040x}", legacy
+
+    with SYNC_STAGES["immich_list"].time():
+        listed, filtered, face_ids_hash, legacy = immich_client.get_json_stream(f"/api/people/{person_id}/faces", read)
+    plan.add_legacy_faces(person_id, person_name, legacy)
+    plan.select_faces(seq, budget, ranked)
+
+    fingerprint = None
+    unchanged_faces = False
+    if delta and curated is None:
+        previous = state_manager.get_person_fingerprint(person_id)
+        unchanged_faces = previous is not None and previous['face_ids_hash'] == face_ids_hash
+        fingerprint = (listed, face_ids_hash, updated_at, asset_count)
+
+    def decide(face_id):
+        synced = state_manager.is_synced(face_id)
+        if fingerprint is not None and (unchanged_faces or synced):
+            return None # Only faces that aren't synced yet are worth touching for a changed person.
+        if synced and Config.SKIP_EXISTING_FACES:
+            return "skipped"
+        return "fetch"
+
+    fetch, skipped = plan.filter_faces(seq, decide)
+    return {
+        "listed": listed,
+        "curated": curated is not None,
+        "filtered": filtered,
+        "skipped": skipped,
+        "fetch": fetch,
+        # Curated selections are the user's choice; only non-curated syncs drop near-duplicates.
+        "dedup": Config.FACE_DEDUP and curated is None and fetch > 0,
+        "fingerprint": fingerprint, # (face_count, face_ids_hash, updated_at, asset_count), stored once the person completes
+    }
+
+
+def legacy_faces_on_disk(state_manager, person_name):
+    """
+    Face IDs from the legacy JSON state whose file is in a person's directory of FRIGATE_FACES_DIR.
+
+    Legacy faces don't record their person, so for a person whose faces aren't listed this sync
+    the directory is the only record of which faces are theirs.
+    """
+    if not state_manager.legacy_face_ids or Config.FRIGATE_DELIVERY == "api":
+        return []
+    try:
+        with os.scandir(os.path.join(Config.FRIGATE_FACES_DIR, person_name)) as entries:
+            face_ids = [entry.name[:-len(".jpg")] for entry in entries if entry.name.endswith(".jpg")]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    return [face_id for face_id in face_ids if face_id in state_manager.legacy_face_ids]
+
+
+def iter_sync_people(selected_people_data):
+    """Yields (person, curated face IDs) for every person a sync covers; the person is {} when Immich doesn't know them."""
+    if selected_people_data is not None:
+        # Manual sync with a selection: [{id: "person_id", faces: ["face_id_1", ...]}]; no faces means non-curated.
+        people = people_cache.snapshot(max_age=0)
+        for entry in selected_people_data:
+            yield people.get(entry['id']) or {'id': entry['id']}, entry.get('faces')
+    else:
+        # The whole library is paged through rather than loaded as one list.
+        for person in iter_people(immich_client, Config.PEOPLE_PAGE_SIZE):
+            yield person, None
+
+
+def build_sync_plan(state_manager, selected_people_data=None, delta=False, job=None, logger=None, deadline=None, record_desired=None):
+    """
+    Resolves people, face lists, skip-state and selection rules into a SyncPlan.
+
+    Every face list the sync needs is streamed into the plan here, SYNC_PERSON_WORKERS people at a
+    time with at most twice that many queued, so executing the plan only downloads and writes
+    faces. Planning writes nothing outside the plan, which makes it safe to run as a dry run.
+
+    Args:
+        state_manager (StateManager): The sync state store.
+        selected_people_data (list): Manual selection ([{id, faces}]) or None for every person.
+        delta (bool): Skip people unchanged since their last complete sync, and synced faces of changed ones.
+        job (SyncJob): When planning for a queued job, its finished people are skipped and listing
+            stops early if the job is cancelled or preempted.
+        logger (callable): Optional log function taking (level, message, *args), e.g. status_manager.log.
+        deadline (float): time.monotonic() after which no more people are listed; the plan's
+            stop_reason is then "timeout". For dry runs, which plan inside an HTTP request.
+        record_desired (bool): Record the desired face set for reconcile. Defaults to RECONCILE_ON_SYNC;
+            only full syncs can record it.
+
+    Returns:
+        SyncPlan: The plan; the caller closes it. Each person has an "action": "sync", "unchanged" or "resumed".
+    """
+    log = logger or (lambda *args: None)
+    # Full syncs see every person's faces, so they can also reconcile what was removed or reassigned.
+    if record_desired is None:
+        record_desired = Config.RECONCILE_ON_SYNC
+    plan = SyncPlan(delta=delta, record_desired=selected_people_data is None and record_desired)
+    started = time.monotonic()
+    pending = deque()
+    max_pending = max(1, Config.SYNC_PERSON_WORKERS) * 2
+
+    def plan_or_skip(seq, person, person_id, person_name, curated_face_ids):
+        # Runs on the planning pool, so a delta sync's statistics calls overlap like the face lists do.
+        asset_count = None
+        if delta and not curated_face_ids:
+            asset_count = person_asset_count(immich_client, person_id)
+            if is_person_unchanged(state_manager.get_person_fingerprint(person_id), person, asset_count):
+                return None
+        return plan_person(plan, state_manager, seq, person_id, person_name, curated_face_ids, delta, person.get('updatedAt'), asset_count)
+
+    def add_unlisted(seq, person_id, person_name, action):
+        legacy = legacy_faces_on_disk(state_manager, person_name)
+        plan.add_legacy_faces(person_id, person_name, legacy)
+        if plan.records_desired:
+            # What we synced last time is still what they have.
+            plan.add_desired([(record['face_id'], person_name) for record in state_manager.faces_for_person(person_id)])
+            plan.add_desired([(face_id, person_name) for face_id in legacy])
+        plan.add_person(seq, person_id, person_name, action)
+
+    def stop_reason():
+        reason = job.stop_reason() if job is not None else None
+        if reason is None and deadline is not None and time.monotonic() >= deadline:
+            reason = "timeout"
+        return reason
+
+    def finish_oldest():
+        future, seq, person_id, person_name = pending.popleft()
+        result = future.result()
+        if result is None:
+            # Delta sync never lists faces of people that haven't changed since their last complete sync.
+            add_unlisted(seq, person_id, person_name, "unchanged")
+            return
+        plan.add_person(seq, person_id, person_name, "sync", **result)
+        plan.listed_people += 1
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, Config.SYNC_PERSON_WORKERS), thread_name_prefix="sync-plan") as pool:
+            try:
+                for seq, (person, curated_face_ids) in enumerate(iter_sync_people(selected_people_data)):
+                    # Cancellation, preemption and the deadline stop planning before it lists any more people.
+                    plan.stop_reason = stop_reason()
+                    if plan.stop_reason is not None:
+                        break
+                    person_id = person['id']
+                    person_name = person.get('name', 'Unknown')
+                    if not person_name:
+                        log("WARN", "Skipping person with no name (ID: %s).", person_id)
+                        continue
+                    if job is not None and person_id in job.done_people:
+                        # Finished by an earlier run of this job that was interrupted or preempted.
+                        add_unlisted(seq, person_id, person_name, "resumed")
+                        continue
+                    future = pool.submit(plan_or_skip, seq, person, person_id, person_name, curated_face_ids)
+                    pending.append((future, seq, person_id, person_name))
+                    while len(pending) >= max_pending:
+                        finish_oldest()
+
+                while pending and plan.stop_reason is None:
+                    plan.stop_reason = stop_reason()
+                    if plan.stop_reason is None:
+                        finish_oldest()
+            finally:
+                for future, *_ in pending:
+                    future.cancel() # Don't list more people once listing failed or the job stopped
+    except BaseException:
+        plan.close()
+        raise
+    plan.list_seconds = time.monotonic() - started
+    return plan
+
+
+def reconcile_request_count(reconcile_plan):
+    """Frigate requests needed to apply a reconcile plan: one face library delete per batch and person in api mode."""
+    if reconcile_plan is None or Config.FRIGATE_DELIVERY != "api":
+        return 0
+    per_person = {}
+    for removal in reconcile_plan["remove"]:
+        if removal.get("frigate_id") is not None:
+            per_person[removal["person_name"]] = per_person.get(removal["person_name"], 0) + 1
+    batch_size = max(1, Config.FRIGATE_DELETE_BATCH_SIZE)
+    return sum(math.ceil(count / batch_size) for count in per_person.values())
+
+
+def estimate_sync_cost(summary, averages, reconcile_plan=None):
+    """
+    Estimates the requests, bytes and time a plan will cost.
+
+    Request counts are exact apart from retries and people-list pages. Bytes and time use the
+    per-face averages recorded by earlier syncs, falling back to DEFAULT_AVERAGES; near-duplicate
+    suppression may write fewer faces than planned, but each of them is still downloaded.
+
+    Args:
+        summary (dict): SyncPlan.summary().
+        averages (dict): name -> {"value": float, "samples": int}, from StateManager.sync_stats().
+    """
+    values = {name: averages.get(name, {}).get("value", default) for name, default in DEFAULT_AVERAGES.items()}
+    faces = summary["faces_to_fetch"]
+    frigate_requests = reconcile_request_count(reconcile_plan)
+    if Config.FRIGATE_DELIVERY == "api":
+        frigate_requests += faces # One face library upload per face
+    elif Config.FRIGATE_API_URL:
+        frigate_requests += 1 # The restart, if anything changes
+    seconds = summary["listed_people"] * values["list_seconds"] + faces * values["face_seconds"]
+    return {
+        # /api/people, one statistics call per checked person, one face list per listed person, one thumbnail per face
+        "immich_requests": 1 + summary.get("checked_people", 0) + summary["listed_people"] + faces,
+        "frigate_requests": frigate_requests,
+        "download_bytes": round(faces * values["thumbnail_bytes"]),
+        "write_bytes": round(faces * values["face_bytes"]),
+        "seconds": round(seconds, 1),
+        "averages": {
+            name: {"value": values[name], "samples": averages.get(name, {}).get("samples", 0)}
+            for name in DEFAULT_AVERAGES
+        },
+    }
+
+
+def plan_report(plan, averages, reconcile_report=None, max_items=1000):
+    """
+    Turns a plan into the JSON returned by POST /api/sync/plan.
+
+    Lists the people, the faces to fetch with the file each will be written to, and the files
+    reconcile would rename, move or delete, capped at max_items each. A plan stopped early (see
+    build_sync_plan's deadline) is reported with "complete": false and covers the people listed
+    so far. reconcile_report is {"summary", "plan"}, or {"skipped": reason}.
+    """
+    reconcile_report = reconcile_report or {}
+    reconcile_plan = reconcile_report.get("plan")
+    # Only counted in the estimate when a sync would apply it.
+    applied_reconcile = reconcile_plan if Config.RECONCILE_ON_SYNC and not Config.RECONCILE_DRY_RUN else None
+    people = []
+    writes = []
+    people_truncated = writes_truncated = False
+    for entry in plan.people():
+        if len(people) < max_items:
+            person = {"id": entry["id"], "name": entry["name"], "action": entry["action"]}
+            if entry["action"] == "sync":
+                person.update(listed=entry["listed"], fetch=entry["fetch"], skipped=entry["skipped"], filtered=entry["filtered"], curated=entry["curated"])
+            people.append(person)
+        else:
+            people_truncated = True
+        if entry["action"] != "sync" or not entry["fetch"] or writes_truncated:
+            continue
+        if len(writes) + entry["fetch"] > max_items:
+            writes_truncated = True
+        for face in plan.faces(entry["seq"]):
+            if len(writes) >= max_items:
+                break
+            writes.append({"face_id": face['id'], "person_id": entry["id"], "person_name": entry["name"], "path": face_output_path(entry["name"], face['id'])})
+    changes = []
+    if reconcile_plan is not None:
+        changes = (
+            [dict(rename, action="rename_dir") for rename in reconcile_plan["rename_dirs"]]
+            + [dict(move, action="move") for move in reconcile_plan["move"]]
+            + [dict(removal, action="remove") for removal in reconcile_plan["remove"]]
+        )
+    summary = plan.summary()
+    return {
+        "dry_run": True,
+        "complete": plan.stop_reason is None,
+        "stop_reason": plan.stop_reason,
+        "summary": summary,
+        "estimate": estimate_sync_cost(summary, averages, applied_reconcile),
+        "reconcile": reconcile_report.get("summary"),
+        "reconcile_skipped": reconcile_report.get("skipped"),
+        "reconcile_on_sync": Config.RECONCILE_ON_SYNC,
+        "reconcile_dry_run": Config.RECONCILE_DRY_RUN,
+        "people": people,
+        "people_truncated": people_truncated,
+        "writes": writes,
+        "writes_truncated": writes_truncated,
+        "file_changes": changes[:max_items],
+        "file_changes_truncated": len(changes) > max_items,
+    }
@@ -0,0 +1,263 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future
+from .config import Config
+from .http_client import immich_client
+from .image_pipeline import crop_face, atomic_write
+
+# Downscaled variants are rounded up to a multiple of this, so arbitrary ?size= values can't
+# fill the cache with near-identical files.
+VARIANT_STEP = 32
+MAX_VARIANT_SIZE = 1024
+
+# Immich IDs are UUIDs; anything else is rejected before it gets near a file path.
+FACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9-]+$")
+
+
+def variant_size(size):
+    """Normalizes a requested thumbnail size; 0 means the original Immich thumbnail."""
+    if not size or size <= 0:
+        return 0
+    size = min(size, MAX_VARIANT_SIZE)
+    return -(-size // VARIANT_STEP) * VARIANT_STEP
+
+
+def thumbnail_etag(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    face_id TEXT,
+    size INTEGER,
+    bytes INTEGER,
+    last_access REAL,
+    PRIMARY KEY (face_id, size)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER
+);
+INSERT OR IGNORE INTO totals (id, bytes) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_added AFTER INSERT ON entries BEGIN
+    UPDATE totals SET bytes = bytes + NEW.bytes WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_removed AFTER DELETE ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.bytes WHERE id = 0;
+END;
+"""
+INDEX_VERSION = 1
+ACCESS_RESOLUTION = 60.0 # Seconds; a hit only rewrites its access time when it is older than this
+EVICT_BATCH = 100
+
+
+class ThumbnailCache:
+    """
+    Size-bounded, on-disk LRU cache of Immich face thumbnails for the curation UI.
+
+    Originals are stored as <cache_dir>/<face_id[:2]>/<face_id>.jpg and downscaled variants as
+    <face_id>_<size>.jpg next to them. The LRU order and byte total live in a SQLite index
+    (<cache_dir>/index.db) shared by every process, so thumbnails the sync worker stores are hits
+    for the gunicorn workers, and THUMBNAIL_CACHE_MAX_MB caps the directory as a whole. An index
+    created over an existing cache directory is filled from it (oldest mtime first) once.
+    Concurrent requests for the same thumbnail in one process are coalesced, so several tabs
+    opening the same person cause one upstream fetch.
+    """
+
+    def __init__(self, client, cache_dir, max_bytes, quality=85):
+        self.client = client
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, max_bytes)
+        self.quality = quality
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._in_flight = {} # (face_id, size) -> Future
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _connection(self):
+        # Caller holds self._lock. Connections aren't shared across forks, so each process opens its own.
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.cache_dir, "index.db"), check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._pid = os.getpid()
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                self._import_directory()
+        return self._conn
+
+    def _import_directory(self):
+        # Caller holds self._lock. Indexes files cached before the index existed.
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] == INDEX_VERSION:
+                return # Another process got here first
+            rows = []
+            for shard in os.scandir(self.cache_dir):
+                if not shard.is_dir(follow_symlinks=False):
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if not entry.name.endswith(".jpg") or not entry.is_file(follow_symlinks=False):
+                            continue
+                        face_id, _, size = entry.name[:-4].partition("_")
+                        stat = entry.stat(follow_symlinks=False)
+                        rows.append((face_id, int(size) if size.isdigit() else 0, stat.st_size, stat.st_mtime))
+            self._conn.executemany("INSERT OR IGNORE INTO entries (face_id, size, bytes, last_access) VALUES (?, ?, ?, ?)", rows)
+            self._conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        self._evict()
+
+    def _path(self, face_id, size):
+        name = f"{face_id}_{size}.jpg" if size else f"{face_id}.jpg"
+        return os.path.join(self.cache_dir, face_id[:2], name)
+
+    def _evict(self):
+        # Caller holds self._lock. Files are removed after the rows, so a reader never finds a row without a file for long.
+        evicted = []
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE") # One process evicts at a time, so no entry is counted twice
+            excess = self._conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0] - self.max_bytes
+            while excess > 0:
+                rows = self._conn.execute("SELECT face_id, size, bytes FROM entries ORDER BY last_access LIMIT ?", (EVICT_BATCH,)).fetchall()
+                if not rows:
+                    break
+                batch = []
+                for face_id, size, byte_size in rows:
+                    if excess <= 0:
+                        break
+                    batch.append((face_id, size))
+                    excess -= byte_size
+                self._conn.executemany("DELETE FROM entries WHERE face_id = ? AND size = ?", batch)
+                evicted.extend(batch)
+        for face_id, size in evicted:
+            self._remove_file(self._path(face_id, size))
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _store(self, face_id, size, data):
+        if not self.enabled or len(data) > self.max_bytes:
+            return
+        path = self._path(face_id, size)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, data)
+        except OSError:
+            return # The cache is best effort; a full or read-only disk must not fail the caller
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM entries WHERE face_id = ? AND size = ?", (face_id, size))
+                conn.execute("INSERT INTO entries (face_id, size, bytes, last_access) VALUES (?, ?, ?, ?)", (face_id, size, len(data), time.time()))
+            self._evict()
+
+    def _read(self, key):
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            with conn:
+                touched = conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE face_id = ? AND size = ? AND last_access < ?",
+                    (now, *key, now - ACCESS_RESOLUTION)
+                ).rowcount
+                if not touched and conn.execute("SELECT 1 FROM entries WHERE face_id = ? AND size = ?", key).fetchone() is None:
+                    return None
+        try:
+            with open(self._path(*key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Removed behind our back (or evicted by another process just now); treat as a miss.
+            with self._lock, self._connection():
+                if not os.path.exists(self._path(*key)): # Unless it was stored again meanwhile
+                    self._conn.execute("DELETE FROM entries WHERE face_id = ? AND size = ?", key)
+            return None
+
+    def put(self, face_id, data):
+        """
+        Stores an original thumbnail, e.g. one downloaded by run_sync.
+
+        Cached downscaled variants of the face are dropped, since they may have been made from an older image.
+        Write errors are ignored.
+        """
+        if not self.enabled or not FACE_ID_PATTERN.match(face_id):
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                stale = conn.execute("SELECT size FROM entries WHERE face_id = ? AND size > 0", (face_id,)).fetchall()
+                conn.execute("DELETE FROM entries WHERE face_id = ? AND size > 0", (face_id,))
+        for (size,) in stale:
+            self._remove_file(self._path(face_id, size))
+        self._store(face_id, 0, bytes(data))
+
+    def get(self, face_id, size=0):
+        """
+        Returns a face thumbnail, fetching it from Immich (or downscaling the original) on a miss.
+
+        Args:
+            face_id (str): The Immich face ID.
+            size (int): Longest side in pixels for a downscaled variant; 0 for the original.
+
+        Returns:
+            tuple: (JPEG bytes, ETag).
+
+        Raises:
+            ValueError: For a malformed face ID.
+            requests.exceptions.RequestException: When the upstream fetch fails.
+        """
+        if not FACE_ID_PATTERN.match(face_id):
+            raise ValueError(f"Invalid face ID: {face_id!r}")
+        key = (face_id, variant_size(size))
+        data = self._read(key)
+        if data is not None:
+            return data, thumbnail_etag(data)
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            # Another request may have filled the entry between our miss and taking ownership.
+            data = self._read(key)
+            if data is None:
+                if key[1]:
+                    original, _ = self.get(face_id, 0)
+                    data = crop_face(original, None, max_size=key[1], quality=self.quality)
+                else:
+                    data = bytes(self.client.get_bytes(f"/api/faces/{face_id}/thumbnail"))
+                self._store(face_id, key[1], data)
+            result = (data, thumbnail_etag(data))
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+
+thumbnail_cache = ThumbnailCache(
+    immich_client,
+    Config.THUMBNAIL_CACHE_DIR,
+    Config.THUMBNAIL_CACHE_MAX_MB * 1024 * 1024,
+    quality=Config.THUMBNAIL_CACHE_JPEG_QUALITY,
+)
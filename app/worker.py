@@ -0,0 +1,204 @@
+"""
+Sync worker: runs sync jobs, face analysis jobs, the sync schedule and the MQTT connection.
+
+Exactly one process holds this role, guarded by a lease in the status database. In the Docker
+image it is its own process (`python -m app.worker`, supervised by app/gunicorn_conf.py) next to
+the gunicorn HTTP workers, which only submit jobs and read status. With SYNC_WORKER=embedded,
+create_app starts it inside the web process instead, and the lease still ensures that only one
+gunicorn worker runs it.
+"""
+import os
+import sys
+import time
+import atexit
+import signal
+import socket
+import sqlite3
+import logging
+import threading
+from apscheduler.schedulers.background import BackgroundScheduler
+from .config import Config
+from .status_manager import status_manager
+from .mqtt_client import mqtt_client
+from .job_queue import job_queue
+from .analysis_jobs import analysis_queue
+from .frigate_delivery import frigate_restarter
+
+logger = logging.getLogger(__name__)
+
+LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT,
+    expires_at REAL
+);
+"""
+
+
+class WorkerLease:
+    """
+    A named lease in SQLite with an expiry the holder keeps renewing. If the holder dies or hangs,
+    another process takes over once the lease has expired.
+    """
+
+    def __init__(self, db_path, name, ttl_seconds=30):
+        self.db_path = db_path
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.expires_at = 0 # When the lease runs out unless renewed, as of the last successful acquire
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(LEASE_SCHEMA)
+        return self._conn
+
+    def acquire(self):
+        """Takes or renews the lease. Returns True while this process holds it."""
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR IGNORE INTO leases (name, owner, expires_at) VALUES (?, ?, 0)", (self.name, self.owner))
+            acquired = conn.execute(
+                "UPDATE leases SET owner = ?, expires_at = ? WHERE name = ? AND (owner = ? OR expires_at < ?)",
+                (self.owner, now + self.ttl_seconds, self.name, self.owner, now)
+            ).rowcount
+        self.expires_at = now + self.ttl_seconds if acquired == 1 else 0
+        return acquired == 1
+
+    def release(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, self.owner))
+
+
+def scheduled_sync_job(app):
+    app.logger.info("Attempting scheduled sync...")
+    # For scheduled syncs, we process all people (no specific person_ids or max_faces),
+    # skipping people that haven't changed in Immich when delta sync is enabled.
+    # Scheduled jobs queue behind manual ones and pause whenever a manual job is waiting.
+    if job_queue.submit("scheduled", delta=Config.DELTA_SYNC) is None:
+        app.logger.info("Scheduled sync skipped: A scheduled sync is already queued or running.")
+
+
+class SyncWorker:
+    """Runs the sync worker services while this process holds the lease, and stands by otherwise."""
+
+    def __init__(self, app, lease):
+        self.app = app
+        self.lease = lease
+        self._scheduler = None
+        self._active = False
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._supervise, name="sync-worker-lease", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def _supervise(self):
+        while not self._stopping.is_set():
+            self._stopping.wait(self._check_lease())
+
+    def _check_lease(self):
+        """Renews or takes the lease and starts or stops the services to match. Returns the seconds until the next check."""
+        try:
+            held = self.lease.acquire()
+        except sqlite3.Error as e:
+            # A busy database (e.g. "database is locked" during a write-heavy sync) doesn't mean another
+            # process took over: keep the current state until the lease we hold has actually run out.
+            if not self._active:
+                logger.warning(f"Could not take the sync worker lease: {e}")
+                return self.lease.ttl_seconds / 3
+            if time.time() < self.lease.expires_at:
+                logger.warning(f"Could not renew the sync worker lease: {e}; retrying.")
+                return 1
+            self.app.logger.error(f"Could not renew the sync worker lease before it expired ({e}); stopping sync services here.")
+            self._deactivate()
+            return 1
+        if held and not self._active:
+            self._activate()
+        elif not held and self._active:
+            self.app.logger.error("Lost the sync worker lease to another process; stopping sync services here.")
+            self._deactivate()
+        return self.lease.ttl_seconds / 3
+
+    def _activate(self):
+        self._active = True
+        self.app.logger.info(f"Running the sync worker in process {os.getpid()}.")
+        if not job_queue.is_running():
+            # A sync left in progress by a worker that died; never this process's own job, which is still running.
+            status_manager.recover_interrupted()
+        mqtt_client.connect()
+        frigate_restarter.resume(status_manager.add_log)
+        job_queue.start_worker(self.app, status_manager)
+        analysis_queue.start_worker(self.app)
+        if Config.SYNC_SCHEDULE_INTERVAL_HOURS > 0:
+            self._scheduler = BackgroundScheduler()
+            self._scheduler.add_job(
+                func=scheduled_sync_job,
+                args=(self.app,),
+                trigger='interval',
+                hours=Config.SYNC_SCHEDULE_INTERVAL_HOURS,
+                id='scheduled_sync',
+                name='Scheduled Immich-Frigate Sync',
+                replace_existing=True
+            )
+            self._scheduler.start()
+            self.app.logger.info(f"Scheduled sync enabled: every {Config.SYNC_SCHEDULE_INTERVAL_HOURS} hours.")
+
+    def _deactivate(self):
+        self._active = False
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+        job_queue.stop()
+        analysis_queue.stop()
+        mqtt_client.disconnect()
+
+    def stop(self):
+        self._stopping.set()
+        if self._active:
+            self._deactivate()
+            self.lease.release() # Lets a replacement take over without waiting for the lease to expire
+
+
+_sync_worker = None
+
+
+def start_sync_worker(app):
+    """Starts competing for the sync worker role in this process (at most once)."""
+    global _sync_worker
+    if _sync_worker is None:
+        _sync_worker = SyncWorker(app, WorkerLease(Config.STATUS_DB, "sync-worker", Config.WORKER_LEASE_SECONDS))
+        _sync_worker.start()
+    return _sync_worker
+
+
+def main():
+    from .app import create_app # app.app imports this module
+    app = create_app(sync_worker=False)
+    worker = start_sync_worker(app)
+
+    stopped = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stopped.set())
+    parent = os.getppid()
+    while not stopped.wait(1):
+        if os.getppid() != parent:
+            app.logger.warning("Parent process exited; stopping the sync worker.") # e.g. the gunicorn master was killed
+            break
+    worker.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Peak memory of a dry-run plan and a full sync as the Immich library grows.
+
+For each library size and layout, a stub Immich server runs in its own process (so the synthetic
+library doesn't count towards the measurement) and a fresh subprocess plans and runs a full sync
+against it. Each case prints one JSON line with the RSS before the sync, the peak RSS and the
+difference. MAX_FACES_PER_PERSON is kept small, so the case measures listing and planning rather
+than thumbnail downloads; peak memory should stay flat as the face count grows.
+
+Layouts:
+    spread      The faces spread over people with --faces-per-person faces each.
+    one_person  Every face belongs to a single person.
+
+Usage:
+    python -m benchmarks.bench_memory [--sizes 10000,100000] [--layouts spread,one_person]
+                                      [--faces-per-person 100] [--max-faces 5]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import shutil
+import tempfile
+import subprocess
+
+from benchmarks.bench_sync import configure_app, peak_rss_mb, plan_once, sync_once
+
+LAYOUTS = ("spread", "one_person")
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0), 1)
+
+
+def library_shape(layout, size, faces_per_person):
+    """Returns (people, faces per person) for a layout with `size` faces in total."""
+    if layout == "one_person":
+        return 1, size
+    return max(1, size // faces_per_person), faces_per_person
+
+
+def start_stub(people, faces):
+    """Starts benchmarks.stub_immich in a subprocess and returns (process, url)."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_immich", "--people", str(people), "--faces", str(faces), "--port", "0"],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError("Stub Immich exited before it started listening")
+    return process, line.rsplit(" ", 1)[-1].strip()
+
+
+def run_case(stub_url, max_faces):
+    """Plans and runs one full sync in this process and returns the measurements."""
+    data_dir = tempfile.mkdtemp(prefix="frimmich-bench-memory-")
+    Config = configure_app(stub_url, data_dir)
+    Config.MAX_FACES_PER_PERSON = max_faces
+    logging.disable(logging.WARNING)
+    try:
+        from app import sync_logic # noqa: F401 - Imported before the baseline so it isn't counted
+        baseline = current_rss_mb()
+        started = time.perf_counter()
+        estimate = plan_once(delta=False)
+        plan_seconds = time.perf_counter() - started
+        plan_peak = peak_rss_mb()
+        started = time.perf_counter()
+        summary = sync_once(delta=False)
+        sync_seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    peak = peak_rss_mb()
+    return {
+        "baseline_rss_mb": baseline,
+        "plan_peak_rss_mb": plan_peak,
+        "peak_rss_mb": peak,
+        "growth_mb": round(peak - baseline, 1),
+        "plan_seconds": round(plan_seconds, 3),
+        "sync_seconds": round(sync_seconds, 3),
+        "estimated_immich_requests": estimate["immich_requests"],
+        "trained": summary.get("trained"),
+        "status": summary.get("status"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000", help="Total faces in the library, comma-separated")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS))
+    parser.add_argument("--faces-per-person", type=int, default=100, help="Faces per person in the spread layout")
+    parser.add_argument("--max-faces", type=int, default=5, help="MAX_FACES_PER_PERSON for the sync")
+    parser.add_argument("--stub-url", help=argparse.SUPPRESS) # Set when running one case in a child process
+    args = parser.parse_args(argv)
+
+    if args.stub_url:
+        print(json.dumps(run_case(args.stub_url, args.max_faces)), flush=True)
+        return 0
+
+    layouts = [layout for layout in args.layouts.split(",") if layout]
+    unknown = [layout for layout in layouts if layout not in LAYOUTS]
+    if unknown:
+        parser.error(f"Unknown layouts: {', '.join(unknown)}")
+
+    status = 0
+    for layout in layouts:
+        for size in (int(size) for size in args.sizes.split(",") if size):
+            people, faces = library_shape(layout, size, args.faces_per_person)
+            stub, url = start_stub(people, faces)
+            try:
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_memory", "--stub-url", url, "--max-faces", str(args.max_faces)],
+                    stdout=subprocess.PIPE, text=True
+                )
+            finally:
+                stub.terminate()
+                stub.wait()
+            status = status or completed.returncode
+            if completed.returncode != 0:
+                continue
+            result = {"benchmark": "memory", "layout": layout, "faces": people * faces, "people": people, "max_faces": args.max_faces}
+            result.update(json.loads(completed.stdout.strip().splitlines()[-1]))
+            print(json.dumps(result), flush=True)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
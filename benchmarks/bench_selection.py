@@ -0,0 +1,63 @@
+"""
+Benchmark for the Smart Face Trainer's diversity selection.
+
+Runs select_diverse_faces on synthetic embeddings and prints one JSON line per size.
+
+Usage:
+    python -m benchmarks.bench_selection [--sizes 1000,10000] [--suggestions 10]
+"""
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+from app.face_selection import quality_scores, select_diverse_faces
+
+
+def synthetic_person(num_faces, clusters=40, seed=0):
+    """Embeddings clustered like burst shots of one person, plus random quality metrics."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=0.35, size=(clusters, 128))
+    embeddings = centers[rng.integers(0, clusters, num_faces)] + rng.normal(scale=0.05, size=(num_faces, 128))
+    clarity = rng.lognormal(mean=5, sigma=1.5, size=num_faces)
+    frontal_score = rng.choice([0.0, 0.5, 1.0], size=num_faces)
+    lighting_score = rng.uniform(size=num_faces)
+    return embeddings.astype(np.float32), clarity, frontal_score, lighting_score
+
+
+def run(num_faces, num_suggestions, repeats=3):
+    embeddings, clarity, frontal_score, lighting_score = synthetic_person(num_faces)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        scores = quality_scores(clarity, frontal_score, lighting_score)
+        selected = select_diverse_faces(embeddings, scores, num_suggestions)
+        timings.append(time.perf_counter() - started)
+    return {
+        "benchmark": "select_diverse_faces",
+        "faces": num_faces,
+        "suggestions": num_suggestions,
+        "selected": len(selected),
+        "best_seconds": min(timings),
+        "worst_seconds": max(timings),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="50,1000,10000")
+    parser.add_argument("--suggestions", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    slowest = 0.0
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run(size, args.suggestions)
+        slowest = max(slowest, result["worst_seconds"])
+        print(json.dumps(result))
+    # Regression gate: selection must stay sub-second at every benchmarked size.
+    return 0 if slowest < 1.0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Sync, curation and analyzer benchmarks against a local stub Immich server.
+
+Each scenario runs in a fresh subprocess (so peak RSS is per scenario) with its own data
+directory, and prints one JSON line with throughput, p50/p99 latency, peak RSS and the number
+of upstream requests by endpoint.
+
+Scenarios:
+    full_sync           run_sync over the whole library with an empty state store, after a dry-run
+                        plan whose estimated request count is reported next to the real one.
+    incremental_resync  Delta run_sync after a first delta sync, with new faces added to 10% of people.
+    curation            Pages through /api/people/<id>/faces and loads the grid thumbnails, twice.
+    analyze             analyze_and_suggest_faces for one person (needs dlib/face_recognition).
+    frigate_api         FRIGATE_DELIVERY=api against a stub Frigate: full sync, unchanged re-sync,
+                        then 5 faces reassigned in Immich and two more syncs.
+
+Usage:
+    python -m benchmarks.bench_sync [--scenarios full_sync,curation] [--people 20] [--faces 100]
+                                    [--latency-ms 2] [--error-rate 0.01]
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import shutil
+import resource
+import tempfile
+import subprocess
+import numpy as np
+
+from benchmarks.stub_immich import StubImmich
+from benchmarks.stub_frigate import StubFrigate
+
+SCENARIOS = ("full_sync", "incremental_resync", "curation", "analyze", "frigate_api")
+
+
+def configure_app(stub_url, data_dir, frigate_url=None):
+    """Points Frimmich at the stubs and a scratch data directory. Must run before importing app modules."""
+    os.environ["IMMICH_API_URL"] = stub_url
+    os.environ["IMMICH_API_KEY"] = "benchmark"
+    os.environ["FRIGATE_FACES_DIR"] = os.path.join(data_dir, "faces")
+    os.environ.pop("MQTT_HOST", None)
+    if frigate_url:
+        os.environ["FRIGATE_API_URL"] = frigate_url
+        os.environ["FRIGATE_DELIVERY"] = "api"
+    else:
+        os.environ.pop("FRIGATE_API_URL", None)
+        os.environ["FRIGATE_DELIVERY"] = "files"
+    from app.config import Config
+    Config.DATA_DIR = data_dir
+    Config.STATE_FILE = os.path.join(data_dir, "synced_faces_state.json")
+    Config.STATE_DB = os.path.join(data_dir, "frimmich_state.db")
+    Config.STATUS_DB = os.path.join(data_dir, "frimmich_status.db")
+    Config.THUMBNAIL_CACHE_DIR = os.path.join(data_dir, "thumbnail_cache")
+    Config.EMBEDDING_CACHE_DIR = os.path.join(data_dir, "embedding_cache")
+    Config.MAX_FACES_PER_PERSON = 10 ** 9 # Sync every face so throughput scales with --faces
+    # The stub cycles a few thumbnails across all faces; hash every face but never drop one as a duplicate.
+    Config.FACE_DEDUP_MAX_DISTANCE = -1
+    return Config
+
+
+def percentiles(latencies):
+    if not latencies:
+        return None, None
+    p50, p99 = np.percentile(np.asarray(latencies) * 1000.0, [50, 99])
+    return round(float(p50), 3), round(float(p99), 3)
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1) # ru_maxrss is in KB on Linux
+
+
+def timed_process_face(sync_logic, latencies):
+    """Wraps process_face to record per-face latency."""
+    process_face = sync_logic.process_face
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return process_face(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+    sync_logic.process_face = wrapper
+
+
+def sync_once(delta):
+    from flask import Flask
+    from app import sync_logic
+    from app.status_manager import status_manager
+    app = Flask("benchmark")
+    if not status_manager.start_sync():
+        raise RuntimeError("A sync is already running")
+    sync_logic.run_sync(app, status_manager, None, delta)
+    return status_manager.get_status()["last_sync_summary"]
+
+
+def plan_once(delta):
+    """Builds a dry-run sync plan and returns its cost estimate."""
+    from app.config import Config
+    from app.state_manager import StateManager
+    from app.sync_plan import build_sync_plan, estimate_sync_cost
+    state_manager = StateManager(Config.STATE_DB)
+    try:
+        with build_sync_plan(state_manager, delta=delta) as plan:
+            return estimate_sync_cost(plan.summary(), state_manager.sync_stats())
+    finally:
+        state_manager.close()
+
+
+def scenario_sync(stub, incremental):
+    from app import sync_logic
+    latencies = []
+    if incremental:
+        sync_once(delta=True) # A delta sync records the per-person fingerprints the re-sync compares against
+        changed = stub.people[::10]
+        for person in changed:
+            stub.add_faces(person["id"], max(1, len(stub.faces[person["id"]]) // 20))
+    estimate = plan_once(delta=incremental)
+    stub.reset_counts() # Requests below are the sync's own
+    timed_process_face(sync_logic, latencies)
+
+    started = time.perf_counter()
+    summary = sync_once(delta=incremental)
+    seconds = time.perf_counter() - started
+    return {
+        "items": summary.get("trained", 0) + summary.get("skipped", 0),
+        "seconds": seconds,
+        "latencies": latencies,
+        "extra": {
+            "trained": summary.get("trained"),
+            "skipped": summary.get("skipped"),
+            "failed": summary.get("failed"),
+            "unchanged_people": summary.get("unchanged_people"),
+            "status": summary.get("status"),
+            "estimated_immich_requests": estimate["immich_requests"],
+        },
+    }
+
+
+def scenario_curation(stub, page_size=50, thumbnails_per_page=50):
+    from app.app import create_app
+    client = create_app().test_client()
+    latencies = []
+    passes = []
+
+    def timed_get(url):
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append(time.perf_counter() - started)
+        return response
+
+    started = time.perf_counter()
+    for _ in range(2): # Cold, then warm (face index and thumbnail cache populated)
+        pass_started = time.perf_counter()
+        requests_before = stub.request_counts()["total"]
+        for person in stub.people:
+            offset = 0
+            while offset is not None:
+                page = timed_get(f"/api/people/{person['id']}/faces?offset={offset}&pageSize={page_size}").get_json()
+                for face in page["faces"][:thumbnails_per_page]:
+                    timed_get(f"{face['thumbnailUrl']}?size=180")
+                offset = page["nextOffset"]
+        passes.append({
+            "seconds": round(time.perf_counter() - pass_started, 4),
+            "upstream_requests": stub.request_counts()["total"] - requests_before,
+        })
+    return {
+        "items": len(latencies),
+        "seconds": time.perf_counter() - started,
+        "latencies": latencies,
+        "extra": {"cold": passes[0], "warm": passes[1]},
+    }
+
+
+def scenario_analyze(stub, repeats=2):
+    from app import face_analyzer
+    reason = face_analyzer.unavailable_reason()
+    if reason:
+        return {"skipped": reason}
+    person = stub.people[0]
+    faces = [dict(face, thumbnailUrl=f"/api/faces/{face['id']}/thumbnail") for face in stub.faces[person["id"]]]
+    logger = logging.getLogger("benchmark")
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeats): # First call analyzes, later calls hit the embedding cache
+        call_started = time.perf_counter()
+        suggested = face_analyzer.analyze_and_suggest_faces(faces, logger, num_suggestions=10, max_faces_to_analyze=len(faces))
+        latencies.append(time.perf_counter() - call_started)
+    return {
+        "items": len(faces) * repeats,
+        "seconds": time.perf_counter() - started,
+        "latencies": latencies,
+        "extra": {"suggested": len(suggested), "call_seconds": [round(s, 4) for s in latencies]},
+    }
+
+
+def scenario_frigate_api(stub, frigate):
+    latencies = []
+    phases = {}
+    started = time.perf_counter()
+
+    def phase(label, delta):
+        frigate.reset_counts()
+        phase_started = time.perf_counter()
+        summary = sync_once(delta=delta)
+        latencies.append(time.perf_counter() - phase_started)
+        phases[label] = {
+            "seconds": round(latencies[-1], 4),
+            "trained": summary.get("trained"),
+            "failed": summary.get("failed"),
+            "reconcile": summary.get("reconcile"),
+            "frigate_requests": frigate.request_counts(),
+        }
+
+    phase("full_sync", delta=True)
+    phase("unchanged_resync", delta=True)
+    stub.reassign_faces(stub.people[0]["id"], stub.people[1]["id"], 5)
+    phase("after_reassign", delta=False) # Deletes the old registrations and forgets them
+    phase("reregister", delta=True) # Registers the reassigned faces under their new person
+    return {
+        "items": sum(p["trained"] or 0 for p in phases.values()),
+        "seconds": time.perf_counter() - started,
+        "latencies": latencies,
+        "extra": {"phases": phases, "frigate_faces": frigate.face_count()},
+    }
+
+
+def run_scenario(name, args):
+    """Runs one scenario in this process and returns its result dict."""
+    stub = StubImmich(args.people, args.faces, args.latency_ms, args.error_rate).start()
+    frigate = StubFrigate(args.latency_ms).start() if name == "frigate_api" else None
+    data_dir = tempfile.mkdtemp(prefix=f"frimmich-bench-{name}-")
+    configure_app(stub.url, data_dir, frigate.url if frigate else None)
+    logging.disable(logging.WARNING) # Sync logs go to the status manager; keep stdout machine-readable
+    try:
+        if name == "full_sync":
+            outcome = scenario_sync(stub, incremental=False)
+        elif name == "incremental_resync":
+            outcome = scenario_sync(stub, incremental=True)
+        elif name == "curation":
+            outcome = scenario_curation(stub)
+        elif name == "frigate_api":
+            outcome = scenario_frigate_api(stub, frigate)
+        else:
+            outcome = scenario_analyze(stub)
+    finally:
+        stub.stop()
+        if frigate:
+            frigate.stop()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    result = {
+        "benchmark": "sync",
+        "scenario": name,
+        "people": args.people,
+        "faces_per_person": args.faces,
+        "latency_ms": args.latency_ms,
+        "error_rate": args.error_rate,
+    }
+    if "skipped" in outcome:
+        result["skipped"] = outcome["skipped"]
+        return result
+    p50, p99 = percentiles(outcome["latencies"])
+    result.update({
+        "items": outcome["items"],
+        "seconds": round(outcome["seconds"], 4),
+        "throughput_per_s": round(outcome["items"] / outcome["seconds"], 1) if outcome["seconds"] > 0 else None,
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "peak_rss_mb": peak_rss_mb(),
+        "requests": stub.request_counts(),
+    })
+    result.update(outcome["extra"])
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--people", type=int, default=20)
+    parser.add_argument("--faces", type=int, default=100, help="Faces per person")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Added stub latency per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub requests answered with 503")
+    parser.add_argument("--in-process", action="store_true", help="Run the scenarios in this process instead of one subprocess each")
+    args = parser.parse_args(argv)
+
+    names = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    if args.in_process or len(names) == 1:
+        for name in names:
+            print(json.dumps(run_scenario(name, args)), flush=True)
+        return 0
+
+    status = 0
+    for name in names:
+        child_args = [sys.executable, "-m", "benchmarks.bench_sync", "--scenarios", name,
+                      "--people", str(args.people), "--faces", str(args.faces),
+                      "--latency-ms", str(args.latency_ms), "--error-rate", str(args.error_rate)]
+        completed = subprocess.run(child_args, stdout=subprocess.PIPE, text=True)
+        sys.stdout.write(completed.stdout)
+        sys.stdout.flush()
+        status = status or completed.returncode
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
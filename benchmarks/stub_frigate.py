@@ -0,0 +1,146 @@
+"""
+Local stand-in for Frigate's face library API, for benchmarks and manual testing.
+
+Implements POST /api/faces/<name>/register, POST /api/faces/<name>/delete, GET /api/faces and
+POST /api/restart against an in-memory library, and counts requests per endpoint.
+
+Usage:
+    python -m benchmarks.stub_frigate [--port 5000] [--latency-ms 5] [--no-ids]
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from urllib.parse import unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REGISTER = re.compile(r"^/api/faces/([^/]+)/register$")
+DELETE = re.compile(r"^/api/faces/([^/]+)/delete$")
+
+
+class StubFrigate:
+    """
+    An in-memory Frigate face library served over HTTP on 127.0.0.1.
+
+    Args:
+        latency_ms (float): Added delay per request.
+        report_ids (bool): Whether register responses include the stored file name.
+    """
+
+    def __init__(self, latency_ms=0.0, report_ids=True):
+        self.latency = latency_ms / 1000.0
+        self.report_ids = report_ids
+        self._lock = threading.Lock()
+        self.library = {} # person name -> list of file IDs
+        self.counts = {}
+        self._next_id = 0
+        self._server = None
+
+    def request_counts(self):
+        with self._lock:
+            counts = dict(self.counts)
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}
+
+    def face_count(self):
+        with self._lock:
+            return sum(len(ids) for ids in self.library.values())
+
+    def handle(self, method, path, body):
+        """Returns (status, JSON body) for a request."""
+        with self._lock:
+            if method == "POST" and REGISTER.match(path):
+                name = unquote(REGISTER.match(path).group(1))
+                self.counts["register"] = self.counts.get("register", 0) + 1
+                if not body:
+                    return 400, {"success": False, "message": "No image"}
+                self._next_id += 1
+                file_id = f"{name}-{self._next_id:06d}.webp"
+                self.library.setdefault(name, []).append(file_id)
+                response = {"success": True, "message": f"Successfully registered face to {name}."}
+                if self.report_ids:
+                    response["filename"] = file_id
+                return 200, response
+            if method == "POST" and DELETE.match(path):
+                name = unquote(DELETE.match(path).group(1))
+                self.counts["delete"] = self.counts.get("delete", 0) + 1
+                ids = set(json.loads(body or b"{}").get("ids", []))
+                self.library[name] = [file_id for file_id in self.library.get(name, []) if file_id not in ids]
+                return 200, {"success": True, "message": "Successfully deleted faces."}
+            if method == "GET" and path == "/api/faces":
+                self.counts["list"] = self.counts.get("list", 0) + 1
+                return 200, {name: list(ids) for name, ids in self.library.items()}
+            if method == "POST" and path == "/api/restart":
+                self.counts["restart"] = self.counts.get("restart", 0) + 1
+                return 200, {"success": True, "message": "Restarting (just a stub)."}
+            self.counts["unknown"] = self.counts.get("unknown", 0) + 1
+            return 404, {"success": False, "message": "Not found"}
+
+    def start(self, port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload = stub.handle(method, self.path.split("?", 1)[0], body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._respond("GET")
+
+            def do_POST(self):
+                self._respond("POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-frigate", daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--no-ids", action="store_true", help="Don't report file names from register (not every Frigate version does)")
+    args = parser.parse_args(argv)
+
+    stub = StubFrigate(args.latency_ms, report_ids=not args.no_ids).start(args.port)
+    print(f"Stub Frigate listening on {stub.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
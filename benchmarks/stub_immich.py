@@ -0,0 +1,220 @@
+"""
+Local stand-in for the parts of the Immich API that Frimmich uses, for benchmarks.
+
+Serves synthetic people, faces, person statistics, asset lookups and JPEG thumbnails, with
+configurable library size, per-request latency and error injection. Requests are counted per
+endpoint so benchmarks can report how many upstream calls a scenario made.
+
+Usage:
+    python -m benchmarks.stub_immich [--people 50] [--faces 200] [--latency-ms 5] [--error-rate 0.01] [--port 2283]
+"""
+import io
+import re
+import sys
+import json
+import time
+import zlib
+import hashlib
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+
+THUMBNAIL_VARIANTS = 16 # Distinct synthetic thumbnails, cycled across faces
+
+ROUTES = [
+    ("people", re.compile(r"^/api/people$")),
+    ("person_faces", re.compile(r"^/api/people/([\w-]+)/faces$")),
+    ("person_statistics", re.compile(r"^/api/people/([\w-]+)/statistics$")),
+    ("face_thumbnail", re.compile(r"^/api/faces/([\w-]+)/thumbnail$")),
+    ("asset", re.compile(r"^/api/assets/([\w-]+)$")),
+    ("assets", re.compile(r"^/api/assets$")),
+]
+
+
+def synthetic_thumbnails(count, size=250, seed=0):
+    """Noisy JPEGs, so encoded sizes and decode costs resemble real face thumbnails."""
+    rng = random.Random(seed)
+    thumbnails = []
+    for _ in range(count):
+        image = Image.effect_noise((size, size), rng.uniform(20, 80)).convert("RGB")
+        output = io.BytesIO()
+        image.save(output, "JPEG", quality=85)
+        thumbnails.append(output.getvalue())
+    return thumbnails
+
+
+class StubImmich:
+    """
+    A synthetic Immich library served over HTTP on 127.0.0.1.
+
+    Args:
+        people (int): Number of named people.
+        faces_per_person (int): Faces per person.
+        latency_ms (float): Added delay per request.
+        error_rate (float): Probability of answering a GET with 503 instead of the real response.
+        seed (int): Seed for error injection.
+    """
+
+    def __init__(self, people=50, faces_per_person=200, latency_ms=0.0, error_rate=0.0, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {}
+        self.thumbnails = synthetic_thumbnails(THUMBNAIL_VARIANTS)
+        self.people = [
+            {"id": f"person-{i:05d}", "name": f"Person {i}", "updatedAt": "2024-01-01T00:00:00.000Z"}
+            for i in range(people)
+        ]
+        self.faces = {person["id"]: [self._face(person["id"], j) for j in range(faces_per_person)] for person in self.people}
+        self._server = None
+
+    @staticmethod
+    def _face(person_id, index):
+        return {
+            "id": f"{person_id}-face-{index:06d}",
+            "assetId": f"{person_id}-asset-{index:06d}",
+            "personId": person_id,
+            "imageWidth": 250,
+            "imageHeight": 250,
+            "boundingBox": {"x1": 40, "y1": 30, "x2": 210, "y2": 220},
+        }
+
+    def add_faces(self, person_id, count, updated_at="2024-06-01T00:00:00.000Z"):
+        """
+        Adds new faces to a person and bumps their updatedAt, like new photos being imported.
+        With updated_at=None the updatedAt is left alone, as Immich does when faces are assigned to an existing person.
+        """
+        with self._lock:
+            faces = self.faces[person_id]
+            faces.extend(self._face(person_id, len(faces) + i) for i in range(count))
+            if updated_at is not None:
+                next(p for p in self.people if p["id"] == person_id)["updatedAt"] = updated_at
+
+    def reassign_faces(self, from_person_id, to_person_id, count, updated_at="2024-07-01T00:00:00.000Z"):
+        """Moves the first `count` faces of one person to another, like fixing misassigned faces in Immich. updated_at=None keeps updatedAt."""
+        with self._lock:
+            moved, self.faces[from_person_id] = self.faces[from_person_id][:count], self.faces[from_person_id][count:]
+            self.faces[to_person_id].extend(dict(face, personId=to_person_id) for face in moved)
+            for person in self.people:
+                if updated_at is not None and person["id"] in (from_person_id, to_person_id):
+                    person["updatedAt"] = updated_at
+
+    def reset_counts(self):
+        with self._lock:
+            self.counts = {}
+
+    def request_counts(self):
+        with self._lock:
+            counts = dict(self.counts)
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def _count(self, route):
+        with self._lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+            return self.error_rate > 0 and self._random.random() < self.error_rate
+
+    def respond(self, path, query=""):
+        """
+        Returns (status, content type, body) for a GET path.
+
+        /api/people returns a plain array, or a page ({"people", "total", "hasNextPage"}) when
+        `size` is given, like Immich's paginated people endpoint.
+        """
+        for route, pattern in ROUTES:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            if self._count(route):
+                return 503, "application/json", b'{"message":"injected error"}'
+            if route == "people":
+                params = parse_qs(query)
+                if "size" not in params:
+                    return 200, "application/json", json.dumps(self.people).encode()
+                size = max(1, int(params["size"][0]))
+                start = (max(1, int(params.get("page", ["1"])[0])) - 1) * size
+                page = {"people": self.people[start:start + size], "total": len(self.people), "hasNextPage": start + size < len(self.people)}
+                return 200, "application/json", json.dumps(page).encode()
+            if route in ("person_faces", "person_statistics"):
+                faces = self.faces.get(match.group(1))
+                if faces is None:
+                    return 404, "application/json", b'{"message":"Not found"}'
+                body = faces if route == "person_faces" else {"assets": len(faces)}
+                return 200, "application/json", json.dumps(body).encode()
+            if route == "face_thumbnail":
+                return 200, "image/jpeg", self.thumbnails[zlib.crc32(match.group(1).encode()) % len(self.thumbnails)]
+            if route == "asset":
+                return 200, "application/json", json.dumps({"id": match.group(1), "type": "IMAGE"}).encode()
+            return 200, "application/json", b"[]"
+        self._count("unknown")
+        return 404, "application/json", b'{"message":"Not found"}'
+
+    def start(self, port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like Immich behind a typical proxy
+            # Headers and body are separate writes; without TCP_NODELAY, delayed ACKs add ~40ms per response.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if stub.latency:
+                    time.sleep(stub.latency)
+                path, _, query = self.path.partition("?")
+                status, content_type, body = stub.respond(path, query)
+                etag = None
+                if status == 200 and path == "/api/people":
+                    # Conditional GETs, so the 304s of cached refreshes show up in the request counts.
+                    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="stub-immich", daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--people", type=int, default=50)
+    parser.add_argument("--faces", type=int, default=200, help="Faces per person")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=2283, help="Port to listen on (0 picks a free one)")
+    args = parser.parse_args(argv)
+
+    stub = StubImmich(args.people, args.faces, args.latency_ms, args.error_rate).start(args.port)
+    print(f"Stub Immich listening on {stub.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Shared fixtures: a stub Immich server (benchmarks/stub_immich.py), a scratch data directory with
+the app's configuration pointed at both, and a `run_sync` helper.
+
+App modules read their configuration when they are first imported. The `frimmich` fixture
+therefore patches Config and the module-level singletons that captured it, so tests can import
+app modules at any point.
+"""
+import os
+import logging
+import pytest
+
+from benchmarks.stub_immich import StubImmich
+
+
+@pytest.fixture
+def stub_immich():
+    stub = StubImmich(people=3, faces_per_person=5).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def frimmich(stub_immich, tmp_path, monkeypatch):
+    """Points the app at the stub and a fresh data directory, with the default sync settings, and returns Config."""
+    from app.config import Config
+    data_dir = str(tmp_path)
+    settings = {
+        "IMMICH_API_URL": stub_immich.url,
+        "IMMICH_API_KEY": "tests",
+        "DATA_DIR": data_dir,
+        "STATE_FILE": os.path.join(data_dir, "synced_faces_state.json"),
+        "STATE_DB": os.path.join(data_dir, "frimmich_state.db"),
+        "STATUS_DB": os.path.join(data_dir, "frimmich_status.db"),
+        "THUMBNAIL_CACHE_DIR": os.path.join(data_dir, "thumbnail_cache"),
+        "EMBEDDING_CACHE_DIR": os.path.join(data_dir, "embedding_cache"),
+        "FRIGATE_FACES_DIR": os.path.join(data_dir, "faces"),
+        "FRIGATE_DELIVERY": "files",
+        "FRIGATE_API_URL": None,
+        "MQTT_HOST": None,
+        "MAX_FACES_PER_PERSON": 100,
+        "RECONCILE_ON_SYNC": True,
+        "RECONCILE_DRY_RUN": False,
+        "SKIP_EXISTING_FACES": True,
+        "HTTP_RETRY_BACKOFF": 0.01,
+        # The stub cycles a few thumbnails across all faces; never drop one as a duplicate.
+        "FACE_DEDUP_MAX_DISTANCE": -1,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(Config, name, value)
+
+    from app.analysis_jobs import analysis_queue
+    from app.http_client import immich_client
+    from app.job_queue import job_queue
+    from app.people_cache import people_cache
+    from app.status_manager import status_manager
+    from app.thumbnail_cache import thumbnail_cache
+    for queue in (job_queue, analysis_queue):
+        monkeypatch.setattr(queue, "db_path", Config.STATE_DB)
+        monkeypatch.setattr(queue, "_conn", None)
+    monkeypatch.setattr(immich_client, "base_url", stub_immich.url)
+    monkeypatch.setattr(immich_client, "backoff_base", 0.01)
+    monkeypatch.setattr(status_manager, "db_path", Config.STATUS_DB)
+    monkeypatch.setattr(status_manager, "_conn", None)
+    monkeypatch.setattr(thumbnail_cache, "cache_dir", Config.THUMBNAIL_CACHE_DIR)
+    monkeypatch.setattr(thumbnail_cache, "_conn", None)
+    people_cache.invalidate()
+    logging.disable(logging.WARNING)
+    yield Config
+    logging.disable(logging.NOTSET)
+    people_cache.invalidate()
+
+
+@pytest.fixture
+def run_sync(frimmich):
+    """Returns a function that runs one sync in this process and returns its summary."""
+    from flask import Flask
+    from app import sync_logic
+    from app.status_manager import status_manager
+
+    def run(selected_people_data=None, delta=True, job=None):
+        assert status_manager.start_sync()
+        return sync_logic.run_sync(Flask("tests"), status_manager, selected_people_data, delta, job)
+
+    return run
+
+
+@pytest.fixture
+def client(frimmich):
+    """A test client for the web app, which doesn't compete for the sync worker role."""
+    from app.app import create_app
+    return create_app(sync_worker=False).test_client()
@@ -0,0 +1,63 @@
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def analysis_worker(frimmich, monkeypatch):
+    """Runs the analysis job worker in this process, with a fake analyzer that suggests the first faces."""
+    from app import face_analyzer
+    from app.analysis_jobs import analysis_queue
+    calls = []
+
+    def analyze_and_suggest_faces(faces, logger, num_suggestions=5, max_faces_to_analyze=50, progress=None):
+        calls.append(len(faces))
+        for done in range(len(faces) + 1):
+            progress(done, len(faces))
+        return [face["id"] for face in faces[:num_suggestions]]
+
+    monkeypatch.setattr(face_analyzer, "unavailable_reason", lambda: None)
+    monkeypatch.setattr(face_analyzer, "analyze_and_suggest_faces", analyze_and_suggest_faces)
+    analysis_queue.open()
+    analysis_queue.start_worker(Flask("tests"))
+    yield calls
+    analysis_queue.stop()
+    analysis_queue._thread.join(5)
+
+
+def wait_until_finished(client, job):
+    for _ in range(20):
+        if job["status"] in ("done", "failed"):
+            break
+        job = client.get(f"/api/analysis/{job['id']}?since={job['updates']}&timeout=5").get_json()
+    return job
+
+
+def test_analysis_runs_as_a_background_job(client, stub_immich, analysis_worker):
+    person_id = stub_immich.people[0]["id"]
+    response = client.post(f"/api/people/{person_id}/suggest_faces", json={"num_suggestions": 2})
+    assert response.status_code == 202
+    job = wait_until_finished(client, response.get_json()["job"])
+    assert job["status"] == "done"
+    assert (job["faces_done"], job["faces_total"]) == (5, 5)
+    assert job["result"] == {"suggested_face_ids": [face["id"] for face in stub_immich.faces[person_id][:2]], "faces": 5}
+
+
+def test_a_person_has_one_pending_analysis(frimmich):
+    from app.analysis_jobs import analysis_queue
+    analysis_queue.open()
+    first = analysis_queue.submit("person-00000")
+    assert analysis_queue.submit("person-00000")["id"] == first["id"]
+    assert analysis_queue.submit("person-00001")["id"] != first["id"]
+
+
+def test_missing_analyzer_fails_the_job(client, stub_immich, analysis_worker, monkeypatch):
+    from app import face_analyzer
+    monkeypatch.setattr(face_analyzer, "unavailable_reason", lambda: "dlib is not installed")
+    job = client.post(f"/api/people/{stub_immich.people[0]['id']}/suggest_faces", json={}).get_json()["job"]
+    job = wait_until_finished(client, job)
+    assert (job["status"], job["error"]) == ("failed", "dlib is not installed")
+    assert analysis_worker == []
+
+
+def test_unknown_job_is_not_found(client):
+    assert client.get("/api/analysis/12345").status_code == 404
@@ -0,0 +1,62 @@
+import random
+import time
+
+from app.image_pipeline import hamming_distance
+from app.sync_logic import PersonHashIndex
+
+
+def brute_force_duplicate(hashes, face_hash, max_distance):
+    return any(hamming_distance(face_hash, other) <= max_distance for other in hashes)
+
+
+def near(rng, face_hash, distance):
+    for bit in rng.sample(range(64), distance):
+        face_hash ^= 1 << bit
+    return face_hash
+
+
+def test_banded_lookup_finds_the_same_duplicates_as_a_full_scan():
+    rng = random.Random(7)
+    for max_distance in (0, 1, 3, 5, 8, 20):
+        index = PersonHashIndex(max_distance)
+        kept = []
+        for i in range(400):
+            if kept and rng.random() < 0.5:
+                face_hash = near(rng, rng.choice(kept), rng.randint(0, max_distance + 2))
+            else:
+                face_hash = rng.getrandbits(64)
+            expected = brute_force_duplicate(kept, face_hash, max_distance)
+            assert (index.claim(f"face-{i}", face_hash) is not None) == expected
+            if not expected:
+                kept.append(face_hash)
+
+
+def test_released_faces_no_longer_match():
+    index = PersonHashIndex(5, {"face-a": 0})
+    assert index.claim("face-b", 0b111) == "face-a"
+    index.release("face-a")
+    assert index.claim("face-b", 0b111) is None
+    assert index.claim("face-c", 0b1111) == "face-b"
+
+
+def test_claims_stay_fast_for_large_people():
+    rng = random.Random(3)
+    index = PersonHashIndex(5)
+    started = time.perf_counter()
+    for i in range(20000):
+        index.claim(f"face-{i}", rng.getrandbits(64))
+    assert time.perf_counter() - started < 30 # A full scan per claim takes minutes here
+
+
+def test_sync_skips_near_duplicates_of_written_and_earlier_faces(frimmich, stub_immich, run_sync, monkeypatch):
+    monkeypatch.setattr(frimmich, "FACE_DEDUP", True)
+    monkeypatch.setattr(frimmich, "FACE_DEDUP_MAX_DISTANCE", 5)
+    stub_immich.thumbnails = stub_immich.thumbnails[:1] # Every face is the same burst shot
+    first = run_sync(delta=True)
+    assert (first["trained"], first["deduplicated"]) == (3, 12)
+
+    # Duplicates aren't recorded, so the person's four earlier ones and the new face are all
+    # compared again, against the hash stored for the face the first sync wrote.
+    stub_immich.add_faces(stub_immich.people[0]["id"], 1)
+    second = run_sync(delta=True)
+    assert (second["trained"], second["deduplicated"]) == (0, 5)
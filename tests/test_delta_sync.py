@@ -0,0 +1,59 @@
+import os
+
+
+def test_unchanged_people_are_not_listed_again(frimmich, stub_immich, run_sync):
+    first = run_sync(delta=True)
+    assert first["trained"] == 15
+
+    stub_immich.reset_counts()
+    second = run_sync(delta=True)
+    assert second["unchanged_people"] == 3
+    assert second["trained"] == 0
+    counts = stub_immich.request_counts()
+    assert "person_faces" not in counts
+    assert counts["person_statistics"] == 3
+
+
+def test_faces_added_without_an_updated_at_change_are_synced(frimmich, stub_immich, run_sync):
+    assert run_sync(delta=True)["trained"] == 15
+    person_id = stub_immich.people[0]["id"]
+    # Immich keeps updatedAt when faces are assigned to an existing person.
+    stub_immich.add_faces(person_id, 2, updated_at=None)
+
+    second = run_sync(delta=True)
+    assert second["unchanged_people"] == 2
+    assert second["trained"] == 2
+    from app.state_manager import StateManager
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        synced = {record["face_id"] for record in state_manager.faces_for_person(person_id)}
+    finally:
+        state_manager.close()
+    assert synced == {face["id"] for face in stub_immich.faces[person_id]}
+
+
+def test_faces_reassigned_without_an_updated_at_change_are_moved(frimmich, stub_immich, run_sync):
+    assert run_sync(delta=True)["trained"] == 15
+    moved = [face["id"] for face in stub_immich.faces[stub_immich.people[0]["id"]][:2]]
+    stub_immich.reassign_faces(stub_immich.people[0]["id"], stub_immich.people[1]["id"], 2, updated_at=None)
+
+    second = run_sync(delta=True)
+    assert second["unchanged_people"] == 1
+    assert second["reconcile"]["moved"] == 2
+    new_owner_dir = os.path.join(frimmich.FRIGATE_FACES_DIR, stub_immich.people[1]["name"])
+    assert all(os.path.exists(os.path.join(new_owner_dir, face_id + ".jpg")) for face_id in moved)
+
+
+def test_fingerprints_without_an_asset_count_are_rechecked(frimmich, stub_immich, run_sync):
+    # Fingerprints stored before delta sync compared asset counts.
+    run_sync(delta=True)
+    from app.state_manager import StateManager
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        with state_manager._conn:
+            state_manager._conn.execute("UPDATE person_fingerprints SET asset_count = NULL")
+    finally:
+        state_manager.close()
+
+    assert run_sync(delta=True)["unchanged_people"] == 0
+    assert run_sync(delta=True)["unchanged_people"] == 3
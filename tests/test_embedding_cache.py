@@ -0,0 +1,68 @@
+import itertools
+
+import numpy as np
+
+from app.embedding_cache import EmbeddingCache, face_source_key
+
+
+def analyzed(value):
+    return {"embedding": np.full(128, value), "clarity": value, "frontal_score": 0.5, "lighting_score": 0.25}
+
+
+def test_entries_survive_reopening(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=10)
+    cache.put("f1", analyzed(1.0), source_key="src-1", content_hash="hash-1")
+    cache.put("f2", None, source_key="src-2")
+    cache.close()
+
+    cache = EmbeddingCache(str(tmp_path), max_entries=10)
+    try:
+        face = cache.get("f1", source_key="src-1")
+        assert face["clarity"] == 1.0
+        assert np.allclose(face["embedding"], 1.0)
+        assert cache.get("f2", source_key="src-2") == {"id": "f2", "no_face": True}
+    finally:
+        cache.close()
+
+
+def test_changed_source_is_a_miss_unless_the_image_matches(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=10)
+    try:
+        face = {"id": "f1", "assetId": "a1", "boundingBox": {"x1": 0, "y1": 0, "x2": 10, "y2": 10}}
+        cache.put("f1", analyzed(1.0), source_key=face_source_key(face), content_hash="hash-1")
+        moved = dict(face, boundingBox={"x1": 5, "y1": 0, "x2": 15, "y2": 10})
+        assert cache.get("f1", source_key=face_source_key(moved)) is None
+        assert cache.get("f1", source_key=face_source_key(moved), content_hash="hash-1") is not None
+        # The content match adopted the new source key.
+        assert cache.get("f1", source_key=face_source_key(moved)) is not None
+    finally:
+        cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    from app import embedding_cache
+    clock = itertools.count()
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: next(clock))
+    cache = EmbeddingCache(str(tmp_path), max_entries=2)
+    try:
+        cache.put("f1", analyzed(1.0), source_key="src")
+        cache.put("f2", analyzed(2.0), source_key="src")
+        assert cache.get("f1", source_key="src") is not None # f2 is now the oldest
+        cache.put("f3", analyzed(3.0), source_key="src")
+        assert cache.get("f2", source_key="src") is None
+        assert np.allclose(cache.get("f1", source_key="src")["embedding"], 1.0)
+        assert np.allclose(cache.get("f3", source_key="src")["embedding"], 3.0)
+    finally:
+        cache.close()
+
+
+def test_capacity_change_starts_an_empty_cache(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_entries=4)
+    cache.put("f1", analyzed(1.0), source_key="src")
+    cache.close()
+
+    cache = EmbeddingCache(str(tmp_path), max_entries=8)
+    try:
+        assert cache.get("f1", source_key="src") is None
+    finally:
+        cache.close()
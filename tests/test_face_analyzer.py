@@ -0,0 +1,41 @@
+import os
+import logging
+
+
+def crash_once(face_id, marker):
+    """Stands in for analyze_face_image: the first call kills its pool process, like the OOM killer."""
+    marker = marker.decode()
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return None, {} # "No face found"
+
+
+def test_analysis_recovers_from_a_dead_pool_process(tmp_path, monkeypatch):
+    from app import face_analyzer
+    from app.config import Config
+    marker = str(tmp_path / "crashed")
+    monkeypatch.setattr(Config, "EMBEDDING_CACHE_DIR", str(tmp_path / "embedding_cache"))
+    monkeypatch.setattr(Config, "ANALYZER_PROCESSES", 1)
+    monkeypatch.setattr(face_analyzer, "_embedding_cache", None)
+    monkeypatch.setattr(face_analyzer, "unavailable_reason", lambda: None)
+    monkeypatch.setattr(face_analyzer, "download_image_bytes", lambda url, logger: marker.encode())
+    # Pickled by reference, so the pool processes run this module's function.
+    monkeypatch.setattr(face_analyzer, "analyze_face_image", crash_once)
+    faces = [{"id": f"face-{i}", "thumbnailUrl": f"/api/faces/face-{i}/thumbnail"} for i in range(3)]
+    logger = logging.getLogger("tests")
+    try:
+        face_analyzer.analyze_and_suggest_faces(faces, logger)
+        broken_pool_replaced = face_analyzer._process_pool
+        cache = face_analyzer._get_embedding_cache()
+        assert all(cache.get(face["id"], content_hash=None, source_key=face_analyzer.face_source_key(face)) for face in faces)
+
+        # The replacement pool keeps serving later jobs.
+        more = [{"id": "face-9", "thumbnailUrl": "/api/faces/face-9/thumbnail"}]
+        face_analyzer.analyze_and_suggest_faces(more, logger)
+        assert face_analyzer._process_pool is broken_pool_replaced
+        assert cache.get("face-9", source_key=face_analyzer.face_source_key(more[0]))
+    finally:
+        if face_analyzer._process_pool is not None:
+            face_analyzer._process_pool.shutdown()
+            face_analyzer._process_pool = None
@@ -0,0 +1,70 @@
+import time
+import threading
+
+from app.face_index import FaceIndex
+
+
+class FakeImmich:
+    def __init__(self, faces):
+        self.faces = faces
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get_json(self, path):
+        with self._lock:
+            self.requests.append(path)
+        if path.endswith("/statistics"):
+            return {"assets": len(self.faces)}
+        time.sleep(0.05) # Long enough for concurrent callers to pile up
+        return list(self.faces)
+
+
+def faces(*ids):
+    return [{"id": face_id} for face_id in ids]
+
+
+def test_pages_come_from_one_listing():
+    immich = FakeImmich(faces(*"abcdef"))
+    index = FaceIndex(immich, ttl_seconds=300)
+    assert index.page("p1", 0, 4) == (faces(*"abcd"), 6)
+    assert index.page("p1", 4, 4) == (faces(*"ef"), 6)
+    assert immich.requests == ["/api/people/p1/statistics", "/api/people/p1/faces"]
+
+
+def test_concurrent_requests_list_once():
+    immich = FakeImmich(faces(*"abc"))
+    index = FaceIndex(immich, ttl_seconds=300)
+    threads = [threading.Thread(target=index.get_faces, args=("p1",)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert immich.requests.count("/api/people/p1/faces") == 1
+
+
+def test_expired_entry_is_revalidated_with_statistics():
+    immich = FakeImmich(faces(*"abc"))
+    index = FaceIndex(immich, ttl_seconds=0)
+    index.get_faces("p1")
+    immich.requests.clear()
+    assert index.get_faces("p1") == faces(*"abc")
+    assert immich.requests == ["/api/people/p1/statistics"]
+
+
+def test_relisting_keeps_offsets_and_appends_new_faces():
+    immich = FakeImmich(faces(*"abc"))
+    index = FaceIndex(immich, ttl_seconds=0)
+    index.get_faces("p1")
+    immich.faces = faces("d", "c", "a", "e") # b removed, d and e added, order changed upstream
+    assert index.get_faces("p1") == faces("a", "c", "d", "e")
+
+
+def test_least_recently_used_people_are_evicted():
+    immich = FakeImmich(faces("a"))
+    index = FaceIndex(immich, ttl_seconds=300, max_people=2)
+    for person_id in ("p1", "p2", "p1", "p3"):
+        index.get_faces(person_id)
+    immich.requests.clear()
+    index.get_faces("p1")
+    index.get_faces("p2")
+    assert immich.requests == ["/api/people/p2/statistics", "/api/people/p2/faces"]
@@ -0,0 +1,97 @@
+import random
+
+from app.face_ranking import metadata_score
+
+
+def reference_ranking(faces, budget, min_face_size):
+    """
+    The ranking SyncPlan.select_faces implements in SQL, written out in Python: faces are taken by
+    metadata score, one face per asset first, then second faces from the same assets if the
+    budget isn't spent. Ties keep Immich's order.
+    """
+    scored = []
+    for position, face in enumerate(faces):
+        score = metadata_score(face, min_face_size)
+        if score is not None:
+            scored.append((-score, position, face))
+    scored.sort(key=lambda entry: entry[:2])
+    selected = []
+    repeats = []
+    seen_assets = set()
+    for _, _, face in scored:
+        if len(selected) >= budget:
+            break
+        asset_id = face.get('assetId')
+        if asset_id is not None and asset_id in seen_assets:
+            repeats.append(face)
+            continue
+        seen_assets.add(asset_id)
+        selected.append(face)
+    selected.extend(repeats[:max(0, budget - len(selected))])
+    return [face['id'] for face in selected]
+
+
+class FakeImmich:
+    def __init__(self, faces):
+        self.faces = faces
+
+    def get_json_stream(self, path, reader):
+        return reader(iter(self.faces))
+
+
+class FakeState:
+    legacy_face_ids = frozenset()
+
+    def is_synced(self, face_id):
+        return False
+
+
+def random_faces(rng, count):
+    faces = []
+    for i in range(count):
+        width, height = rng.choice([20, 50, 60, 100, 150]), rng.choice([20, 50, 60, 100, 150])
+        faces.append({
+            "id": f"face-{i}",
+            "assetId": rng.choice([None, "asset-1", "asset-2", "asset-3", f"asset-own-{i}"]),
+            "imageWidth": 500,
+            "imageHeight": 500,
+            "boundingBox": {"x1": 0, "y1": 0, "x2": width, "y2": height},
+        })
+    return faces
+
+
+def test_planned_ranking_matches_the_reference(monkeypatch):
+    from app import sync_plan
+    from app.config import Config
+    monkeypatch.setattr(Config, "FACE_RANKING", True)
+    monkeypatch.setattr(Config, "FACE_MIN_SIZE", 48)
+    rng = random.Random(1)
+    for _ in range(200):
+        faces = random_faces(rng, rng.randint(0, 60))
+        budget = rng.randint(1, 30)
+        monkeypatch.setattr(Config, "MAX_FACES_PER_PERSON", budget)
+        monkeypatch.setattr(sync_plan, "immich_client", FakeImmich(faces))
+        with sync_plan.SyncPlan() as plan:
+            sync_plan.plan_person(plan, FakeState(), 0, "person-0", "Person 0")
+            planned = [face["id"] for face in plan.faces(0)]
+        assert planned == reference_ranking(faces, budget, 48)
+
+
+def test_sync_downloads_only_the_ranked_faces(frimmich, stub_immich, run_sync, monkeypatch):
+    monkeypatch.setattr(frimmich, "FACE_RANKING", True)
+    monkeypatch.setattr(frimmich, "FACE_MIN_SIZE", 48)
+    monkeypatch.setattr(frimmich, "MAX_FACES_PER_PERSON", 3)
+    person_id = stub_immich.people[0]["id"]
+    tiny = stub_immich.faces[person_id][0]
+    tiny["boundingBox"] = {"x1": 0, "y1": 0, "x2": 20, "y2": 20} # Below FACE_MIN_SIZE
+    summary = run_sync(delta=False)
+    assert summary["trained"] == 9
+    assert summary["filtered"] == 1 # Faces past the budget are left out, not counted as filtered
+    assert stub_immich.request_counts()["face_thumbnail"] == 9 # Filtered faces are never downloaded
+
+    from app.state_manager import StateManager
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        assert not state_manager.is_synced(tiny["id"])
+    finally:
+        state_manager.close()
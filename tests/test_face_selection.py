@@ -0,0 +1,49 @@
+import numpy as np
+
+from app.face_selection import quality_scores, select_diverse_faces
+
+
+def naive_selection(embeddings, scores, num_suggestions, min_distance):
+    """Highest score first, skipping faces closer than min_distance to one already chosen."""
+    selected = []
+    for index in sorted(range(len(scores)), key=lambda i: -scores[i]):
+        if len(selected) == num_suggestions:
+            break
+        if all(np.linalg.norm(embeddings[index] - embeddings[other]) >= min_distance for other in selected):
+            selected.append(index)
+    return selected
+
+
+def test_matches_the_score_first_selection():
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(300, 128)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) * 0.7
+    scores = rng.random(300)
+    for min_distance in (0.0, 1.8, 2.0):
+        expected = naive_selection(embeddings, scores, 20, min_distance)
+        assert select_diverse_faces(embeddings, scores, 20, min_distance=min_distance) == expected
+
+
+def test_selected_faces_are_at_least_min_distance_apart():
+    rng = np.random.default_rng(1)
+    # Five tight clusters of near-identical faces.
+    centers = rng.normal(size=(5, 128)) * 3
+    embeddings = np.repeat(centers, 20, axis=0) + rng.normal(scale=0.01, size=(100, 128))
+    selected = select_diverse_faces(embeddings, rng.random(100), 10, min_distance=0.6)
+    assert len(selected) == 5
+    assert len(set(index // 20 for index in selected)) == 5
+
+
+def test_diversity_weight_prefers_faces_far_from_the_selection():
+    embeddings = np.array([[0.0, 0.0], [1.0, 0.0], [10.0, 0.0]])
+    scores = np.array([1.0, 0.9, 0.8])
+    assert select_diverse_faces(embeddings, scores, 2, min_distance=0.5) == [0, 1]
+    assert select_diverse_faces(embeddings, scores, 2, min_distance=0.5, diversity_weight=1.0) == [0, 2]
+
+
+def test_quality_scores_compress_clarity():
+    scores = quality_scores([0.0, 50.0, 1e6], [0.1, 0.9, 0.5], [0.5, 0.5, 0.5])
+    assert np.all((scores >= 0) & (scores <= 1))
+    # Without log compression the 1e6 outlier would flatten face 1's clarity to almost zero.
+    assert scores[1] > 0.7
+    assert int(np.argmax(scores)) == 2
@@ -0,0 +1,104 @@
+import time
+import threading
+
+
+class FakeResponse:
+    def raise_for_status(self):
+        pass
+
+
+class FakeFrigate:
+    def __init__(self):
+        self.restarts = 0
+        self.restarted = threading.Event()
+
+    def post(self, path, **kwargs):
+        assert path == "/api/restart"
+        self.restarts += 1
+        self.restarted.set()
+        return FakeResponse()
+
+
+def test_back_to_back_requests_cause_one_restart(tmp_path):
+    from app.frigate_delivery import FrigateRestarter
+    from app.status_manager import StatusManager
+    store = StatusManager(str(tmp_path / "status.db"))
+    frigate = FakeFrigate()
+    restarter = FrigateRestarter(frigate, 0.2, store=store)
+    for _ in range(3):
+        restarter.request()
+    assert frigate.restarted.wait(5)
+    time.sleep(0.3)
+    assert frigate.restarts == 1
+    assert store.frigate_restart_due() is None
+
+
+def test_pending_restart_survives_the_worker(tmp_path):
+    from app.frigate_delivery import FrigateRestarter
+    from app.status_manager import StatusManager
+    db_path = str(tmp_path / "status.db")
+    exiting = FrigateRestarter(FakeFrigate(), 3600, store=StatusManager(db_path))
+    exiting.request()
+    assert exiting.pending
+
+    # The worker goes away before the debounce runs out; its successor takes over the role.
+    frigate = FakeFrigate()
+    store = StatusManager(db_path)
+    with store._lock, store._connection():
+        store._connection().execute("UPDATE status SET frigate_restart_due = ?", (time.time() - 1,))
+    successor = FrigateRestarter(frigate, 3600, store=store)
+    successor.resume()
+    assert frigate.restarted.wait(5)
+    assert frigate.restarts == 1
+    time.sleep(0.1) # The pending restart is cleared after the request returns
+    assert store.frigate_restart_due() is None
+
+    successor.resume()
+    assert not successor.pending
+
+
+def api_delivery(frimmich, monkeypatch, report_ids=True):
+    """Switches delivery to Frigate's face library API, served by a stub Frigate. Returns the stub."""
+    from benchmarks.stub_frigate import StubFrigate
+    from app.http_client import frigate_client
+    frigate = StubFrigate(report_ids=report_ids).start()
+    monkeypatch.setattr(frimmich, "FRIGATE_DELIVERY", "api")
+    monkeypatch.setattr(frimmich, "FRIGATE_API_URL", frigate.url)
+    monkeypatch.setattr(frigate_client, "base_url", frigate.url)
+    return frigate
+
+
+def test_api_delivery_registers_faces_without_a_restart(frimmich, stub_immich, run_sync, monkeypatch):
+    import os
+    frigate = api_delivery(frimmich, monkeypatch)
+    try:
+        assert run_sync(delta=True)["trained"] == 15
+        assert frigate.face_count() == 15
+        assert "restart" not in frigate.request_counts()
+        assert not os.path.exists(frimmich.FRIGATE_FACES_DIR)
+    finally:
+        frigate.stop()
+
+
+def test_api_reconcile_deletes_reassigned_faces_in_batches(frimmich, stub_immich, run_sync, monkeypatch):
+    from app.frigate_delivery import frigate_library
+    frigate = api_delivery(frimmich, monkeypatch)
+    monkeypatch.setattr(frigate_library, "delete_batch_size", 2)
+    try:
+        assert run_sync(delta=True)["trained"] == 15
+        old_owner, new_owner = (person["name"] for person in stub_immich.people[:2])
+        stub_immich.reassign_faces(stub_immich.people[0]["id"], stub_immich.people[1]["id"], 3)
+        frigate.reset_counts()
+
+        second = run_sync(delta=True)
+        assert second["reconcile"]["removed"] == 3
+        assert frigate.request_counts()["delete"] == 2 # 3 faces of one person, 2 per request
+        assert len(frigate.library[old_owner]) == 2
+
+        # The forgotten faces are registered under their new owner by the next sync.
+        third = run_sync(delta=True)
+        assert third["trained"] == 3
+        assert len(frigate.library[new_owner]) == 8
+        assert frigate.face_count() == 15
+    finally:
+        frigate.stop()
@@ -0,0 +1,148 @@
+import io
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+from PIL import Image
+
+from app.http_client import PooledHTTPClient, iter_json_array
+from app.image_pipeline import crop_face
+
+
+def jpeg(size=64):
+    output = io.BytesIO()
+    Image.new("RGB", (size, size), (120, 80, 40)).save(output, "JPEG")
+    return output.getvalue()
+
+
+@pytest.fixture
+def flaky_server():
+    """Serves a JPEG whose first response is cut off halfway, as a dropped connection would."""
+    body = jpeg()
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.path)
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if len(requests_seen) == 1:
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+            else:
+                self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", body, requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_truncated_body_is_retried(flaky_server):
+    url, body, requests_seen = flaky_server
+    client = PooledHTTPClient(url, backoff_base=0.01)
+    assert bytes(client.get_bytes("/thumbnail")) == body
+    assert len(requests_seen) == 2
+
+
+def test_truncated_jpeg_is_not_passed_through():
+    data = jpeg()
+    assert crop_face(data, None) == data
+    with pytest.raises(OSError):
+        crop_face(data[:len(data) // 2], None)
+
+
+@pytest.fixture
+def scripted_server():
+    """Answers each request with the next (status, body) from a script, then 200 with the last body; records requests."""
+    script = []
+    seen = []
+    lock = threading.Lock()
+    in_flight = [0, 0] # Current and highest concurrent requests
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def respond(self):
+            with lock:
+                seen.append((self.command, self.path, self.headers.get("x-api-key")))
+                status, body = script.pop(0) if len(script) > 1 else script[0]
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            if self.headers.get("Content-Length"):
+                self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(0.05)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            with lock:
+                in_flight[0] -= 1
+
+        do_GET = do_POST = respond
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", script, seen, in_flight
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_is_retried_on_server_errors(scripted_server):
+    url, script, seen, _ = scripted_server
+    script.extend([(503, b'{}'), (429, b'{}'), (200, b'{"ok": true}')])
+    client = PooledHTTPClient(url, headers={"x-api-key": "secret"}, backoff_base=0.01)
+    assert client.get_json("/api/people") == {"ok": True}
+    assert [request[:2] for request in seen] == [("GET", "/api/people")] * 3
+    assert all(request[2] == "secret" for request in seen)
+
+
+def test_post_is_not_retried_by_default(scripted_server):
+    url, script, seen, _ = scripted_server
+    script.extend([(503, b'{}'), (200, b'{}')])
+    client = PooledHTTPClient(url, backoff_base=0.01)
+    assert client.post("/api/restart").status_code == 503
+    assert len(seen) == 1
+
+
+def test_retries_give_up_after_max_retries(scripted_server):
+    url, script, seen, _ = scripted_server
+    script.append((500, b'{}'))
+    client = PooledHTTPClient(url, max_retries=2, backoff_base=0.01)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get_json("/api/people")
+    assert len(seen) == 3
+
+
+def test_in_flight_requests_are_capped(scripted_server):
+    url, script, _, in_flight = scripted_server
+    script.append((200, b'[]'))
+    client = PooledHTTPClient(url, max_in_flight=2)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: client.get_json("/api/people"), range(8)))
+    assert in_flight[1] == 2
+
+
+def test_json_arrays_are_parsed_as_they_arrive():
+    document = json.dumps([{"id": f"face-{i}", "name": "é"} for i in range(50)]).encode()
+    chunks = [document[i:i + 7] for i in range(0, len(document), 7)] # Splits elements and UTF-8 sequences
+    assert list(iter_json_array(chunks)) == json.loads(document)
+    with pytest.raises(ValueError):
+        list(iter_json_array([document[:-10]]))
@@ -0,0 +1,33 @@
+import io
+
+from PIL import Image, JpegImagePlugin
+
+from app.image_pipeline import crop_face
+
+
+def jpeg(width, height):
+    output = io.BytesIO()
+    Image.effect_noise((width, height), 40).convert("RGB").save(output, "JPEG")
+    return output.getvalue()
+
+
+def test_default_size_decodes_large_crops_in_draft_mode(monkeypatch):
+    from app.config import Config
+    drafts = []
+    draft = JpegImagePlugin.JpegImageFile.draft
+
+    def recording_draft(self, mode, size, *args, **kwargs):
+        result = draft(self, mode, size, *args, **kwargs)
+        drafts.append(self.size)
+        return result
+
+    monkeypatch.setattr(JpegImagePlugin.JpegImageFile, "draft", recording_draft)
+    face = crop_face(jpeg(2000, 1600), (400, 300, 1400, 1300), max_size=Config.FRIGATE_FACE_MAX_SIZE)
+    assert Config.FRIGATE_FACE_MAX_SIZE > 0
+    assert max(Image.open(io.BytesIO(face)).size) == Config.FRIGATE_FACE_MAX_SIZE
+    assert drafts and drafts[0][0] < 2000 # Decoded at a reduced DCT scale
+
+
+def test_small_whole_jpeg_is_passed_through():
+    data = jpeg(200, 200)
+    assert crop_face(data, None, max_size=320) == data
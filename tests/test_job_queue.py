@@ -0,0 +1,90 @@
+import pytest
+from flask import Flask
+
+
+@pytest.fixture
+def queue(frimmich):
+    """The job queue over the test's state database, without its worker thread; jobs are run with run_job."""
+    from app.job_queue import job_queue
+    from app.status_manager import status_manager
+    job_queue.open(status_manager)
+    return job_queue
+
+
+def run_job(queue, job):
+    """Runs a claimed job the way the worker thread does and returns its summary."""
+    from app.sync_logic import run_sync
+    from app.status_manager import status_manager
+    assert status_manager.start_sync(job_id=job.job_id)
+    summary = run_sync(Flask("tests"), status_manager, job.people, job.delta, job=job)
+    queue._finish(job, summary)
+    return summary
+
+
+def test_manual_jobs_run_before_scheduled_ones(queue):
+    scheduled = queue.submit("scheduled")
+    assert queue.submit("scheduled") is None # One scheduled job at a time
+    manual = queue.submit("manual", people=[{"id": "person-00000", "faces": []}])
+    assert [job["id"] for job in queue.list_jobs()] == [manual["id"], scheduled["id"]]
+    assert queue._claim_next().job_id == manual["id"]
+    assert queue._claim_next().job_id == scheduled["id"]
+
+
+def test_preempted_job_resumes_after_its_checkpoints(queue, monkeypatch, stub_immich):
+    from app.config import Config
+    monkeypatch.setattr(Config, "SYNC_FACE_WORKERS", 1) # At most two faces in flight
+    scheduled = queue.submit("scheduled")
+    job = queue._claim_next()
+    checkpoint = job.person_done
+
+    def person_done(person_id, outcome):
+        checkpoint(person_id, outcome)
+        if queue.get_job(job.job_id)["people_done"] == 1:
+            queue.submit("manual") # Arrives while the scheduled job is running
+    job.person_done = person_done
+
+    first = run_job(queue, job)
+    assert first["status"] == "Paused"
+    assert first["reconcile"] is None # Not every person was seen
+    paused = queue.get_job(scheduled["id"])
+    assert (paused["status"], paused["people_done"]) == ("queued", 1)
+
+    manual = queue._claim_next()
+    assert manual.priority < job.priority
+    queue.cancel(manual.job_id)
+    queue._finish(manual, {"status": "Cancelled"})
+
+    resumed = queue._claim_next()
+    assert resumed.job_id == scheduled["id"]
+    assert len(resumed.done_people) == 1
+    second = run_job(queue, resumed)
+    assert second["status"] == "Success"
+    assert second["resumed_people"] == 1
+
+    finished = queue.get_job(scheduled["id"])
+    assert (finished["status"], finished["people_done"]) == ("done", 3)
+    assert finished["summary"]["trained"] == 15 # Counters add up over both runs
+    assert stub_immich.request_counts()["face_thumbnail"] == 15
+
+
+def test_cancelling_jobs(queue):
+    queued = queue.submit("manual")
+    assert queue.cancel(queued["id"])["status"] == "cancelled"
+    assert queue._claim_next() is None
+
+    running = queue.submit("manual")
+    job = queue._claim_next()
+    assert queue.cancel(running["id"])["cancel_requested"]
+    summary = run_job(queue, job)
+    assert summary["status"] == "Cancelled"
+    assert summary["trained"] == 0
+    assert queue.get_job(running["id"])["status"] == "cancelled"
+
+
+def test_interrupted_job_is_requeued_on_start(queue, monkeypatch):
+    running = queue.submit("manual")
+    queue._claim_next() # The process running it dies here
+    monkeypatch.setattr(queue, "_run", lambda: None)
+    queue.start_worker(Flask("tests"), queue._status_manager)
+    queue._thread.join()
+    assert queue.get_job(running["id"])["status"] == "queued"
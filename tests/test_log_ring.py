@@ -0,0 +1,65 @@
+from app.status_manager import StatusManager, MAX_LOG_LINES
+
+
+def test_ring_keeps_the_newest_entries(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"), log_capacity=MAX_LOG_LINES + 1)
+    for i in range(250):
+        status.log("INFO", "Line %s", i)
+    logs = status.get_logs(limit=500)["entries"]
+    assert len(logs) == MAX_LOG_LINES + 1
+    assert logs[-1]["message"] == "Line 249"
+    assert [entry["seq"] for entry in logs] == list(range(logs[0]["seq"], logs[0]["seq"] + len(logs)))
+
+
+def test_cursor_tails_new_entries_and_reports_gaps(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"), log_capacity=MAX_LOG_LINES + 1)
+    status.log("INFO", "First")
+    cursor = status.get_logs()["next"]
+    status.log("WARN", "Second")
+    page = status.get_logs(cursor)
+    assert [(entry["level"], entry["message"]) for entry in page["entries"]] == [("WARN", "Second")]
+    assert not page["missed"]
+    assert status.get_logs(page["next"])["entries"] == []
+
+    for i in range(300):
+        status.log("INFO", "Line %s", i)
+    assert status.get_logs(page["next"])["missed"]
+
+
+def test_cursor_pages_through_a_backlog(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"))
+    cursor = status.get_logs()["next"]
+    for i in range(25):
+        status.log("INFO", "Line %s", i)
+    messages = []
+    while True:
+        page = status.get_logs(cursor, limit=10)
+        if not page["entries"]:
+            break
+        messages.extend(entry["message"] for entry in page["entries"])
+        cursor = page["next"]
+    assert messages == [f"Line {i}" for i in range(25)]
+
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError("formatted a disabled log entry")
+
+
+def test_levels_filter_and_drop_entries(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"), min_level="INFO")
+    status.log("DEBUG", "Dropped %s", Unformattable()) # Never formatted or stored
+    status.log("INFO", "Kept")
+    status.add_log("ERROR: Reconcile failed")
+    status.add_log("no level prefix")
+    assert [entry["message"] for entry in status.get_logs()["entries"]] == ["Kept", "Reconcile failed", "no level prefix"]
+    assert [entry["message"] for entry in status.get_logs(level="error")["entries"]] == ["Reconcile failed"]
+
+
+def test_logs_route(client):
+    from app.status_manager import status_manager
+    status_manager.log("WARN", "Something to look at")
+    body = client.get("/logs?level=WARN").get_json()
+    assert body["entries"][-1]["message"] == "Something to look at"
+    assert client.get(f"/logs?since={body['next']}").get_json()["entries"] == []
+    assert client.get("/logs?level=LOUD").status_code == 400
@@ -0,0 +1,31 @@
+from prometheus_client.parser import text_string_to_metric_families
+
+
+def samples(response):
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.get_data(as_text=True))
+        for sample in family.samples
+    }
+
+
+def test_metrics_cover_routes_and_sync_stages(client, run_sync):
+    run_sync(delta=False)
+    client.get("/status")
+    client.get("/api/faces/some-face/thumbnail")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    values = samples(response)
+
+    status_route = (("endpoint", "/status"), ("method", "GET"), ("status", "200"))
+    assert values[("frimmich_http_request_seconds_count", status_route)] >= 1
+    # Routes are labelled by their pattern, so face IDs don't multiply the series.
+    endpoints = set(dict(labels).get("endpoint") for name, labels in values if name == "frimmich_http_request_seconds_count")
+    assert "/api/faces/<face_id>/thumbnail" in endpoints
+    assert not any("some-face" in endpoint for endpoint in endpoints)
+    for stage in ("immich_list", "thumbnail_download", "crop", "disk_write"):
+        assert values[("frimmich_sync_stage_seconds_count", (("stage", stage),))] >= 1
+    assert values[("frimmich_sync_faces_total", (("outcome", "trained"),))] >= 15
+    assert values[("frimmich_upstream_responses_total", (("service", "immich"), ("status", "2xx")))] >= 15
+    assert values[("frimmich_sync_in_progress", ())] == 0
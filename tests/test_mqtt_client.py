@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+import pytest
+
+
+class FakePaho:
+    def __init__(self):
+        self.messages = []
+        self.published = threading.Event()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        self.messages.append((topic, payload, qos, retain))
+        self.published.set()
+
+
+@pytest.fixture
+def mqtt(monkeypatch):
+    """A connected MQTTClient that publishes to a fake paho client instead of a broker."""
+    from app.config import Config
+    from app.mqtt_client import MQTTClient
+    monkeypatch.setattr(Config, "MQTT_HOST", None)
+    monkeypatch.setattr(Config, "MQTT_PROGRESS_INTERVAL", 0.2)
+    client = object.__new__(MQTTClient) # Not the process-wide singleton
+    client._initialize()
+    client._client = FakePaho()
+    client._is_connected = True
+    return client
+
+
+def payloads(client, topic_suffix):
+    return [json.loads(payload) for topic, payload, _, _ in client._client.messages if topic.endswith("/" + topic_suffix)]
+
+
+def test_progress_bursts_are_coalesced_to_the_latest(mqtt):
+    for processed in range(1, 101):
+        mqtt.publish_sync_progress({"processed": processed})
+    assert mqtt._client.published.wait(5)
+    time.sleep(0.3) # One more flush interval
+    sent = payloads(mqtt, "sync_progress")
+    assert len(sent) <= 3
+    assert sent[-1] == {"processed": 100}
+
+
+def test_status_is_published_after_pending_progress(mqtt):
+    mqtt._pending["sync_progress"] = {"processed": 5} # Queued, flusher not yet run
+    mqtt.publish_status("sync_finished")
+    topics = [topic.rsplit("/", 1)[1] for topic, _, _, _ in mqtt._client.messages]
+    assert topics == ["sync_progress", "status"]
+
+
+def test_topic_options(mqtt, monkeypatch):
+    from app.config import Config
+    from app.mqtt_client import MQTTClient
+    mqtt.publish("sync_progress", {"processed": 1})
+    mqtt.publish("status", "online")
+    assert [message[2:] for message in mqtt._client.messages] == [(0, False), (1, True)]
+
+    monkeypatch.setattr(Config, "MQTT_TOPIC_QOS", "sync_progress=1, status=2")
+    monkeypatch.setattr(Config, "MQTT_TOPIC_RETAIN", "status=false")
+    configured = object.__new__(MQTTClient)
+    configured._initialize()
+    assert configured._topic_qos == {"sync_progress": 1, "status": 2}
+    assert configured._topic_retain == {"status": False}
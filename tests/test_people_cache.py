@@ -0,0 +1,105 @@
+import json
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.content = json.dumps(body).encode()
+        self.status_code = status_code
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeImmich:
+    """Answers /api/people with a fixed body, or with pages of `people` like newer Immich versions."""
+
+    def __init__(self, people, paged):
+        self.people = people
+        self.paged = paged
+        self.requests = []
+
+    def _body(self, params):
+        if not self.paged:
+            return self.people
+        start = (params["page"] - 1) * params["size"]
+        return {"people": self.people[start:start + params["size"]], "total": len(self.people), "hasNextPage": start + params["size"] < len(self.people)}
+
+    def get(self, path, params=None, headers=None):
+        self.requests.append(dict(params or {}))
+        return FakeResponse(self._body(params))
+
+    def get_json(self, path, params=None):
+        self.requests.append(dict(params or {}))
+        return self._body(params)
+
+
+PEOPLE = [{"id": f"person-{i}", "name": f"Person {i}"} for i in range(5)]
+
+
+def test_snapshot_and_sync_listing_agree_on_paged_responses():
+    from app.people_cache import PeopleCache, iter_people
+    client = FakeImmich(PEOPLE, paged=True)
+    snapshot = PeopleCache(client, page_size=2).snapshot(max_age=0)
+    assert snapshot.people == PEOPLE
+    assert snapshot.get("person-4") == PEOPLE[4]
+    assert json.loads(snapshot.body) == PEOPLE # The UI gets a plain array either way
+    assert [params["page"] for params in client.requests] == [1, 2, 3]
+    assert list(iter_people(client, page_size=2)) == PEOPLE
+
+
+def test_plain_array_responses_are_served_as_is():
+    from app.people_cache import PeopleCache, iter_people
+    client = FakeImmich(PEOPLE, paged=False)
+    snapshot = PeopleCache(client, page_size=2).snapshot(max_age=0)
+    assert snapshot.people == PEOPLE
+    assert snapshot.body == json.dumps(PEOPLE).encode()
+    assert list(iter_people(client, page_size=2)) == PEOPLE
+
+
+def immich(stub_immich):
+    from app.http_client import PooledHTTPClient
+    return PooledHTTPClient(stub_immich.url, name="immich")
+
+
+def test_unchanged_library_is_revalidated_with_a_304(stub_immich):
+    from app.people_cache import PeopleCache
+    cache = PeopleCache(immich(stub_immich))
+    first = cache.snapshot(max_age=0)
+    second = cache.snapshot(max_age=0)
+    assert second is first # The 304 kept the parsed snapshot
+    assert stub_immich.request_counts()["people"] == 2
+
+    stub_immich.people[0]["name"] = "Renamed"
+    assert cache.snapshot(max_age=0).people[0]["name"] == "Renamed"
+
+
+def test_stale_snapshot_is_served_while_refreshing(stub_immich):
+    import time
+    from app.people_cache import PeopleCache
+    cache = PeopleCache(immich(stub_immich), ttl_seconds=0, max_stale_seconds=3600)
+    stale = cache.snapshot()
+    stub_immich.people[0]["name"] = "Renamed"
+    stub_immich.latency = 0.2
+    started = time.monotonic()
+    assert cache.snapshot() is stale
+    assert time.monotonic() - started < 0.2 # Didn't wait for Immich
+
+    deadline = time.monotonic() + 5
+    while cache._snapshot is stale and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert cache.snapshot(max_age=3600).people[0]["name"] == "Renamed"
+
+
+def test_concurrent_fetches_are_coalesced(stub_immich):
+    from concurrent.futures import ThreadPoolExecutor
+    from app.people_cache import PeopleCache
+    cache = PeopleCache(immich(stub_immich))
+    stub_immich.latency = 0.2
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        snapshots = list(pool.map(lambda _: cache.snapshot(), range(5)))
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+    assert stub_immich.request_counts()["people"] == 1
@@ -0,0 +1,113 @@
+import os
+import json
+
+
+def write_legacy_state(path, face_ids):
+    """Writes a synced_faces_state.json as Frimmich versions before the SQLite state store did."""
+    with open(path, "w") as f:
+        json.dump({"synced_face_ids": list(face_ids)}, f)
+
+
+def face_files(faces_dir):
+    return sorted(name for _, _, files in os.walk(faces_dir) for name in files)
+
+
+def test_delta_sync_after_legacy_upgrade_keeps_files(frimmich, stub_immich, run_sync):
+    # An install upgraded from the JSON state: every face is on disk, but the state only has IDs.
+    face_ids = []
+    for person in stub_immich.people:
+        person_dir = os.path.join(frimmich.FRIGATE_FACES_DIR, person["name"])
+        os.makedirs(person_dir)
+        for face in stub_immich.faces[person["id"]]:
+            face_ids.append(face["id"])
+            with open(os.path.join(person_dir, face["id"] + ".jpg"), "wb") as f:
+                f.write(b"legacy")
+    write_legacy_state(frimmich.STATE_FILE, face_ids)
+
+    first = run_sync(delta=True)
+    assert first["status"] == "Success"
+    assert first["reconcile"]["removed"] == 0
+    assert len(face_files(frimmich.FRIGATE_FACES_DIR)) == 15
+
+    stub_immich.add_faces(stub_immich.people[0]["id"], 1)
+    second = run_sync(delta=True)
+    assert second["status"] == "Success"
+    assert second["unchanged_people"] == 2
+    assert second["trained"] == 1
+    assert second["reconcile"]["removed"] == 0
+    assert len(face_files(frimmich.FRIGATE_FACES_DIR)) == 16
+
+
+def test_unchanged_person_keeps_legacy_faces_not_yet_adopted(frimmich, stub_immich, run_sync):
+    # State written by a version that skipped legacy faces without recording their person.
+    from app.state_manager import StateManager
+    first = run_sync(delta=True)
+    assert first["trained"] == 15
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        with state_manager._conn:
+            state_manager._conn.execute("UPDATE synced_faces SET person_id = NULL, person_name = NULL, output_path = NULL")
+    finally:
+        state_manager.close()
+
+    stub_immich.add_faces(stub_immich.people[0]["id"], 1)
+    second = run_sync(delta=True)
+    assert second["unchanged_people"] == 2
+    assert second["reconcile"]["removed"] == 0
+    assert len(face_files(frimmich.FRIGATE_FACES_DIR)) == 16
+
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        assert not state_manager.legacy_face_ids
+    finally:
+        state_manager.close()
+
+
+def test_renamed_person_directory_is_renamed(frimmich, stub_immich, run_sync):
+    from app.people_cache import people_cache
+    assert run_sync(delta=True)["trained"] == 15
+    person = stub_immich.people[0]
+    old_dir = os.path.join(frimmich.FRIGATE_FACES_DIR, person["name"])
+    person["name"], person["updatedAt"] = "Renamed", "2024-08-01T00:00:00.000Z"
+    people_cache.invalidate()
+
+    second = run_sync(delta=True)
+    assert second["reconcile"]["renamed_dirs"] == 1
+    assert second["reconcile"]["moved"] == 5
+    assert not os.path.exists(old_dir)
+    assert len(face_files(os.path.join(frimmich.FRIGATE_FACES_DIR, "Renamed"))) == 5
+
+
+def test_unassigned_faces_are_removed_and_other_files_kept(frimmich, stub_immich, run_sync):
+    assert run_sync(delta=True)["trained"] == 15
+    person = stub_immich.people[0]
+    person_dir = os.path.join(frimmich.FRIGATE_FACES_DIR, person["name"])
+    with open(os.path.join(person_dir, "added-in-frigate.jpg"), "wb") as f:
+        f.write(b"not synced by frimmich")
+    removed = stub_immich.faces[person["id"]].pop()
+    person["updatedAt"] = "2024-08-01T00:00:00.000Z"
+
+    second = run_sync(delta=True)
+    assert second["reconcile"]["removed"] == 1
+    assert not os.path.exists(os.path.join(person_dir, removed["id"] + ".jpg"))
+    assert os.path.exists(os.path.join(person_dir, "added-in-frigate.jpg"))
+    assert len(face_files(frimmich.FRIGATE_FACES_DIR)) == 15
+
+    from app.state_manager import StateManager
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        assert not state_manager.is_synced(removed["id"])
+    finally:
+        state_manager.close()
+
+
+def test_dry_run_reports_without_changing_files(frimmich, stub_immich, run_sync, monkeypatch):
+    assert run_sync(delta=True)["trained"] == 15
+    monkeypatch.setattr(frimmich, "RECONCILE_DRY_RUN", True)
+    stub_immich.reassign_faces(stub_immich.people[0]["id"], stub_immich.people[1]["id"], 2)
+    before = face_files(frimmich.FRIGATE_FACES_DIR)
+
+    second = run_sync(delta=True)
+    assert second["reconcile"]["moved"] == 2
+    assert face_files(frimmich.FRIGATE_FACES_DIR) == before
+    assert len(os.listdir(os.path.join(frimmich.FRIGATE_FACES_DIR, stub_immich.people[0]["name"]))) == 5
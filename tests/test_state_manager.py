@@ -0,0 +1,80 @@
+import json
+import sqlite3
+
+from app.state_manager import StateManager
+
+
+def committed_face_ids(db_path):
+    # A separate connection only sees what StateManager has committed.
+    conn = sqlite3.connect(db_path)
+    try:
+        return set(row[0] for row in conn.execute("SELECT face_id FROM synced_faces"))
+    finally:
+        conn.close()
+
+
+def test_faces_are_committed_in_batches(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    state_manager = StateManager(db_path, batch_size=3, commit_interval=3600)
+    try:
+        state_manager.add_synced_face("f1", "p1", "Alice")
+        state_manager.add_synced_face("f2", "p1", "Alice")
+        assert state_manager.is_synced("f2")
+        assert committed_face_ids(db_path) == set()
+
+        state_manager.add_synced_face("f3", "p1", "Alice")
+        assert committed_face_ids(db_path) == {"f1", "f2", "f3"}
+
+        state_manager.add_synced_face("f4", "p1", "Alice")
+        state_manager.flush()
+        assert committed_face_ids(db_path) == {"f1", "f2", "f3", "f4"}
+    finally:
+        state_manager.close()
+
+
+def test_state_survives_reopening(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    state_manager = StateManager(db_path, commit_interval=3600)
+    state_manager.add_synced_face("f1", "p1", "Alice", output_path="/faces/Alice/f1.jpg")
+    state_manager.set_person_fingerprint("p1", 1, "hash", "2024-01-01T00:00:00Z", asset_count=1)
+    state_manager.close()
+
+    state_manager = StateManager(db_path)
+    try:
+        assert state_manager.is_synced("f1")
+        assert state_manager.get_face("f1")["output_path"] == "/faces/Alice/f1.jpg"
+        fingerprint = state_manager.get_person_fingerprint("p1")
+        assert (fingerprint["face_count"], fingerprint["asset_count"]) == (1, 1)
+    finally:
+        state_manager.close()
+
+
+def test_legacy_json_state_is_migrated_once(tmp_path):
+    legacy_file = tmp_path / "synced_faces_state.json"
+    legacy_file.write_text(json.dumps({"synced_face_ids": ["f1", "f2"]}))
+    db_path = str(tmp_path / "state.db")
+    state_manager = StateManager(db_path, legacy_state_file=str(legacy_file))
+    try:
+        assert state_manager.synced_face_ids == {"f1", "f2"}
+        assert state_manager.legacy_face_ids == {"f1", "f2"}
+        assert not legacy_file.exists()
+        assert (tmp_path / "synced_faces_state.json.migrated").exists()
+
+        state_manager.adopt_legacy_faces("p1", "Alice", ["f1", "f3"])
+        assert state_manager.legacy_face_ids == {"f2"}
+        assert state_manager.get_face("f1")["person_name"] == "Alice"
+    finally:
+        state_manager.close()
+
+
+def test_removed_faces_are_forgotten(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    state_manager = StateManager(db_path, commit_interval=3600)
+    try:
+        state_manager.add_synced_face("f1", "p1", "Alice")
+        state_manager.add_synced_face("f2", "p1", "Alice")
+        state_manager.remove_synced_faces(["f1"])
+        assert not state_manager.is_synced("f1")
+        assert committed_face_ids(db_path) == {"f2"}
+    finally:
+        state_manager.close()
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from app.status_manager import StatusManager, MAX_LOG_LINES
+
+
+def test_changes_report_only_what_is_new(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"))
+    snapshot = status.get_changes()
+    assert snapshot["reset_logs"]
+    assert "state" in snapshot
+
+    status.log("INFO", "Found %s people.", 3)
+    changes = status.get_changes(snapshot["version"])
+    assert changes["logs"] == ["INFO: Found 3 people."]
+    assert "state" not in changes # Only a log line was added
+
+    status.update_status("Planning sync...")
+    changes = status.get_changes(changes["version"])
+    assert changes["logs"] == []
+    assert changes["state"]["status_message"] == "Planning sync..."
+
+
+def test_long_poll_wakes_on_a_change(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"))
+    version = status.get_changes()["version"]
+    threading.Timer(0.1, status.update_status, ("Sync in progress...",)).start()
+    started = time.monotonic()
+    changes = status.get_changes(version, timeout=10)
+    assert time.monotonic() - started < 5
+    assert changes["state"]["status_message"] == "Sync in progress..."
+
+
+def test_long_poll_sees_changes_from_another_process(tmp_path):
+    # A second instance over the same database stands in for the sync worker process.
+    viewer = StatusManager(str(tmp_path / "status.db"))
+    worker = StatusManager(str(tmp_path / "status.db"))
+    version = viewer.get_changes()["version"]
+    threading.Timer(0.1, worker.log, ("INFO", "From the worker")).start()
+    assert viewer.get_changes(version, timeout=10)["logs"] == ["INFO: From the worker"]
+
+
+def test_long_poll_returns_unchanged_after_the_timeout(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"))
+    version = status.get_changes()["version"]
+    assert status.get_changes(version, timeout=0.1) == {"version": version, "logs": []}
+
+
+def test_viewer_that_fell_behind_resets_its_logs(tmp_path):
+    status = StatusManager(str(tmp_path / "status.db"))
+    version = status.get_changes()["version"]
+    for i in range(MAX_LOG_LINES + 5):
+        status.log("INFO", "Line %s", i)
+    changes = status.get_changes(version)
+    assert changes["reset_logs"]
+    assert len(changes["logs"]) == MAX_LOG_LINES
+    assert changes["logs"][-1] == f"INFO: Line {MAX_LOG_LINES + 4}"
+
@@ -0,0 +1,39 @@
+from urllib.parse import parse_qs
+
+
+def test_sync_pages_people_and_reads_the_plan_in_batches(frimmich, stub_immich, run_sync, monkeypatch):
+    from app import sync_plan
+    monkeypatch.setattr(frimmich, "PEOPLE_PAGE_SIZE", 2)
+    monkeypatch.setattr(sync_plan, "BATCH_SIZE", 2) # Fewer rows than a person has faces
+    pages = []
+    respond = stub_immich.respond
+
+    def record_pages(path, query=""):
+        if path == "/api/people":
+            pages.append(parse_qs(query).get("page", ["all"])[0])
+        return respond(path, query)
+    monkeypatch.setattr(stub_immich, "respond", record_pages)
+
+    summary = run_sync(delta=False)
+    assert summary["trained"] == 15
+    assert pages == ["1", "2"]
+
+
+def test_plan_replays_listed_faces_in_batches(frimmich, stub_immich, monkeypatch):
+    from app import sync_plan
+    from app.state_manager import StateManager
+    monkeypatch.setattr(sync_plan, "BATCH_SIZE", 2)
+    state_manager = StateManager(frimmich.STATE_DB)
+    try:
+        plan = sync_plan.build_sync_plan(state_manager)
+        try:
+            people = list(plan.people())
+            assert [entry["id"] for entry in people] == [person["id"] for person in stub_immich.people]
+            for entry in people:
+                assert [face["id"] for face in plan.faces(entry["seq"])] == [face["id"] for face in stub_immich.faces[entry["id"]]]
+            assert len(plan.desired) == 15
+            assert plan.desired.get(stub_immich.faces[people[1]["id"]][0]["id"]) == stub_immich.people[1]["name"]
+        finally:
+            plan.close()
+    finally:
+        state_manager.close()
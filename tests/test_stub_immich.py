@@ -0,0 +1,36 @@
+import requests
+
+from benchmarks.stub_immich import StubImmich
+
+
+def test_people_pages_cover_the_library(stub_immich):
+    first = requests.get(stub_immich.url + "/api/people", params={"size": 2, "page": 1}).json()
+    second = requests.get(stub_immich.url + "/api/people", params={"size": 2, "page": 2}).json()
+    assert (first["total"], first["hasNextPage"], second["hasNextPage"]) == (3, True, False)
+    assert first["people"] + second["people"] == stub_immich.people
+    assert requests.get(stub_immich.url + "/api/people").json() == stub_immich.people
+
+
+def test_people_list_answers_conditional_requests(stub_immich):
+    response = requests.get(stub_immich.url + "/api/people")
+    etag = response.headers["ETag"]
+    assert requests.get(stub_immich.url + "/api/people", headers={"If-None-Match": etag}).status_code == 304
+    stub_immich.add_faces(stub_immich.people[0]["id"], 1) # Bumps updatedAt
+    assert requests.get(stub_immich.url + "/api/people", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_requests_are_counted_per_endpoint(stub_immich):
+    person_id = stub_immich.people[0]["id"]
+    face_id = stub_immich.faces[person_id][0]["id"]
+    requests.get(f"{stub_immich.url}/api/people/{person_id}/faces")
+    requests.get(f"{stub_immich.url}/api/people/{person_id}/statistics")
+    assert requests.get(f"{stub_immich.url}/api/faces/{face_id}/thumbnail").headers["Content-Type"] == "image/jpeg"
+    assert requests.get(f"{stub_immich.url}/api/nothing").status_code == 404
+    assert stub_immich.request_counts() == {"person_faces": 1, "person_statistics": 1, "face_thumbnail": 1, "unknown": 1, "total": 4}
+
+
+def test_error_injection_is_reproducible():
+    first, second = StubImmich(people=1, error_rate=0.5, seed=7), StubImmich(people=1, error_rate=0.5, seed=7)
+    statuses = [[stub.respond("/api/people")[0] for _ in range(20)] for stub in (first, second)]
+    assert statuses[0] == statuses[1]
+    assert set(statuses[0]) == {200, 503}
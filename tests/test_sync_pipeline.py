@@ -0,0 +1,57 @@
+import os
+import threading
+
+
+def test_full_sync_writes_every_face(frimmich, stub_immich, run_sync, monkeypatch):
+    monkeypatch.setattr(frimmich, "SYNC_FACE_WORKERS", 4)
+    summary = run_sync(delta=False)
+    assert summary["status"] == "Success"
+    assert summary["trained"] == 15
+    for person in stub_immich.people:
+        files = os.listdir(os.path.join(frimmich.FRIGATE_FACES_DIR, person["name"]))
+        assert sorted(files) == sorted(face["id"] + ".jpg" for face in stub_immich.faces[person["id"]])
+    assert not any(name.endswith(".tmp") for _, _, files in os.walk(frimmich.FRIGATE_FACES_DIR) for name in files)
+
+
+def test_faces_are_processed_concurrently(frimmich, run_sync, monkeypatch):
+    from app import sync_logic
+    monkeypatch.setattr(frimmich, "SYNC_FACE_WORKERS", 4)
+    crop_face = sync_logic.crop_face
+    lock = threading.Lock()
+    active = [0, 0] # Faces being cropped right now, and the most at once
+    second_face = threading.Event()
+
+    def slow_crop(*args, **kwargs):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+            first = active[1] == 1
+        if first:
+            second_face.wait(5) # Holds the first face until another one is being cropped alongside it
+        else:
+            second_face.set()
+        with lock:
+            active[0] -= 1
+        return crop_face(*args, **kwargs)
+
+    monkeypatch.setattr(sync_logic, "crop_face", slow_crop)
+    assert run_sync(delta=False)["trained"] == 15
+    assert active[1] >= 2
+
+
+def test_one_failing_face_does_not_stop_the_sync(frimmich, stub_immich, run_sync, monkeypatch):
+    from app import sync_logic
+    broken_id = stub_immich.faces[stub_immich.people[1]["id"]][2]["id"]
+    process_face = sync_logic.process_face
+
+    def process_or_fail(face, *args, **kwargs):
+        if face["id"] == broken_id:
+            face = dict(face, boundingBox={"x1": 900, "y1": 900, "x2": 950, "y2": 950}) # Outside the image
+        return process_face(face, *args, **kwargs)
+
+    monkeypatch.setattr(sync_logic, "process_face", process_or_fail)
+    summary = run_sync(delta=False)
+    assert summary["status"] == "Partial Failure"
+    assert summary["failed"] == 1
+    assert summary["trained"] == 14
+    assert not os.path.exists(os.path.join(frimmich.FRIGATE_FACES_DIR, stub_immich.people[1]["name"], broken_id + ".jpg"))
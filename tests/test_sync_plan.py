@@ -0,0 +1,34 @@
+import os
+
+
+def test_plan_previews_reconcile_even_in_dry_run_mode(frimmich, stub_immich, run_sync, client, monkeypatch):
+    run_sync(delta=False)
+    stub_immich.reassign_faces(stub_immich.people[0]["id"], stub_immich.people[1]["id"], 2)
+    monkeypatch.setattr(frimmich, "RECONCILE_DRY_RUN", True)
+
+    report = client.post("/api/sync/plan", json={}).get_json()
+    assert report["complete"]
+    assert report["reconcile"]["moved"] == 2
+    assert report["reconcile_dry_run"]
+    assert {change["action"] for change in report["file_changes"]} == {"move"}
+    # A dry run changes nothing.
+    assert len(os.listdir(os.path.join(frimmich.FRIGATE_FACES_DIR, stub_immich.people[1]["name"]))) == 5
+
+
+def test_plan_of_a_selection_says_why_there_is_no_reconcile(frimmich, stub_immich, client):
+    person_id = stub_immich.people[0]["id"]
+    report = client.post("/api/sync/plan", json={"people": [{"id": person_id, "faces": []}]}).get_json()
+    assert report["summary"]["faces_to_fetch"] == 5
+    assert report["reconcile"] is None
+    assert report["reconcile_skipped"]
+
+
+def test_plan_stops_listing_at_the_timeout(frimmich, stub_immich, client, monkeypatch):
+    monkeypatch.setattr(frimmich, "PLAN_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(frimmich, "SYNC_PERSON_WORKERS", 1)
+    stub_immich.latency = 0.15
+    report = client.post("/api/sync/plan", json={}).get_json()
+    assert not report["complete"]
+    assert report["stop_reason"] == "timeout"
+    assert report["summary"]["listed_people"] < len(stub_immich.people)
+    assert report["reconcile"] is None
@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FakeStatus:
+    def __init__(self):
+        self.writes = []
+        self.progress = None
+
+    def update_progress(self, person_name, processed, total):
+        # The face workers must not wait on each other while the status database is written.
+        assert not self.progress._lock.locked()
+        self.writes.append((processed, total))
+
+
+def test_progress_writes_are_throttled_and_flushed(monkeypatch):
+    from app import sync_logic
+    monkeypatch.setattr(sync_logic.mqtt_client, "publish_sync_progress", lambda progress: None)
+    status = FakeStatus()
+    progress = status.progress = sync_logic.SyncProgress(status)
+    progress.add_to_total(1000)
+    for _ in range(1000):
+        progress.record("Person", "trained")
+    assert len(status.writes) <= 1000 // sync_logic.PROGRESS_WRITE_FACES + 1
+
+    progress.flush()
+    assert status.writes[-1] == (1000, 1000)
+
+
+def test_concurrent_writes_never_go_backwards(monkeypatch):
+    from app import sync_logic
+    monkeypatch.setattr(sync_logic.mqtt_client, "publish_sync_progress", lambda progress: None)
+    monkeypatch.setattr(sync_logic, "PROGRESS_WRITE_INTERVAL", 0)
+    writes = []
+    lock = threading.Lock()
+
+    class Status:
+        def update_progress(self, person_name, processed, total):
+            with lock:
+                writes.append(processed)
+
+    progress = sync_logic.SyncProgress(Status())
+    progress.add_to_total(2000)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(2000):
+            pool.submit(progress.record, "Person", "skipped")
+    progress.flush()
+    assert writes == sorted(writes)
+    assert writes[-1] == 2000
@@ -0,0 +1,62 @@
+from app.thumbnail_cache import ThumbnailCache
+
+
+class FakeImmich:
+    def __init__(self):
+        self.fetches = []
+
+    def get_bytes(self, path):
+        self.fetches.append(path)
+        return b"x" * 100
+
+
+def test_thumbnails_stored_by_one_process_are_hits_in_another(tmp_path):
+    # Two instances over one directory stand in for the sync worker and a gunicorn worker.
+    worker = ThumbnailCache(FakeImmich(), str(tmp_path), max_bytes=10000)
+    web_client = FakeImmich()
+    web = ThumbnailCache(web_client, str(tmp_path), max_bytes=10000)
+    web.get("face-a") # Opens the index before the worker writes, like a long-running web worker
+
+    worker.put("face-b", b"y" * 100)
+    data, _ = web.get("face-b")
+    assert data == b"y" * 100
+    assert web_client.fetches == ["/api/faces/face-a/thumbnail"]
+
+
+def test_size_limit_covers_the_whole_directory(tmp_path):
+    first = ThumbnailCache(FakeImmich(), str(tmp_path), max_bytes=1000)
+    second = ThumbnailCache(FakeImmich(), str(tmp_path), max_bytes=1000)
+    for i in range(8):
+        (first if i % 2 else second).put(f"face-{i}", b"z" * 200)
+    files = [path for path in tmp_path.rglob("*.jpg")]
+    assert sum(path.stat().st_size for path in files) <= 1000
+    assert len(files) == 5
+
+
+def test_existing_cache_directory_is_indexed(tmp_path):
+    shard = tmp_path / "fa"
+    shard.mkdir()
+    (shard / "face-old.jpg").write_bytes(b"o" * 50)
+    client = FakeImmich()
+    data, _ = ThumbnailCache(client, str(tmp_path), max_bytes=10000).get("face-old")
+    assert data == b"o" * 50
+    assert client.fetches == []
+
+
+def test_route_serves_conditional_responses_and_variants(client, stub_immich):
+    import io
+    from PIL import Image
+    face_id = stub_immich.faces[stub_immich.people[0]["id"]][0]["id"]
+    url = f"/api/faces/{face_id}/thumbnail"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    stub_immich.reset_counts()
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    variant = client.get(url + "?size=100")
+    assert max(Image.open(io.BytesIO(variant.data)).size) <= 128 # Rounded up to a multiple of 32
+    assert client.get(url + "?size=120").data == variant.data
+    assert "face_thumbnail" not in stub_immich.request_counts()
+
+    assert client.get("/api/faces/not_a_face/thumbnail").status_code == 400
@@ -0,0 +1,133 @@
+import sqlite3
+import time
+
+import pytest
+from flask import Flask
+
+
+class FakeServices:
+    """Stands in for the status store, MQTT client, job queues and Frigate restarter the sync worker starts and stops."""
+
+    def __init__(self):
+        self.calls = []
+        self.job_running = False
+
+    def recover_interrupted(self):
+        self.calls.append("recover_interrupted")
+
+    def connect(self):
+        self.calls.append("connect")
+
+    def disconnect(self):
+        self.calls.append("disconnect")
+
+    def start_worker(self, *args):
+        self.calls.append("start_worker")
+
+    def stop(self):
+        self.calls.append("stop")
+
+    def is_running(self):
+        return self.job_running
+
+    def resume(self, logger=None):
+        self.calls.append("resume")
+
+    def add_log(self, message):
+        pass
+
+
+class FlakyLease:
+    """A lease whose database can be locked, like the status database during a write-heavy sync."""
+
+    ttl_seconds = 30
+
+    def __init__(self):
+        self.locked = False
+        self.owned_elsewhere = False
+        self.expires_at = 0
+
+    def acquire(self):
+        if self.locked:
+            raise sqlite3.OperationalError("database is locked")
+        if self.owned_elsewhere:
+            self.expires_at = 0
+            return False
+        self.expires_at = time.time() + self.ttl_seconds
+        return True
+
+
+@pytest.fixture
+def services(monkeypatch):
+    from app import worker
+    fake = FakeServices()
+    for name in ("status_manager", "mqtt_client", "job_queue", "analysis_queue", "frigate_restarter"):
+        monkeypatch.setattr(worker, name, fake)
+    monkeypatch.setattr(worker.Config, "SYNC_SCHEDULE_INTERVAL_HOURS", 0)
+    return fake
+
+
+def test_lease_is_held_until_it_expires(tmp_path, monkeypatch):
+    from app.worker import WorkerLease
+    db_path = str(tmp_path / "status.db")
+    first = WorkerLease(db_path, "sync-worker", ttl_seconds=30)
+    second = WorkerLease(db_path, "sync-worker", ttl_seconds=30)
+    second.owner = "other-host:1"
+    assert first.acquire()
+    assert first.acquire() # Renewal
+    assert not second.acquire()
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+    assert second.acquire()
+    assert not first.acquire()
+
+
+def test_transient_lease_error_keeps_the_services_running(services):
+    from app.worker import SyncWorker
+    lease = FlakyLease()
+    worker = SyncWorker(Flask("tests"), lease)
+    worker._check_lease()
+    assert worker._active
+
+    services.calls.clear()
+    lease.locked = True
+    assert worker._check_lease() < lease.ttl_seconds / 3 # Retried sooner than a renewal
+    assert worker._active
+    assert services.calls == []
+
+    lease.locked = False
+    worker._check_lease()
+    assert worker._active
+    assert services.calls == []
+
+
+def test_services_stop_once_the_lease_expires_or_is_taken(services):
+    from app.worker import SyncWorker
+    lease = FlakyLease()
+    worker = SyncWorker(Flask("tests"), lease)
+    worker._check_lease()
+    lease.locked = True
+    lease.expires_at = time.time() - 1
+    worker._check_lease()
+    assert not worker._active
+    assert "disconnect" in services.calls
+
+    lease.locked = False
+    worker._check_lease()
+    assert worker._active
+    lease.owned_elsewhere = True
+    worker._check_lease()
+    assert not worker._active
+
+
+def test_reactivating_leaves_a_running_job_alone(services):
+    from app.worker import SyncWorker
+    worker = SyncWorker(Flask("tests"), FlakyLease())
+    worker._activate()
+    assert services.calls.count("recover_interrupted") == 1
+    worker._deactivate()
+
+    services.job_running = True # The job thread is still finishing its sync
+    worker._activate()
+    assert services.calls.count("recover_interrupted") == 1